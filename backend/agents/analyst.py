@@ -1,10 +1,18 @@
-from typing import Any
+import asyncio
+import hashlib
+import logging
+from typing import Any, List, Optional
 
-from llm.gemini_pipeline import GeminiClient
+from cache.disk_cache import DiskCache
+from imaging.preprocess import get_shared_preprocessor
+from llm.gemini_pipeline import GeminiAdapter
+from llm.structured import StructuredParser, parse_json_lenient
 from schemas import ProductSpecs
-from config import Configuration
+from config import get_config
+from metrics import JSON_PARSE_FAILURES
 
-config = Configuration()
+config = get_config()
+logger = logging.getLogger(__name__)
 
 
 class AnalystAgent:
@@ -16,15 +24,33 @@ class AnalystAgent:
       from product images to prevent hallucination.
     - Ensures accurate downstream generations.
     - Return strongly typed ProductSpecs
+    - Caches specs by image content, model and prompt version
+      so re-submitted photos skip the vision call.
+    - Repairs sloppy JSON locally and re-asks (text only) before
+      giving up on an image; `structured` requests schema-constrained
+      output instead of free-form text.
     """
 
-    def __init__(self, model: str = config.ANALYST_MODEL):
-        self.model = GeminiClient(model=model)
+    def __init__(
+        self,
+        model: str = config.ANALYST_MODEL,
+        cache: Optional[DiskCache] = None,
+        batch_size: int = config.ANALYST_BATCH_SIZE,
+        structured: bool = config.STRUCTURED_OUTPUT,
+    ):
+        self.model = GeminiAdapter(model=model, preprocessor=get_shared_preprocessor())
+        self.model_name = model
+        self.parser = StructuredParser("analyst", ProductSpecs, structured=structured)
+        self.response_schema = ProductSpecs if structured else None
 
-        self.system_prompt = (
-            "You are a Gemologist AI specializing in jewelry. "
-            "Analyze the provided product image and produce a STRICT JSON object "
-            "with the following fields:\n\n"
+        if cache is None and config.ANALYST_CACHE_DIR:
+            cache = DiskCache(
+                config.ANALYST_CACHE_DIR,
+                max_bytes=config.ANALYST_CACHE_MAX_BYTES
+            )
+        self.cache = cache
+
+        schema = (
             "{\n"
             '  "metal_type": "string",\n'
             '  "main_stone": {\n'
@@ -36,31 +62,202 @@ class AnalystAgent:
             '  "setting_style": "string",\n'
             '  "unique_imperfections": "string"\n'
             "}\n\n"
+        )
+
+        self.system_prompt = (
+            "You are a Gemologist AI specializing in jewelry. "
+            "Analyze the provided product image and produce a STRICT JSON object "
+            "with the following fields:\n\n"
+            + schema +
             "RULES:\n"
             "- The JSON MUST be valid and parseable.\n"
             "- No additional text outside the JSON.\n"
             "- If uncertain, make the closest visually justified estimate."
         )
 
+        # Used by analyse_many; {count} is filled in per request
+        self.batch_prompt = (
+            "You are a Gemologist AI specializing in jewelry. "
+            "You receive {count} product images. Analyze every image independently "
+            "and produce a STRICT JSON array with exactly {count} objects, "
+            "one per image and in the same order as the images. "
+            "Each object has the following fields:\n\n"
+            + schema.replace("{", "{{").replace("}", "}}") +
+            "RULES:\n"
+            "- The JSON array MUST be valid and parseable.\n"
+            "- No additional text outside the JSON.\n"
+            "- Never merge or skip images.\n"
+            "- If uncertain, make the closest visually justified estimate."
+        )
+        self.batch_size = batch_size
+        # Editing the prompt invalidates previously cached analyses
+        self.prompt_version = hashlib.sha256(self.system_prompt.encode()).hexdigest()[:12]
+
+    def _read_image(self, image_path: str) -> bytes:
+        with open(image_path, "rb") as _f:
+            return _f.read()
+
+    def _cache_key(self, image_bytes: bytes) -> str:
+        image_hash = hashlib.sha256(image_bytes).hexdigest()
+        return hashlib.sha256(
+            f"{image_hash}:{self.model_name}:{self.prompt_version}".encode()
+        ).hexdigest()
+
+    def _cached(self, key: str) -> Optional[ProductSpecs]:
+        if self.cache is None:
+            return None
+        value = self.cache.get(key)
+        return ProductSpecs.model_validate(value) if value is not None else None
+
+    def _store(self, key: str, specs: ProductSpecs):
+        if self.cache is not None:
+            self.cache.set(key, specs.model_dump())
+
     def analyse(self, image_path: str) -> ProductSpecs:
         """
         Performs a full vision analysis of the product
         and returns ProductSpecs.
         """
         # read image bytes
-        with open(image_path, "rb") as _f:
-            image_bytes = _f.read()
+        image_bytes = self._read_image(image_path)
+
+        key = self._cache_key(image_bytes)
+        cached = self._cached(key)
+        if cached is not None:
+            return cached
 
         # Compose the complete contents
-        response_text = self.model.invoke_with_image(self.system_prompt, image_bytes)
-
-        # Parse as JSON into Pydantic model
-        try:
-            parsed = ProductSpecs.model_validate_json(response_text)
-        except Exception:
-            raise ValueError(
-                "AnalystAgent: JSON parsing failed. "
-                f"Raw output: {response_text}"
-            )
+        response_text = self.model.invoke_with_image(
+            self.system_prompt, image_bytes, response_schema=self.response_schema
+        )
+
+        parsed = self.parser.parse(response_text, self.model)
+        self._store(key, parsed)
+        return parsed
 
+    async def aanalyse(self, image_path: str) -> ProductSpecs:
+        """
+        Async counterpart of analyse.
+        """
+        image_bytes = await asyncio.to_thread(self._read_image, image_path)
+
+        # Hashing and the disk cache (file reads, JSON, utime) stay off the event loop
+        key = await asyncio.to_thread(self._cache_key, image_bytes)
+        cached = await asyncio.to_thread(self._cached, key)
+        if cached is not None:
+            return cached
+
+        response_text = await self.model.ainvoke_with_image(
+            self.system_prompt, image_bytes, response_schema=self.response_schema
+        )
+
+        parsed = await self.parser.aparse(response_text, self.model)
+        await asyncio.to_thread(self._store, key, parsed)
         return parsed
+
+    def _parse_many(self, response_text: str, count: int) -> List[Optional[ProductSpecs]]:
+        """
+        Parses a batch response; entries that are missing or fail
+        validation come back as None.
+        """
+        items = parse_json_lenient(response_text)
+        if not isinstance(items, list):
+            JSON_PARSE_FAILURES.inc(agent="analyst")
+            return [None] * count
+
+        parsed = []
+        for i in range(count):
+            try:
+                parsed.append(ProductSpecs.model_validate(items[i]))
+            except Exception:
+                JSON_PARSE_FAILURES.inc(agent="analyst")
+                parsed.append(None)
+        return parsed
+
+    def _chunks(self, indices: List[int]) -> List[List[int]]:
+        size = max(self.batch_size, 1)
+        return [indices[i:i + size] for i in range(0, len(indices), size)]
+
+    def _log_batch_failure(self, image_paths: List[str], chunk: List[int]):
+        logger.warning(
+            "Batch analysis of %s failed; analysing them one by one",
+            ", ".join(image_paths[i] for i in chunk),
+            exc_info=True,
+        )
+
+    def _merge_batch(
+        self,
+        chunk: List[int],
+        keys: List[str],
+        results: List[Optional[ProductSpecs]],
+        response_text: str,
+    ):
+        for i, parsed in zip(chunk, self._parse_many(response_text, len(chunk))):
+            if parsed is not None:
+                self._store(keys[i], parsed)
+                results[i] = parsed
+
+    def analyse_many(self, image_paths: List[str]) -> List[ProductSpecs]:
+        """
+        Analyses several products with one vision call per batch of
+        `batch_size` images. Cached images are skipped, and entries the
+        batch response gets wrong fall back to a single-image analyse.
+        """
+        images = [self._read_image(path) for path in image_paths]
+        keys = [self._cache_key(image_bytes) for image_bytes in images]
+        results: List[Optional[ProductSpecs]] = [self._cached(key) for key in keys]
+
+        todo = [i for i, result in enumerate(results) if result is None]
+        for chunk in self._chunks(todo):
+            if len(chunk) < 2:
+                continue
+            try:
+                response_text = self.model.invoke_with_images(
+                    self.batch_prompt.format(count=len(chunk)),
+                    [images[i] for i in chunk],
+                    response_schema=List[ProductSpecs] if self.response_schema else None
+                )
+            except Exception:
+                # The whole batch falls back to single-image calls
+                self._log_batch_failure(image_paths, chunk)
+                continue
+            self._merge_batch(chunk, keys, results, response_text)
+
+        # Single leftovers and entries the batch got wrong
+        for i, result in enumerate(results):
+            if result is None:
+                results[i] = self.analyse(image_paths[i])
+
+        return results
+
+    async def aanalyse_many(self, image_paths: List[str]) -> List[ProductSpecs]:
+        """
+        Async counterpart of analyse_many; batches run concurrently.
+        """
+        images = await asyncio.to_thread(lambda: [self._read_image(path) for path in image_paths])
+        keys = await asyncio.to_thread(lambda: [self._cache_key(image_bytes) for image_bytes in images])
+        results: List[Optional[ProductSpecs]] = await asyncio.to_thread(
+            lambda: [self._cached(key) for key in keys]
+        )
+
+        async def _run_chunk(chunk: List[int]):
+            try:
+                response_text = await self.model.ainvoke_with_images(
+                    self.batch_prompt.format(count=len(chunk)),
+                    [images[i] for i in chunk],
+                    response_schema=List[ProductSpecs] if self.response_schema else None
+                )
+            except Exception:
+                self._log_batch_failure(image_paths, chunk)
+                return
+            await asyncio.to_thread(self._merge_batch, chunk, keys, results, response_text)
+
+        todo = [i for i, result in enumerate(results) if result is None]
+        await asyncio.gather(*(_run_chunk(chunk) for chunk in self._chunks(todo) if len(chunk) > 1))
+
+        missing = [i for i, result in enumerate(results) if result is None]
+        fallbacks = await asyncio.gather(*(self.aanalyse(image_paths[i]) for i in missing))
+        for i, parsed in zip(missing, fallbacks):
+            results[i] = parsed
+
+        return results
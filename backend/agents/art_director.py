@@ -1,12 +1,18 @@
 # backend/agents/art_director.py
 
-from typing import Any
+import hashlib
+import json
+import random
+from typing import Any, Optional
 
-from llm.gemini_pipeline import GeminiClient
+from cache.disk_cache import DiskCache
+from cache.memory_cache import TTLCache
+from llm.gemini_pipeline import GeminiAdapter
+from llm.structured import StructuredParser
 from schemas import ProductSpecs, ScenePlan
-from config import Configuration
+from config import get_config
 
-config = Configuration()
+config = get_config()
 
 
 class DirectorAgent:
@@ -17,10 +23,34 @@ class DirectorAgent:
     - Produces generation prompts, negative prompts, lighting schema,
       precise inpainting coordinates
     - Converts ProductSpecs into a cinematic brand-aligned scene plan
+    - Memoizes scene plans per canonical ProductSpecs and brand prompt
+      version; `variants` > 1 keeps several plans per specs for
+      campaigns that want diversity, 0 disables the cache.
+    - Corrects a rejected scene plan from the Judge's feedback; corrections
+      are never cached.
+    - Parses through a StructuredParser (local repair, then one re-ask).
     """
 
-    def __init__(self, model: str = config.ART_DIRECTOR_MODEL):
-        self.model = GeminiClient(model=model)
+    def __init__(
+        self,
+        model: str = config.ART_DIRECTOR_MODEL,
+        cache: Optional[TTLCache] = None,
+        variants: int = config.SCENE_VARIANTS,
+        structured: bool = config.STRUCTURED_OUTPUT,
+    ):
+        self.model = GeminiAdapter(model=model)
+        self.model_name = model
+        self.parser = StructuredParser("director", ScenePlan, structured=structured)
+        self.response_schema = ScenePlan if structured else None
+        self.variants = variants
+
+        if cache is None and variants > 0:
+            cache = TTLCache(
+                max_entries=config.SCENE_CACHE_MAX_ENTRIES,
+                ttl=config.SCENE_CACHE_TTL,
+                backing=DiskCache(config.SCENE_CACHE_DIR) if config.SCENE_CACHE_DIR else None,
+            )
+        self.cache = cache
 
         self.system_prompt = (
             "You are the Senior Art Director for 64 Facets, "
@@ -44,28 +74,97 @@ class DirectorAgent:
             "- Coordinates must be physically realistic.\n"
             "- JSON must be valid, minimal, and have NO commentary.\n"
         )
+        # Brand prompt version: editing the prompt invalidates cached plans
+        self.prompt_version = hashlib.sha256(self.system_prompt.encode()).hexdigest()[:12]
 
-    def create_scene(self, specs: ProductSpecs) -> ScenePlan:
-        """
-        Converts ProductSpecs to a ScenePlan
-        """
+    def _build_prompt(self, specs: ProductSpecs) -> str:
         user_message = (
             "Convert the following product specs STRICTLY into a scene plan JSON:\n\n"
             f"{specs.model_dump_json()}"
         )
 
-        prompt = f"{self.system_prompt}\n\n{user_message}"
+        return f"{self.system_prompt}\n\n{user_message}"
+
+    def _build_correction_prompt(self, scene_plan: ScenePlan, feedback: Any) -> str:
+        user_message = (
+            "The Judge rejected the image generated from this scene plan:\n\n"
+            f"{scene_plan.model_dump_json()}\n\n"
+            "Judge feedback:\n"
+            f"{feedback}\n\n"
+            "Return the corrected scene plan JSON. Change only what the feedback asks for."
+        )
+
+        return f"{self.system_prompt}\n\n{user_message}"
+
+    def _cache_key(self, specs: ProductSpecs) -> Optional[str]:
+        if self.cache is None or self.variants < 1:
+            return None
+
+        canonical = json.dumps(specs.model_dump(), sort_keys=True, separators=(",", ":"))
+        variant = random.randrange(self.variants)
+        return hashlib.sha256(
+            f"{canonical}:{self.model_name}:{self.prompt_version}:{variant}".encode()
+        ).hexdigest()
+
+    def _cached(self, key: Optional[str]) -> Optional[ScenePlan]:
+        if key is None:
+            return None
+        value = self.cache.get(key)
+        return ScenePlan.model_validate(value) if value is not None else None
+
+    def _store(self, key: Optional[str], scene_plan: ScenePlan):
+        if key is not None:
+            self.cache.set(key, scene_plan.model_dump())
+
+    def create_scene(self, specs: ProductSpecs) -> ScenePlan:
+        """
+        Converts ProductSpecs to a ScenePlan
+        """
+        key = self._cache_key(specs)
+        cached = self._cached(key)
+        if cached is not None:
+            return cached
+
+        prompt = self._build_prompt(specs)
 
         # Invoke Gemini (text)
-        raw_output = self.model.invoke(prompt)
-
-        try:
-            scene_plan = ScenePlan.model_validate_json(raw_output)
-        except Exception as exc:
-            raise ValueError(
-                "DirectorAgent: JSON Parsing failed.\n"
-                f"Raw model output:\n{raw_output}\n"
-                f"Validation error: {exc}"
-            )
+        raw_output = self.model.invoke(prompt, response_schema=self.response_schema)
 
+        scene_plan = self.parser.parse(raw_output, self.model)
+        self._store(key, scene_plan)
         return scene_plan
+
+    async def acreate_scene(self, specs: ProductSpecs) -> ScenePlan:
+        """
+        Async counterpart of create_scene.
+        """
+        key = self._cache_key(specs)
+        cached = self._cached(key)
+        if cached is not None:
+            return cached
+
+        raw_output = await self.model.ainvoke(self._build_prompt(specs), response_schema=self.response_schema)
+
+        scene_plan = await self.parser.aparse(raw_output, self.model)
+        self._store(key, scene_plan)
+        return scene_plan
+
+    def correct_scene(self, scene_plan: ScenePlan, feedback: Any) -> ScenePlan:
+        """
+        Revises a rejected ScenePlan to address the Judge's feedback.
+        """
+        raw_output = self.model.invoke(
+            self._build_correction_prompt(scene_plan, feedback), response_schema=self.response_schema
+        )
+
+        return self.parser.parse(raw_output, self.model)
+
+    async def acorrect_scene(self, scene_plan: ScenePlan, feedback: Any) -> ScenePlan:
+        """
+        Async counterpart of correct_scene.
+        """
+        raw_output = await self.model.ainvoke(
+            self._build_correction_prompt(scene_plan, feedback), response_schema=self.response_schema
+        )
+
+        return await self.parser.aparse(raw_output, self.model)
@@ -1,10 +1,13 @@
-from typing import Any, Dict
+import asyncio
+from typing import List, Optional
 
-from llm.gemini_pipeline import GeminiClient
+from imaging.preprocess import get_shared_preprocessor
+from llm.gemini_pipeline import GeminiAdapter
+from llm.structured import StructuredParser
 from schemas import ScenePlan, ProductSpecs, JudgeEvaluation
-from config import Configuration
+from config import get_config
 
-config = Configuration()
+config = get_config()
 
 
 class JudgeAgent:
@@ -17,18 +20,24 @@ class JudgeAgent:
         • Brand-aligned
         • Physically realistic
         • Cinematically coherent
+    - Compares the generated candidate against the original product photo
+      when both images are given; they are sent through the shared
+      preprocessor like the Analyst's.
     - Returns strict JSON evaluation to ensure downstream consistency.
     """
 
-    def __init__(self, model: str = config.JUDGE_MODEL):
-        self.model = GeminiClient(model=model)
+    def __init__(self, model: str = config.JUDGE_MODEL, structured: bool = config.STRUCTURED_OUTPUT):
+        self.model = GeminiAdapter(model=model, preprocessor=get_shared_preprocessor())
+        self.parser = StructuredParser("judge", JudgeEvaluation, structured=structured)
+        self.response_schema = JudgeEvaluation if structured else None
 
         self.system_prompt = (
             "You are the Senior Creative Judge for 64 Facets.\n"
-            "You evaluate the realism, accuracy, and brand validity of jewelry scene plans.\n\n"
+            "You evaluate the realism, accuracy, and brand validity of jewelry scene plans\n"
+            "and of the product images generated from them.\n\n"
             "You MUST output a STRICT JSON object with the following structure:\n"
             "{\n"
-            '   "score": float,  // 0.0 - 10.0\n'
+            '   "score": float,  // 0.0 - 100.0\n'
             '   "is_approved": boolean,\n'
             '   "issues": [ "string", ... ],\n'
             '   "recommendations": [ "string", ... ]\n'
@@ -37,14 +46,13 @@ class JudgeAgent:
             "- Score must reflect luxury brand standards.\n"
             "- Approve only if scene plan is feasible and editorial-grade.\n"
             "- Be strict: unrealistic lighting, impossible geometry, or noisy prompts must be penalized.\n"
+            "- If images are attached, the first is the original product photo and the second the\n"
+            "  generated candidate: the product must be unchanged (metal, stones, setting) and sit\n"
+            "  naturally in the scene (placement, scale, shadow, edges).\n"
             "- JSON must be VALID and contain ZERO commentary.\n"
         )
 
-    def evaluate(self, specs: ProductSpecs, plan: ScenePlan) -> JudgeEvaluation:
-        """
-        Evaluates a scene plan against product specs using the Gemini model.
-        """
-
+    def _build_prompt(self, specs: ProductSpecs, plan: ScenePlan) -> str:
         user_message = (
             "Evaluate the following object pair.\n\n"
             "Product Specifications:\n"
@@ -54,17 +62,53 @@ class JudgeAgent:
             "Return STRICT evaluation JSON."
         )
 
-        prompt = f"{self.system_prompt}\n\n{user_message}"
+        return f"{self.system_prompt}\n\n{user_message}"
 
-        raw_output = self.model.invoke(prompt)
+    def _read_images(self, *paths: Optional[str]) -> List[bytes]:
+        images = []
+        for path in paths:
+            if path is not None:
+                with open(path, "rb") as f:
+                    images.append(f.read())
+        return images
+
+    def evaluate(
+        self,
+        specs: ProductSpecs,
+        plan: ScenePlan,
+        original_image_path: Optional[str] = None,
+        candidate_image_path: Optional[str] = None,
+    ) -> JudgeEvaluation:
+        """
+        Evaluates a scene plan against product specs using the Gemini model,
+        together with the original and generated images if given.
+        """
+        prompt = self._build_prompt(specs, plan)
+        images = self._read_images(original_image_path, candidate_image_path)
+
+        if images:
+            raw_output = self.model.invoke_with_images(prompt, images, response_schema=self.response_schema)
+        else:
+            raw_output = self.model.invoke(prompt, response_schema=self.response_schema)
+
+        return self.parser.parse(raw_output, self.model)
+
+    async def aevaluate(
+        self,
+        specs: ProductSpecs,
+        plan: ScenePlan,
+        original_image_path: Optional[str] = None,
+        candidate_image_path: Optional[str] = None,
+    ) -> JudgeEvaluation:
+        """
+        Async counterpart of evaluate.
+        """
+        prompt = self._build_prompt(specs, plan)
+        images = await asyncio.to_thread(self._read_images, original_image_path, candidate_image_path)
 
-        try:
-            evaluation = JudgeEvaluation.model_validate_json(raw_output)
-        except Exception as exc:
-            raise ValueError(
-                "JudgeAgent: JSON decoding failed.\n"
-                f"Raw model output:\n{raw_output}\n"
-                f"Validation error: {exc}"
-            )
+        if images:
+            raw_output = await self.model.ainvoke_with_images(prompt, images, response_schema=self.response_schema)
+        else:
+            raw_output = await self.model.ainvoke(prompt, response_schema=self.response_schema)
 
-        return evaluation
+        return await self.parser.aparse(raw_output, self.model)
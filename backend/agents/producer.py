@@ -1,10 +1,23 @@
-from typing import Any, Optional
+import asyncio
+import base64
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
 
-from llm.gemini_pipeline import GeminiClient
-from schemas import ScenePlan, ImageResult
-from config import Configuration
+from cache.scene_cache import SceneCache, scene_key
+from imaging.composite import Compositor
+from imaging.pool import ImagePool, run_composite
+from llm.gemini_pipeline import GeminiAdapter
+from llm.structured import StructuredParser
+from schemas import ImageInstruction, ImageResult, ScenePlan
+from config import get_config
 
-config = Configuration()
+config = get_config()
+
+# Scene digests remembered for forget_scene
+_REMEMBERED_SCENES = 1024
 
 
 class ProducerAgent:
@@ -15,11 +28,40 @@ class ProducerAgent:
     - Converts a validated ScenePlan into an actual image generation request.
     - Forwards instructions to Gemini's image generation model (Imagen 3).
     - Returns the generated base64 image along with metadata.
+    - Places the original product into the base scene locally (Compositor,
+      run in the ImagePool), so product pixels are never re-generated;
+      model inpainting is only an optional refinement of the
+      surroundings (`refine`).
+    - Reuses base scenes from a SceneCache keyed on the scene parameters,
+      output size and candidate variant, so a backdrop shared by a
+      collection is generated once rather than once per SKU, and evicts
+      a scene again when the Judge rejects it (`forget_scene`).
     """
 
-    def __init__(self, model: str = config.IMAGE_MODEL):
+    def __init__(
+        self,
+        model: str = config.PRODUCER_MODEL,
+        structured: bool = config.STRUCTURED_OUTPUT,
+        compositor: Optional[Compositor] = None,
+        refine: bool = config.COMPOSITE_REFINE,
+        scene_cache: Optional[SceneCache] = None,
+        pool: Optional[ImagePool] = None,
+    ):
         # Model must be Imagen 3 or another image-capable Gemini model
-        self.model = GeminiClient(model=model)
+        self.model = GeminiAdapter(model=model)
+        self.model_name = model
+        self.compositor = compositor or Compositor()
+        self.refine = refine
+        self.pool = pool or ImagePool(workers=0)
+
+        if scene_cache is None and config.BASE_SCENE_CACHE_DIR:
+            scene_cache = SceneCache(config.BASE_SCENE_CACHE_DIR, max_bytes=config.BASE_SCENE_CACHE_MAX_BYTES)
+        self.scene_cache = scene_cache
+        # sha256 of a served scene -> its cache key
+        self._scene_keys: "OrderedDict[str, str]" = OrderedDict()
+        self._scene_keys_lock = threading.Lock()
+        self.parser = StructuredParser("producer", ImageInstruction, structured=structured)
+        self.response_schema = ImageInstruction if structured else None
 
         self.system_prompt = (
             "You are the Image Producer. Your job is to take a validated ScenePlan\n"
@@ -38,40 +80,241 @@ class ProducerAgent:
             "- JSON must contain no commentary.\n"
         )
 
-    def generate_image(self, plan: ScenePlan) -> ImageResult:
-        """
-        Uses the scene plan to request an image generation response.
-        """
-
+    def _build_prompt(self, plan: ScenePlan) -> str:
         user_message = (
             "Convert the following ScenePlan into STRICT JSON image instructions:\n\n"
             f"{plan.model_dump_json()}"
         )
 
-        prompt = f"{self.system_prompt}\n\n{user_message}"
+        return f"{self.system_prompt}\n\n{user_message}"
+
+    def _to_result(self, image_b64: str, instruction, cached: bool = False) -> ImageResult:
+        return ImageResult(
+            image_base64=image_b64,
+            metadata={
+                "source": "imagen-3",
+                "width": instruction.width,
+                "height": instruction.height,
+                "cached": cached,
+            },
+        )
+
+    def _remember_scene(self, key: str, data: bytes):
+        digest = hashlib.sha256(data).hexdigest()
+        with self._scene_keys_lock:
+            self._scene_keys[digest] = key
+            self._scene_keys.move_to_end(digest)
+            while len(self._scene_keys) > _REMEMBERED_SCENES:
+                self._scene_keys.popitem(last=False)
+
+    def _cached_scene(self, plan: ScenePlan, instruction, variant: int = 0) -> Tuple[Optional[str], Optional[bytes]]:
+        """
+        Returns (cache key, cached scene bytes or None).
+        """
+        if self.scene_cache is None:
+            return None, None
+        key = scene_key(plan, instruction.width, instruction.height, self.model_name, variant)
+        data = self.scene_cache.get(key)
+        if data is not None:
+            self._remember_scene(key, data)
+        return key, data
+
+    def _store_scene(self, key: Optional[str], data: bytes):
+        if key is not None:
+            self.scene_cache.set(key, data)
+            self._remember_scene(key, data)
+
+    def forget_scene(self, sha256: str):
+        """
+        Evicts the cached base scene with this content digest, so a
+        backdrop the Judge rejected is not served again.
+        """
+        with self._scene_keys_lock:
+            key = self._scene_keys.pop(sha256, None)
+        if key is not None and self.scene_cache is not None:
+            self.scene_cache.delete(key)
+
+    def _generate_scene(self, plan: ScenePlan, variant: int = 0) -> Tuple[bytes, Any, bool]:
+        """
+        Returns (scene bytes, image instruction, served from cache).
+        """
+        prompt = self._build_prompt(plan)
 
         # Step 1: Convert ScenePlan → Image instruction JSON
-        instruction_raw = self.model.invoke(prompt)
-
-        try:
-            instruction = ScenePlan.ImageInstruction.model_validate_json(instruction_raw)
-        except Exception as exc:
-            raise ValueError(
-                "ProducerAgent: Failed to parse image instruction JSON.\n"
-                f"Raw:\n{instruction_raw}\n"
-                f"Error: {exc}"
-            )
-
-        # Step 2: Invoke actual image generation (Imagen 3)
-        # GeminiClient.invoke_image returns base64 image
-        image_b64 = self.model.invoke_image(
+        instruction = self.parser.parse(
+            self.model.invoke(prompt, response_schema=self.response_schema), self.model
+        )
+
+        # Step 2: Reuse a base scene generated for the same scene parameters
+        key, data = self._cached_scene(plan, instruction, variant)
+        if data is not None:
+            return data, instruction, True
+
+        # Step 3: Invoke actual image generation (Imagen 3)
+        # GeminiAdapter.invoke_image returns base64 image
+        data = base64.b64decode(self.model.invoke_image(
             prompt=instruction.prompt,
             negative_prompt=instruction.negative_prompt,
             width=instruction.width,
             height=instruction.height,
+        ))
+        self._store_scene(key, data)
+        return data, instruction, False
+
+    async def _agenerate_scene(self, plan: ScenePlan, variant: int = 0) -> Tuple[bytes, Any, bool]:
+        instruction = await self.parser.aparse(
+            await self.model.ainvoke(self._build_prompt(plan), response_schema=self.response_schema),
+            self.model,
         )
 
-        return ImageResult(
-            image_base64=image_b64,
-            metadata={"source": "imagen-3", "width": instruction.width, "height": instruction.height},
+        key, data = await asyncio.to_thread(self._cached_scene, plan, instruction, variant)
+        if data is not None:
+            return data, instruction, True
+
+        image_b64 = await self.model.ainvoke_image(
+            prompt=instruction.prompt,
+            negative_prompt=instruction.negative_prompt,
+            width=instruction.width,
+            height=instruction.height,
+        )
+        # Megabytes of base64: decoded off the event loop
+        data = await asyncio.to_thread(base64.b64decode, image_b64)
+        await asyncio.to_thread(self._store_scene, key, data)
+        return data, instruction, False
+
+    def generate_image(self, plan: ScenePlan, variant: int = 0) -> ImageResult:
+        """
+        Uses the scene plan to request an image generation response.
+        `variant` tells best-of-N candidates apart in the scene cache.
+        """
+        data, instruction, cached = self._generate_scene(plan, variant)
+        return self._to_result(base64.b64encode(data).decode("ascii"), instruction, cached=cached)
+
+    async def agenerate_image(self, plan: ScenePlan, variant: int = 0) -> ImageResult:
+        """
+        Async counterpart of generate_image.
+        """
+        data, instruction, cached = await self._agenerate_scene(plan, variant)
+        image_b64 = await asyncio.to_thread(lambda: base64.b64encode(data).decode("ascii"))
+        return self._to_result(image_b64, instruction, cached=cached)
+
+    def _scene_plan(self, scene_plan: ScenePlan, feedback: Optional[str]) -> ScenePlan:
+        if not feedback:
+            return scene_plan
+        return scene_plan.model_copy(
+            update={"prompt": f"{scene_plan.prompt}\n\nAddress this review feedback: {feedback}"}
         )
+
+    def _composite(self, base_scene: bytes, product_png_path: str, scene_plan: ScenePlan) -> bytes:
+        return self.pool.run_buffer(
+            run_composite,
+            base_scene,
+            self.compositor,
+            product_png_path,
+            scene_plan.inpaint_coordinates,
+            scene_plan.lighting_map,
+        )
+
+    async def _acomposite(self, base_scene: bytes, product_png_path: str, scene_plan: ScenePlan) -> bytes:
+        return await self.pool.arun_buffer(
+            run_composite,
+            base_scene,
+            self.compositor,
+            product_png_path,
+            scene_plan.inpaint_coordinates,
+            scene_plan.lighting_map,
+        )
+
+    def _refine_inputs(
+        self, composite: bytes, product_png_path: str, scene_plan: ScenePlan, feedback: Optional[str]
+    ):
+        from PIL import Image
+
+        with Image.open(io.BytesIO(composite)) as scene, Image.open(product_png_path) as product:
+            mask = self.compositor.refine_mask(scene.size, product, scene_plan.inpaint_coordinates)
+        buffer = io.BytesIO()
+        mask.save(buffer, format="PNG")
+        prompt = (
+            f"{scene_plan.prompt}\n\n"
+            "Blend the product into the scene: contact shadow, reflections and edges only. "
+            "Do not add, remove or change any object."
+        )
+        if feedback:
+            prompt += f"\n\nAddress this review feedback: {feedback}"
+        return prompt, buffer.getvalue()
+
+    def generate_base_scene(
+        self, scene_plan: ScenePlan, feedback: Optional[str] = None, variant: int = 0
+    ) -> bytes:
+        """
+        The scene without the product, as image bytes.
+        """
+        return self._generate_scene(self._scene_plan(scene_plan, feedback), variant)[0]
+
+    async def agenerate_base_scene(
+        self, scene_plan: ScenePlan, feedback: Optional[str] = None, variant: int = 0
+    ) -> bytes:
+        data, _, _ = await self._agenerate_scene(self._scene_plan(scene_plan, feedback), variant)
+        return data
+
+    def composite_candidate(
+        self,
+        base_scene: bytes,
+        product_png_path: str,
+        scene_plan: ScenePlan,
+        feedback: Optional[str] = None,
+    ) -> bytes:
+        """
+        Composites the product into an existing base scene at the plan's
+        inpaint coordinates, refined by the model if `refine` is set.
+        Returns PNG bytes.
+        """
+        composite = self._composite(base_scene, product_png_path, scene_plan)
+        if not self.refine:
+            return composite
+
+        prompt, mask = self._refine_inputs(composite, product_png_path, scene_plan, feedback)
+        return base64.b64decode(self.model.invoke_image_edit(prompt, composite, mask))
+
+    async def acomposite_candidate(
+        self,
+        base_scene: bytes,
+        product_png_path: str,
+        scene_plan: ScenePlan,
+        feedback: Optional[str] = None,
+    ) -> bytes:
+        composite = await self._acomposite(base_scene, product_png_path, scene_plan)
+        if not self.refine:
+            return composite
+
+        prompt, mask = await asyncio.to_thread(
+            self._refine_inputs, composite, product_png_path, scene_plan, feedback
+        )
+        return await asyncio.to_thread(
+            base64.b64decode, await self.model.ainvoke_image_edit(prompt, composite, mask)
+        )
+
+    def generate_final_candidate(
+        self,
+        product_png_path: str,
+        scene_plan: ScenePlan,
+        feedback: Optional[str] = None,
+    ) -> bytes:
+        """
+        Base scene from the model, product composited locally at the
+        plan's inpaint coordinates. Returns PNG bytes.
+        """
+        base_scene = self.generate_base_scene(scene_plan, feedback)
+        return self.composite_candidate(base_scene, product_png_path, scene_plan)
+
+    async def agenerate_final_candidate(
+        self,
+        product_png_path: str,
+        scene_plan: ScenePlan,
+        feedback: Optional[str] = None,
+    ) -> bytes:
+        """
+        Async counterpart of generate_final_candidate.
+        """
+        base_scene = await self.agenerate_base_scene(scene_plan, feedback)
+        return await self.acomposite_candidate(base_scene, product_png_path, scene_plan)
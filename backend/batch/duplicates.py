@@ -0,0 +1,156 @@
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from pydantic import BaseModel
+
+from imaging.phash import hamming_distances, max_distance, perceptual_hash_file
+from config import get_config
+
+config = get_config()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS phashes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    path TEXT NOT NULL,
+    phash TEXT NOT NULL,
+    version TEXT NOT NULL,
+    analysis TEXT NOT NULL,
+    scene_plan TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+
+def _jsonable(value: Any) -> Any:
+    if hasattr(value, "model_dump"):
+        return value.model_dump()
+    return str(value)
+
+
+class DuplicateGroup(BaseModel):
+    """
+    Near-identical images of one piece. Analyst and Director run for
+    the representative only; with a `seed` from an earlier batch they
+    do not run at all.
+    """
+    representative: str
+    members: List[str]
+    phash: int
+    seed: Optional[Dict[str, Any]] = None
+
+
+class DuplicateIndex:
+    """
+    Perceptual-hash index of processed product images
+
+    Responsibilities:
+    - Groups the images of a batch whose pHash similarity is at least
+      `min_similarity`, so a piece shot several times is analysed and
+      planned once.
+    - Remembers analysis and scene plan per representative, so
+      near-duplicates in later batches reuse them. Entries of an older
+      pipeline version are never reused.
+    - Compares against all stored hashes at once in memory; SQLite only
+      holds the durable copy.
+    """
+
+    def __init__(
+        self,
+        path: str = config.DEDUPE_DB_PATH,
+        min_similarity: float = config.DEDUPE_MIN_SIMILARITY,
+    ):
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+
+        self.max_distance = max_distance(min_similarity)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+        rows = self._conn.execute("SELECT id, phash, version FROM phashes ORDER BY id").fetchall()
+        self._ids = [row["id"] for row in rows]
+        self._versions = [row["version"] for row in rows]
+        self._hashes = np.array([int(row["phash"], 16) for row in rows], dtype=np.uint64)
+
+    def hash_file(self, file: str) -> int:
+        return perceptual_hash_file(file)
+
+    def match(self, phash: int, version: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns the stored result closest to `phash` under `version`,
+        or None if nothing is similar enough.
+        """
+        with self._lock:
+            if not self._ids:
+                return None
+            distances = hamming_distances(self._hashes, phash)
+            versions = np.array(self._versions) == version
+            candidates = np.flatnonzero(versions & (distances <= self.max_distance))
+            if candidates.size == 0:
+                return None
+            best = candidates[np.argmin(distances[candidates])]
+            row = self._conn.execute(
+                "SELECT path, analysis, scene_plan FROM phashes WHERE id = ?", (self._ids[best],)
+            ).fetchone()
+
+        return {
+            "path": row["path"],
+            "analysis": json.loads(row["analysis"]),
+            "scene_plan": json.loads(row["scene_plan"]),
+            "distance": int(distances[best]),
+        }
+
+    def remember(self, file: str, phash: int, version: str, analysis: Any, scene_plan: Any):
+        with self._lock:
+            cur = self._conn.execute(
+                "INSERT INTO phashes (path, phash, version, analysis, scene_plan, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    file,
+                    f"{phash:016x}",
+                    version,
+                    json.dumps(analysis, default=_jsonable),
+                    json.dumps(scene_plan, default=_jsonable),
+                    time.time(),
+                ),
+            )
+            self._ids.append(cur.lastrowid)
+            self._versions.append(version)
+            self._hashes = np.append(self._hashes, np.uint64(phash))
+
+    def group(self, files: List[Path], version: str, hashes: Optional[List[int]] = None) -> List[DuplicateGroup]:
+        """
+        Splits `files` into near-duplicate groups, in input order, and
+        attaches stored results from earlier batches as seeds. Pass
+        `hashes` if they were computed elsewhere, e.g. in an ImagePool.
+        """
+        if hashes is None:
+            hashes = [self.hash_file(str(file)) for file in files]
+
+        groups: List[DuplicateGroup] = []
+        representatives = np.zeros(0, dtype=np.uint64)
+
+        for file, phash in zip(files, hashes):
+            if representatives.size:
+                distances = hamming_distances(representatives, phash)
+                closest = int(np.argmin(distances))
+                if distances[closest] <= self.max_distance:
+                    groups[closest].members.append(str(file))
+                    continue
+            groups.append(DuplicateGroup(representative=str(file), members=[str(file)], phash=phash))
+            representatives = np.append(representatives, np.uint64(phash))
+
+        for group in groups:
+            group.seed = self.match(group.phash, version)
+        return groups
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,89 @@
+import asyncio
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from config import get_config
+
+config = get_config()
+
+# (job_id, position, file) of the image the current task is working on
+_current_item: ContextVar[Optional[Tuple[str, int, str]]] = ContextVar("current_item", default=None)
+
+
+class ProgressBus:
+    """
+    In-process fan-out of job progress events
+
+    Responsibilities:
+    - Delivers events for a job to every client subscribed to it.
+    - Accepts events from the event loop and from worker threads alike.
+    - Lets deep code (graph nodes) emit events for the image it is
+      working on without threading a job id through every call.
+
+    Events are best-effort: a client that falls more than
+    PROGRESS_QUEUE_SIZE events behind loses the oldest ones and should
+    fall back to GET /jobs/{id} for the authoritative state.
+    """
+
+    def __init__(self, queue_size: int = config.PROGRESS_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._subscribers: Dict[str, List[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = {}
+
+    @asynccontextmanager
+    async def subscribe(self, job_id: str) -> AsyncIterator[asyncio.Queue]:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        entry = (asyncio.get_running_loop(), queue)
+        with self._lock:
+            self._subscribers.setdefault(job_id, []).append(entry)
+        try:
+            yield queue
+        finally:
+            with self._lock:
+                subscribers = self._subscribers.get(job_id, [])
+                if entry in subscribers:
+                    subscribers.remove(entry)
+                if not subscribers:
+                    self._subscribers.pop(job_id, None)
+
+    @staticmethod
+    def _deliver(queue: asyncio.Queue, event: Dict[str, Any]):
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(event)
+
+    def publish(self, job_id: str, event: str, **data: Any):
+        with self._lock:
+            subscribers = list(self._subscribers.get(job_id, ()))
+        if not subscribers:
+            return
+
+        payload = {"event": event, "job_id": job_id, "ts": time.time(), **data}
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._deliver, queue, payload)
+            except RuntimeError:
+                # Subscriber's loop is closed; it unsubscribes on its own
+                pass
+
+    def emit(self, event: str, **data: Any):
+        """
+        Publishes an event for the image the calling task is working
+        on. Does nothing outside of a `track` block.
+        """
+        item = _current_item.get()
+        if item is None:
+            return
+        job_id, position, file = item
+        self.publish(job_id, event, position=position, file=file, **data)
+
+    @contextmanager
+    def track(self, job_id: str, position: int, file: str):
+        token = _current_item.set((job_id, position, file))
+        try:
+            yield
+        finally:
+            _current_item.reset(token)
@@ -0,0 +1,71 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, Iterable, List, Optional, TypeVar, Union
+
+from config import get_config
+
+config = get_config()
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class BatchExecutor:
+    """
+    Bounded-concurrency batch runner
+
+    Responsibilities:
+    - Runs a per-item job for every input with at most
+      `max_in_flight` jobs active at once.
+    - Keeps blocking pipeline work off the event loop.
+    - Isolates failures: a failing item yields its exception
+      instead of aborting the batch.
+    - Returns outcomes in input order.
+    """
+
+    def __init__(self, max_in_flight: int = config.BATCH_MAX_IN_FLIGHT):
+        if max_in_flight < 1:
+            raise ValueError("BatchExecutor: max_in_flight must be at least 1.")
+
+        self.max_in_flight = max_in_flight
+        self._pool: Optional[ThreadPoolExecutor] = None
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(
+                max_workers=self.max_in_flight,
+                thread_name_prefix="batch"
+            )
+        return self._pool
+
+    async def map(
+        self,
+        fn: Callable[[T], Union[R, Awaitable[R]]],
+        items: Iterable[T],
+    ) -> List[Union[R, Exception]]:
+        """
+        Applies fn to every item and returns the results
+        (or the raised exceptions) in input order.
+
+        Coroutine functions are awaited on the event loop,
+        blocking functions run in the executor's worker pool.
+        """
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(self.max_in_flight)
+        is_async = asyncio.iscoroutinefunction(fn)
+
+        async def _run(item: T) -> Union[R, Exception]:
+            async with semaphore:
+                try:
+                    if is_async:
+                        return await fn(item)
+                    return await loop.run_in_executor(self._get_pool(), fn, item)
+                except Exception as exc:
+                    return exc
+
+        return list(await asyncio.gather(*(_run(item) for item in items)))
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
@@ -0,0 +1,461 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from batch.events import ProgressBus
+from config import get_config
+
+config = get_config()
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    cancel_requested INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS job_items (
+    job_id TEXT NOT NULL REFERENCES jobs(id),
+    position INTEGER NOT NULL,
+    file TEXT NOT NULL,
+    status TEXT NOT NULL,
+    error TEXT,
+    result TEXT,
+    updated_at REAL NOT NULL,
+    owner TEXT,
+    lease_until REAL,
+    PRIMARY KEY (job_id, position)
+);
+CREATE INDEX IF NOT EXISTS idx_job_items_status ON job_items(status);
+CREATE INDEX IF NOT EXISTS idx_job_items_file ON job_items(file, status);
+"""
+
+PENDING = "pending"
+RUNNING = "running"
+PROCESSED = "processed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+_FINISHED = (PROCESSED, FAILED, CANCELLED)
+
+
+class JobQueue:
+    """
+    Persistent batch job queue
+
+    Responsibilities:
+    - Stores every job and its images in SQLite so queued work
+      survives restarts.
+    - Hands out single images to workers, so throughput scales
+      with the number of workers draining the queue.
+    - Tracks per-image status, results and cancellation.
+    - Leases every claimed image to this queue's `owner`, so processes
+      sharing the database only take over images whose owner stopped
+      renewing them.
+    """
+
+    def __init__(
+        self,
+        path: str = config.JOB_DB_PATH,
+        lease_seconds: float = config.JOB_LEASE_SECONDS,
+        owner: Optional[str] = None,
+    ):
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+
+        self.lease_seconds = lease_seconds
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._migrate()
+
+    def _migrate(self):
+        # Databases created before leases existed
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(job_items)")}
+        for column, kind in (("owner", "TEXT"), ("lease_until", "REAL")):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE job_items ADD COLUMN {column} {kind}")
+
+    def requeue_interrupted(self) -> int:
+        """
+        Returns running images whose lease expired (their owner crashed
+        or was stopped) to the queue. Images a live process is working
+        on keep their lease.
+        """
+        now = time.time()
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE job_items SET status = ?, owner = NULL, lease_until = NULL, updated_at = ? "
+                "WHERE status = ? AND (lease_until IS NULL OR lease_until < ?)",
+                (PENDING, now, RUNNING, now),
+            )
+            return cur.rowcount
+
+    def requeue_owned(self) -> int:
+        """
+        Returns the images this queue's owner is running to the queue,
+        for a graceful shutdown.
+        """
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE job_items SET status = ?, owner = NULL, lease_until = NULL, updated_at = ? "
+                "WHERE status = ? AND owner = ?",
+                (PENDING, time.time(), RUNNING, self.owner),
+            )
+            return cur.rowcount
+
+    def renew_leases(self) -> int:
+        """
+        Extends the lease of every image this queue's owner is running.
+        """
+        now = time.time()
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE job_items SET lease_until = ? WHERE status = ? AND owner = ?",
+                (now + self.lease_seconds, RUNNING, self.owner),
+            )
+            return cur.rowcount
+
+    def active_job_for(self, file: str) -> Optional[str]:
+        """
+        Returns the id of an unfinished job that already holds `file`.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT job_id FROM job_items WHERE file = ? AND status IN (?, ?) LIMIT 1",
+                (file, PENDING, RUNNING),
+            ).fetchone()
+        return row["job_id"] if row else None
+
+    def enqueue(self, files: List[str]) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT INTO jobs (id, created_at, updated_at) VALUES (?, ?, ?)",
+                    (job_id, now, now),
+                )
+                self._conn.executemany(
+                    "INSERT INTO job_items (job_id, position, file, status, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    [(job_id, i, file, PENDING, now) for i, file in enumerate(files)],
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+        return job_id
+
+    def claim(self) -> Optional[Dict[str, Any]]:
+        """
+        Marks the oldest pending image as running and returns it.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT i.job_id, i.position, i.file FROM job_items i "
+                    "JOIN jobs j ON j.id = i.job_id "
+                    "WHERE i.status = ? AND j.cancel_requested = 0 "
+                    "ORDER BY j.created_at, i.position LIMIT 1",
+                    (PENDING,),
+                ).fetchone()
+                if row is not None:
+                    now = time.time()
+                    self._conn.execute(
+                        "UPDATE job_items SET status = ?, owner = ?, lease_until = ?, updated_at = ? "
+                        "WHERE job_id = ? AND position = ?",
+                        (RUNNING, self.owner, now + self.lease_seconds, now, row["job_id"], row["position"]),
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+        return dict(row) if row is not None else None
+
+    def finish(
+        self,
+        job_id: str,
+        position: int,
+        result: Optional[Dict[str, Any]] = None,
+        error: Optional[str] = None,
+    ):
+        now = time.time()
+        with self._lock:
+            # Only while this owner still holds the image; after an expired
+            # lease another process has taken it over
+            self._conn.execute(
+                "UPDATE job_items SET status = ?, result = ?, error = ?, owner = NULL, "
+                "lease_until = NULL, updated_at = ? "
+                "WHERE job_id = ? AND position = ? AND owner = ?",
+                (
+                    FAILED if error is not None else PROCESSED,
+                    json.dumps(result, default=str) if result is not None else None,
+                    error,
+                    now,
+                    job_id,
+                    position,
+                    self.owner,
+                ),
+            )
+            self._conn.execute("UPDATE jobs SET updated_at = ? WHERE id = ?", (now, job_id))
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Cancels all images of a job that have not started yet.
+        Images already running are allowed to finish.
+        """
+        now = time.time()
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE jobs SET cancel_requested = 1, updated_at = ? WHERE id = ?",
+                (now, job_id),
+            )
+            if cur.rowcount == 0:
+                return False
+            self._conn.execute(
+                "UPDATE job_items SET status = ?, updated_at = ? WHERE job_id = ? AND status = ?",
+                (CANCELLED, now, job_id, PENDING),
+            )
+        return True
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if job is None:
+                return None
+            items = self._conn.execute(
+                "SELECT position, file, status, error, result FROM job_items "
+                "WHERE job_id = ? ORDER BY position",
+                (job_id,),
+            ).fetchall()
+
+        progress = {status: 0 for status in (PENDING, RUNNING) + _FINISHED}
+        for item in items:
+            progress[item["status"]] += 1
+
+        if progress[PENDING] == 0 and progress[RUNNING] == 0:
+            status = "cancelled" if job["cancel_requested"] else "completed"
+        elif progress[RUNNING] == 0 and progress[PROCESSED] + progress[FAILED] == 0:
+            status = "queued"
+        else:
+            status = "running"
+
+        return {
+            "job_id": job_id,
+            "status": status,
+            "created_at": job["created_at"],
+            "updated_at": job["updated_at"],
+            "total": len(items),
+            "progress": progress,
+            "results": [
+                {
+                    "file": Path(item["file"]).name,
+                    "status": item["status"],
+                    "error": item["error"],
+                    "result": json.loads(item["result"]) if item["result"] else None,
+                }
+                for item in items
+            ],
+        }
+
+    def unfinished_files(self, job_id: str) -> List[str]:
+        """
+        Files of `job_id` that are pending or running, in job order.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT file FROM job_items WHERE job_id = ? AND status IN (?, ?) ORDER BY position",
+                (job_id, PENDING, RUNNING),
+            ).fetchall()
+        return [row["file"] for row in rows]
+
+    def pending_count(self, job_id: Optional[str] = None) -> int:
+        with self._lock:
+            if job_id is None:
+                row = self._conn.execute(
+                    "SELECT COUNT(*) AS n FROM job_items WHERE status = ?", (PENDING,)
+                ).fetchone()
+            else:
+                row = self._conn.execute(
+                    "SELECT COUNT(*) AS n FROM job_items WHERE job_id = ? AND status = ?", (job_id, PENDING)
+                ).fetchone()
+        return row["n"]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class JobWorkers:
+    """
+    Background workers draining a JobQueue
+
+    Each worker claims one image at a time and runs it through
+    `processor`; raising the worker count raises throughput without
+    any change to the API.
+
+    With a ProgressBus, every image is announced when it starts and
+    when it finishes, and events emitted while processing it are
+    attributed to its job.
+
+    With a `preparer`, the first worker to claim an image of a job runs
+    `preparer(job_id, unfinished_files)` once for the whole job; every
+    worker waits for it before processing an image of that job and
+    passes its result to `processor(path, prepared)`. A failing
+    preparer is logged and the images are processed with None.
+
+    While running, the workers renew the leases of their images and
+    requeue images whose lease expired, so a crashed sibling process
+    does not strand its work.
+    """
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        processor: Callable[[Path], Awaitable[Dict[str, Any]]],
+        workers: int = config.JOB_WORKERS,
+        poll_interval: float = 1.0,
+        progress: Optional[ProgressBus] = None,
+        preparer: Optional[Callable[[str, List[Path]], Awaitable[Any]]] = None,
+    ):
+        if workers < 1:
+            raise ValueError("JobWorkers: workers must be at least 1.")
+
+        self.queue = queue
+        self.processor = processor
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.progress = progress
+        self.preparer = preparer
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        # job id -> preparation task, and images of that job in flight here
+        self._prepared: Dict[str, asyncio.Future] = {}
+        self._in_flight: Dict[str, int] = {}
+
+    def notify(self):
+        """
+        Wakes idle workers after new work was enqueued.
+        """
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _publish(self, item: Dict[str, Any], event: str, **data: Any):
+        if self.progress is not None:
+            self.progress.publish(
+                item["job_id"], event, position=item["position"], file=Path(item["file"]).name, **data
+            )
+
+    async def _prepare(self, job_id: str) -> Any:
+        try:
+            files = await asyncio.to_thread(self.queue.unfinished_files, job_id)
+            return await self.preparer(job_id, [Path(f) for f in files])
+        except Exception:
+            logger.exception("JobWorkers: preparing job %s failed; processing its images unprepared", job_id)
+            return None
+
+    async def _prepared_for(self, job_id: str) -> Any:
+        if self.preparer is None:
+            return None
+        if job_id not in self._prepared:
+            self._prepared[job_id] = asyncio.ensure_future(self._prepare(job_id))
+        # Shielded: one cancelled worker must not cancel it for the others
+        return await asyncio.shield(self._prepared[job_id])
+
+    async def _release(self, job_id: str):
+        self._in_flight[job_id] -= 1
+        if self._in_flight[job_id] > 0:
+            return
+        del self._in_flight[job_id]
+        if job_id in self._prepared and await asyncio.to_thread(self.queue.pending_count, job_id) == 0:
+            # Only if no image of the job was claimed in the meantime
+            if job_id not in self._in_flight:
+                self._prepared.pop(job_id, None)
+
+    async def _run_item(self, item: Dict[str, Any]):
+        self._in_flight[item["job_id"]] = self._in_flight.get(item["job_id"], 0) + 1
+        try:
+            await self._run_claimed(item)
+        finally:
+            await self._release(item["job_id"])
+
+    async def _run_claimed(self, item: Dict[str, Any]):
+        self._publish(item, "item_started")
+        # Outside the tracking context: the preparation is not this image's
+        prepared = await self._prepared_for(item["job_id"])
+        tracking = (
+            self.progress.track(item["job_id"], item["position"], Path(item["file"]).name)
+            if self.progress is not None else nullcontext()
+        )
+        try:
+            with tracking:
+                if self.preparer is None:
+                    result = await self.processor(Path(item["file"]))
+                else:
+                    result = await self.processor(Path(item["file"]), prepared)
+        except Exception as exc:
+            await asyncio.to_thread(self.queue.finish, item["job_id"], item["position"], None, str(exc))
+            self._publish(item, "item_finished", status=FAILED, error=str(exc))
+        else:
+            await asyncio.to_thread(self.queue.finish, item["job_id"], item["position"], result)
+            self._publish(item, "item_finished", status=PROCESSED, result=result)
+
+    async def _worker(self):
+        while True:
+            item = await asyncio.to_thread(self.queue.claim)
+            if item is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await self._run_item(item)
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(self.queue.lease_seconds / 3)
+            try:
+                await asyncio.to_thread(self.queue.renew_leases)
+                if await asyncio.to_thread(self.queue.requeue_interrupted):
+                    self.notify()
+            except Exception:
+                logger.exception("JobWorkers: renewing job leases failed")
+
+    def start(self):
+        self._wakeup = asyncio.Event()
+        self.queue.requeue_interrupted()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._heartbeat()))
+
+    async def stop(self):
+        tasks = self._tasks + list(self._prepared.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # Interrupted images go back now instead of when their lease expires
+        await asyncio.to_thread(self.queue.requeue_owned)
+        self._tasks = []
+        self._prepared = {}
+        self._in_flight = {}
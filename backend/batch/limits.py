@@ -0,0 +1,74 @@
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict, Optional
+
+from config import get_config
+from llm.rate_limit import AdaptiveConcurrency
+
+config = get_config()
+
+
+def default_agent_limits() -> Dict[str, int]:
+    return {
+        "analyst": config.ANALYST_CONCURRENCY,
+        "director": config.DIRECTOR_CONCURRENCY,
+        "producer": config.PRODUCER_CONCURRENCY,
+        "judge": config.JUDGE_CONCURRENCY,
+    }
+
+
+class AgentLimits:
+    """
+    Per-agent concurrency caps
+
+    Bounds how many calls may be in flight against each agent at once,
+    independent of how many images the batch runs in parallel. Sync and
+    async holders share one counter per agent, so job workers and async
+    endpoints together stay within the configured limit.
+    Agents without a configured limit are not throttled.
+    """
+
+    def __init__(self, limits: Optional[Dict[str, int]] = None):
+        limits = default_agent_limits() if limits is None else limits
+
+        for name, limit in limits.items():
+            if limit < 1:
+                raise ValueError(f"AgentLimits: limit for '{name}' must be at least 1.")
+
+        self.limits = dict(limits)
+        # A fixed-size AdaptiveConcurrency: one slot count for threads and event loops
+        self._slots = {
+            name: AdaptiveConcurrency(initial=limit, minimum=limit, maximum=limit)
+            for name, limit in self.limits.items()
+        }
+
+    @contextmanager
+    def hold(self, agent: str):
+        """
+        Blocks until a slot for the given agent is free.
+        """
+        slots = self._slots.get(agent)
+        if slots is None:
+            yield
+            return
+
+        slots.acquire()
+        try:
+            yield
+        finally:
+            slots.release()
+
+    @asynccontextmanager
+    async def ahold(self, agent: str):
+        """
+        Async counterpart of hold; waits without blocking the event loop.
+        """
+        slots = self._slots.get(agent)
+        if slots is None:
+            yield
+            return
+
+        await slots.aacquire()
+        try:
+            yield
+        finally:
+            slots.release()
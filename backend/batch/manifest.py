@@ -0,0 +1,133 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from config import get_config
+
+config = get_config()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS manifest (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    version TEXT NOT NULL,
+    status TEXT NOT NULL,
+    output TEXT,
+    updated_at REAL NOT NULL
+);
+"""
+
+QUEUED = "queued"
+PROCESSED = "processed"
+FAILED = "failed"
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as _f:
+        for chunk in iter(lambda: _f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class FolderManifest:
+    """
+    Record of which input files were processed, and how
+
+    Responsibilities:
+    - Stores content hash, size/mtime, pipeline version and output
+      location per input file.
+    - Finds new or changed files in a folder. Unchanged files are
+      recognised from their stat alone, so only changed files are
+      hashed and a re-scan of a large catalog stays cheap.
+    - Tracked files are left in place after processing.
+    """
+
+    def __init__(self, path: str = config.MANIFEST_DB_PATH):
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    def _rows(self) -> Dict[str, sqlite3.Row]:
+        with self._lock:
+            return {row["path"]: row for row in self._conn.execute("SELECT * FROM manifest").fetchall()}
+
+    def changed_files(self, files: List[Path], version: str) -> Tuple[List[Path], int]:
+        """
+        Returns the files that need processing under `version` and
+        marks them as queued, plus the number of files skipped.
+        """
+        known = self._rows()
+        changed = []
+        queued = []
+        touched = []
+        now = time.time()
+
+        for file in files:
+            stat = os.stat(file)
+            row = known.get(str(file))
+            # Queued and failed files are offered again; enqueueing
+            # dedupes against jobs that still hold them
+            done = row is not None and row["version"] == version and row["status"] == PROCESSED
+            if done and (row["size"], row["mtime_ns"]) == (stat.st_size, stat.st_mtime_ns):
+                continue
+
+            sha = file_sha256(str(file))
+            if done and row["sha256"] == sha:
+                # Touched but identical, e.g. re-synced: remember the new stat
+                touched.append((stat.st_size, stat.st_mtime_ns, now, str(file)))
+                continue
+
+            changed.append(file)
+            queued.append((str(file), stat.st_size, stat.st_mtime_ns, sha, version, QUEUED, now))
+
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    "UPDATE manifest SET size = ?, mtime_ns = ?, updated_at = ? WHERE path = ?",
+                    touched,
+                )
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO manifest (path, size, mtime_ns, sha256, version, status, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    queued,
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+        return changed, len(files) - len(changed)
+
+    def is_tracked(self, file: str) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM manifest WHERE path = ?", (file,)).fetchone()
+        return row is not None
+
+    def finish(self, file: str, output: Optional[str] = None, failed: bool = False):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE manifest SET status = ?, output = ?, updated_at = ? WHERE path = ?",
+                (FAILED if failed else PROCESSED, output, time.time(), file),
+            )
+
+    def get(self, file: str) -> Optional[Dict[str, object]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM manifest WHERE path = ?", (file,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,225 @@
+import asyncio
+import json
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import get_config
+
+config = get_config()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    image TEXT NOT NULL,
+    sku TEXT NOT NULL,
+    score REAL,
+    retries INTEGER NOT NULL DEFAULT 0,
+    generation_file TEXT,
+    created_at REAL NOT NULL,
+    payload TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_results_score ON results(score);
+CREATE INDEX IF NOT EXISTS idx_results_retries ON results(retries);
+CREATE INDEX IF NOT EXISTS idx_results_sku ON results(sku);
+CREATE INDEX IF NOT EXISTS idx_results_created ON results(created_at);
+"""
+
+# Uploads are stored as <stem>-<sha12>.<ext>; the SKU is the original stem
+_UPLOAD_SUFFIX = re.compile(r"-[0-9a-f]{12}$")
+
+
+def sku_from_path(image_path: str) -> str:
+    return _UPLOAD_SUFFIX.sub("", Path(image_path).stem)
+
+
+def _jsonable(value: Any) -> Any:
+    if hasattr(value, "model_dump"):
+        return value.model_dump()
+    return str(value)
+
+
+class ResultStore:
+    """
+    Indexed store for pipeline results
+
+    Responsibilities:
+    - Keeps one row per processed image with score, retries, SKU and
+      timestamp as indexed columns and the full result as JSON.
+    - Inserts a whole batch in a single transaction.
+    - Answers filtered, keyset-paginated queries without touching
+      the filesystem.
+    """
+
+    def __init__(self, path: str = config.RESULTS_DB_PATH):
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    def _row(self, record: Dict[str, Any], now: float) -> tuple:
+        judgement = record.get("judgement") or {}
+        score = judgement.get("score") if isinstance(judgement, dict) else None
+        return (
+            record["image"],
+            record.get("sku") or sku_from_path(record["image"]),
+            score,
+            record.get("retries", 0),
+            record.get("generation_file"),
+            record.get("created_at", now),
+            json.dumps(record, default=_jsonable),
+        )
+
+    def add_many(self, records: List[Dict[str, Any]]) -> List[int]:
+        """
+        Inserts `records` in one transaction and returns their ids.
+        """
+        if not records:
+            return []
+
+        now = time.time()
+        rows = [self._row(record, now) for record in records]
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                ids = [
+                    self._conn.execute(
+                        "INSERT INTO results (image, sku, score, retries, generation_file, created_at, payload) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        row,
+                    ).lastrowid
+                    for row in rows
+                ]
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return ids
+
+    def add(self, record: Dict[str, Any]) -> int:
+        return self.add_many([record])[0]
+
+    def query(
+        self,
+        min_score: Optional[float] = None,
+        score_below: Optional[float] = None,
+        min_retries: Optional[int] = None,
+        max_retries: Optional[int] = None,
+        sku: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        cursor: Optional[int] = None,
+        limit: int = 50,
+    ) -> Dict[str, Any]:
+        """
+        Returns the newest matching results first. Pass `next_cursor`
+        back as `cursor` to get the following page.
+        """
+        filters = [
+            ("score >= ?", min_score),
+            ("score < ?", score_below),
+            ("retries >= ?", min_retries),
+            ("retries <= ?", max_retries),
+            ("sku = ?", sku),
+            ("created_at >= ?", since),
+            ("created_at < ?", until),
+            ("id < ?", cursor),
+        ]
+        clauses = [clause for clause, value in filters if value is not None]
+        params: List[Any] = [value for _, value in filters if value is not None]
+
+        query = "SELECT * FROM results"
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY id DESC LIMIT ?"
+        params.append(limit + 1)
+
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+
+        page = rows[:limit]
+        return {
+            "items": [
+                {
+                    "id": row["id"],
+                    "sku": row["sku"],
+                    "score": row["score"],
+                    "retries": row["retries"],
+                    "created_at": row["created_at"],
+                    **json.loads(row["payload"]),
+                }
+                for row in page
+            ],
+            "next_cursor": page[-1]["id"] if len(rows) > limit else None,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class ResultBuffer:
+    """
+    Write buffer for the results of one job
+
+    Responsibilities:
+    - Collects the records of images finishing close together and
+      writes them with one ResultStore.add_many, so a job costs one
+      transaction per flush instead of one per image.
+    - Flushes once `max_records` are waiting or `max_delay` seconds
+      after the first of them arrived; every caller gets its own row id.
+    """
+
+    def __init__(
+        self,
+        store: ResultStore,
+        max_records: int = config.RESULTS_FLUSH_RECORDS,
+        max_delay: float = config.RESULTS_FLUSH_DELAY,
+    ):
+        self.store = store
+        self.max_records = max(max_records, 1)
+        self.max_delay = max_delay
+        self._pending: List[Tuple[Dict[str, Any], asyncio.Future]] = []
+        self._timer: Optional[asyncio.Task] = None
+
+    async def add(self, record: Dict[str, Any]) -> int:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((record, future))
+        if len(self._pending) >= self.max_records:
+            await self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.ensure_future(self._flush_later())
+        return await future
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.max_delay)
+        self._timer = None
+        await self.flush()
+
+    async def flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        try:
+            ids = await asyncio.to_thread(self.store.add_many, [record for record, _ in batch])
+        except Exception as exc:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+
+        for (_, future), result_id in zip(batch, ids):
+            # A cancelled caller's record is still written
+            if not future.done():
+                future.set_result(result_id)
@@ -0,0 +1,93 @@
+import asyncio
+import hashlib
+import re
+import uuid
+from pathlib import Path
+from typing import Optional
+
+from fastapi import UploadFile
+
+from config import get_config
+
+config = get_config()
+
+# Leading bytes of the image formats the pipeline accepts
+_MAGIC_BYTES = {
+    b"\x89PNG\r\n\x1a\n": ".png",
+    b"\xff\xd8\xff": ".jpg",
+}
+_HEADER_BYTES = max(len(magic) for magic in _MAGIC_BYTES)
+
+
+class ImageUploadError(ValueError):
+    """
+    Raised when an uploaded file is rejected during streaming.
+    """
+
+
+def detect_image_type(header: bytes) -> Optional[str]:
+    """
+    Returns the file extension matching the magic bytes, or None.
+    """
+    for magic, suffix in _MAGIC_BYTES.items():
+        if header.startswith(magic):
+            return suffix
+    return None
+
+
+def _safe_stem(filename: Optional[str]) -> str:
+    stem = Path(filename or "").stem
+    stem = re.sub(r"[^A-Za-z0-9_-]+", "_", stem).strip("_")
+    return stem[:64] or "upload"
+
+
+async def stream_upload(
+    file: UploadFile,
+    directory: Path,
+    max_bytes: int = config.UPLOAD_MAX_BYTES,
+    chunk_size: int = config.UPLOAD_CHUNK_BYTES,
+) -> Path:
+    """
+    Streams an upload to `directory` in fixed-size chunks.
+
+    The type check, size limit and content hash are applied while
+    streaming, so at most one chunk is held in memory. The file is
+    stored as `<stem>-<sha256 prefix><ext>`, which never overwrites
+    a different upload that shares the same client-side name.
+    """
+    tmp_path = directory / f".upload-{uuid.uuid4().hex}.part"
+    digest = hashlib.sha256()
+    header = b""
+    suffix = None
+    size = 0
+
+    try:
+        with open(tmp_path, "wb") as out:
+            while chunk := await file.read(chunk_size):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise ImageUploadError(
+                        f"{file.filename}: exceeds upload limit of {max_bytes} bytes."
+                    )
+
+                if suffix is None:
+                    header += chunk[:_HEADER_BYTES - len(header)]
+                    if len(header) >= _HEADER_BYTES:
+                        suffix = detect_image_type(header)
+                        if suffix is None:
+                            raise ImageUploadError(f"{file.filename}: not a PNG or JPEG image.")
+
+                digest.update(chunk)
+                await asyncio.to_thread(out.write, chunk)
+
+        if suffix is None:
+            # Stream ended before a full header arrived
+            suffix = detect_image_type(header)
+            if suffix is None:
+                raise ImageUploadError(f"{file.filename}: not a PNG or JPEG image.")
+
+        save_path = directory / f"{_safe_stem(file.filename)}-{digest.hexdigest()[:12]}{suffix}"
+        tmp_path.replace(save_path)
+        return save_path
+    finally:
+        tmp_path.unlink(missing_ok=True)
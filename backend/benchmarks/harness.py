@@ -0,0 +1,105 @@
+import io
+import resource
+import sys
+from pathlib import Path
+from typing import List, Optional, Sequence
+
+import numpy as np
+from PIL import Image
+from pydantic import BaseModel
+
+from llm.base import BaseLLMClient
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """
+    Linearly interpolated percentile, `q` in [0, 100].
+    """
+    if not values:
+        return 0.0
+    return float(np.percentile(np.asarray(values, dtype=np.float64), q))
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+class BenchmarkResult(BaseModel):
+    scenario: str
+    batch_size: int
+    concurrency: int
+    errors: int
+    seconds: float
+    throughput: float
+    p50: float
+    p95: float
+    p99: float
+    peak_rss_mb: float
+
+    @classmethod
+    def from_run(
+        cls,
+        scenario: str,
+        batch_size: int,
+        concurrency: int,
+        seconds: float,
+        latencies: List[float],
+        errors: int,
+    ) -> "BenchmarkResult":
+        return cls(
+            scenario=scenario,
+            batch_size=batch_size,
+            concurrency=concurrency,
+            errors=errors,
+            seconds=seconds,
+            # Only completed images count towards throughput
+            throughput=len(latencies) / seconds if seconds > 0 else 0.0,
+            p50=percentile(latencies, 50),
+            p95=percentile(latencies, 95),
+            p99=percentile(latencies, 99),
+            peak_rss_mb=peak_rss_mb(),
+        )
+
+    def row(self) -> str:
+        return (
+            f"{self.scenario:<9} {self.batch_size:>6} {self.concurrency:>5} "
+            f"{self.throughput:>9.2f} {self.p50:>7.2f} {self.p95:>7.2f} {self.p99:>7.2f} "
+            f"{self.errors:>6} {self.peak_rss_mb:>9.1f}"
+        )
+
+
+HEADER = (
+    f"{'scenario':<9} {'batch':>6} {'conc':>5} "
+    f"{'img/s':>9} {'p50 s':>7} {'p95 s':>7} {'p99 s':>7} "
+    f"{'errors':>6} {'rss MB':>9}"
+)
+
+
+def install_client(client: BaseLLMClient, *agents) -> BaseLLMClient:
+    """
+    Points every agent at `client` instead of its Gemini adapter.
+    """
+    for agent in agents:
+        agent.model = client
+    return client
+
+
+def write_product_images(directory: Path, count: int, size: int = 512, seed: Optional[int] = None) -> List[Path]:
+    """
+    Writes `count` distinct RGBA product PNGs. Distinct content matters:
+    uploads are deduplicated by hash.
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    paths = []
+    for i in range(count):
+        pixels = rng.integers(0, 256, (size, size, 4), dtype=np.uint8)
+        pixels[..., 3] = 255
+        buffer = io.BytesIO()
+        Image.fromarray(pixels, "RGBA").save(buffer, format="PNG", compress_level=1)
+        path = directory / f"product_{i:04d}.png"
+        path.write_bytes(buffer.getvalue())
+        paths.append(path)
+    return paths
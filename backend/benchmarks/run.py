@@ -0,0 +1,197 @@
+"""
+Offline throughput benchmark for the 64 Facets pipeline.
+
+Every agent talks to a SimulatedLLMClient, so runs cost nothing and
+need no network. Usage (from backend/):
+
+    python -m benchmarks.run --batch-sizes 1,8,32 --concurrency 1,4,16
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+# Settings are read at import time, so the sandbox has to exist first
+_WORKDIR = Path(tempfile.mkdtemp(prefix="studio-bench-"))
+os.environ.setdefault("INPUT_DIR", str(_WORKDIR / "input"))
+os.environ.setdefault("OUTPUT_DIR", str(_WORKDIR / "output"))
+os.environ.setdefault("STATE_DIR", str(_WORKDIR / "state"))
+# Caches would turn every run after the first into a cache benchmark
+os.environ.setdefault("ANALYST_CACHE_DIR", "")
+os.environ.setdefault("SCENE_VARIANTS", "0")
+os.environ.setdefault("BASE_SCENE_CACHE_DIR", "")
+# The Gemini client is constructed but never called
+os.environ.setdefault("GEMINI_API_KEY", "offline-benchmark")
+
+from benchmarks.harness import (  # noqa: E402
+    HEADER,
+    BenchmarkResult,
+    install_client,
+    write_product_images,
+)
+from llm.simulated import SimulatedLLMClient, SimulationProfile  # noqa: E402
+from services import services  # noqa: E402
+
+_FINISHED = ("processed", "failed", "cancelled")
+
+
+async def bench_graph(routes, batch_size: int, concurrency: int) -> BenchmarkResult:
+    """
+    Runs `batch_size` images straight through GraphWorkflow.ainvoke with
+    at most `concurrency` graphs in flight.
+    """
+    from schemas import GraphState
+
+    images = write_product_images(_WORKDIR / "graph" / f"{batch_size}-{concurrency}", batch_size)
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    errors = 0
+
+    async def run(path: Path):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await services.workflow.ainvoke(GraphState(image_path=str(path)))
+            except Exception:
+                errors += 1
+            else:
+                latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(run(path) for path in images))
+    seconds = time.perf_counter() - started
+
+    return BenchmarkResult.from_run("graph", batch_size, concurrency, seconds, latencies, errors)
+
+
+async def bench_endpoint(routes, batch_size: int, concurrency: int, poll: float = 0.05) -> BenchmarkResult:
+    """
+    Uploads `batch_size` images to /process/upload-batch and polls
+    /jobs/{id} until the job is done, with `concurrency` job workers.
+    Latency is measured per image from upload to completion.
+    """
+    import httpx
+    from fastapi import FastAPI
+
+    from batch.jobs import JobQueue, JobWorkers
+
+    queue = JobQueue(str(_WORKDIR / "state" / f"jobs-{batch_size}-{concurrency}.sqlite3"))
+    workers = JobWorkers(
+        queue, routes.process_job_item, workers=concurrency, poll_interval=poll, preparer=routes.prepare_job
+    )
+    services.override("jobs", queue)
+    services.override("job_workers", workers)
+
+    app = FastAPI()
+    app.include_router(routes.router)
+
+    images = write_product_images(_WORKDIR / "uploads" / f"{batch_size}-{concurrency}", batch_size)
+    files = [("files", (path.name, path.read_bytes(), "image/png")) for path in images]
+
+    latencies: List[float] = []
+    errors = 0
+    done = set()
+
+    workers.start()
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            started = time.perf_counter()
+            response = await client.post("/process/upload-batch", files=files)
+            response.raise_for_status()
+            job_id = response.json()["job_id"]
+
+            while True:
+                job = (await client.get(f"/jobs/{job_id}")).json()
+                elapsed = time.perf_counter() - started
+                for position, item in enumerate(job["results"]):
+                    if item["status"] in _FINISHED and position not in done:
+                        done.add(position)
+                        if item["status"] == "processed":
+                            latencies.append(elapsed)
+                        else:
+                            errors += 1
+                if job["status"] in ("completed", "cancelled"):
+                    break
+                await asyncio.sleep(poll)
+            seconds = time.perf_counter() - started
+    finally:
+        await workers.stop()
+        queue.close()
+
+    return BenchmarkResult.from_run("endpoint", batch_size, concurrency, seconds, latencies, errors)
+
+
+def _ints(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Offline pipeline benchmark with a simulated LLM backend.")
+    parser.add_argument("--scenario", choices=["graph", "endpoint", "all"], default="all")
+    parser.add_argument("--batch-sizes", type=_ints, default=[1, 8, 32])
+    parser.add_argument("--concurrency", type=_ints, default=[1, 4, 16])
+    parser.add_argument("--n", type=int, default=None, help="one run of N images at concurrency N (smoke test)")
+    parser.add_argument("--text-latency", type=float, default=0.8, help="median seconds per text call")
+    parser.add_argument("--image-latency", type=float, default=6.0, help="median seconds per image generation")
+    parser.add_argument("--latency-sigma", type=float, default=0.4)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--malformed-rate", type=float, default=0.0)
+    parser.add_argument("--fenced-rate", type=float, default=0.0, help="share of replies needing local JSON repair")
+    parser.add_argument("--reject-rate", type=float, default=0.0, help="share of Judge verdicts that reject")
+    parser.add_argument("--image-bytes", type=int, default=1_500_000)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--json", type=Path, default=None, help="also write results to this file")
+    return parser.parse_args(argv)
+
+
+async def main(argv=None) -> List[BenchmarkResult]:
+    args = parse_args(argv)
+    if args.n is not None:
+        args.batch_sizes = [args.n]
+        args.concurrency = [args.n]
+
+    import routes
+
+    profile = SimulationProfile(
+        text_latency=args.text_latency,
+        image_latency=args.image_latency,
+        latency_sigma=args.latency_sigma,
+        failure_rate=args.failure_rate,
+        malformed_rate=args.malformed_rate,
+        fenced_rate=args.fenced_rate,
+        reject_rate=args.reject_rate,
+        image_bytes=args.image_bytes,
+        seed=args.seed,
+    )
+    routes.ensure_directories()
+    install_client(
+        SimulatedLLMClient(profile),
+        services.analyst, services.director, services.producer, services.judge
+    )
+
+    scenarios = ["graph", "endpoint"] if args.scenario == "all" else [args.scenario]
+    benches = {"graph": bench_graph, "endpoint": bench_endpoint}
+
+    print(HEADER)
+    results = []
+    for scenario in scenarios:
+        for batch_size in args.batch_sizes:
+            for concurrency in args.concurrency:
+                result = await benches[scenario](routes, batch_size, concurrency)
+                print(result.row(), flush=True)
+                results.append(result)
+
+    if args.json is not None:
+        args.json.write_text(json.dumps([r.model_dump() for r in results], indent=2))
+    return results
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
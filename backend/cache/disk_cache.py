@@ -0,0 +1,133 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+
+class DiskCache:
+    """
+    Persistent key -> JSON cache
+
+    Responsibilities:
+    - Stores one JSON file per key under `directory`, so entries
+      survive process restarts.
+    - Evicts least recently used entries once `max_bytes`
+      or `max_entries` is exceeded.
+    - Keeps a small in-memory layer of hot entries so repeated
+      lookups avoid disk reads entirely.
+    - Counts hits and misses.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_bytes: int = 64 * 1024 * 1024,
+        max_entries: Optional[int] = None,
+        memory_entries: int = 256,
+    ):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, Any]" = OrderedDict()
+        # key -> size on disk, ordered from least to most recently used
+        self._index: "OrderedDict[str, int]" = OrderedDict()
+        self._total_bytes = 0
+        self._load_index()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.json"
+
+    def _load_index(self):
+        entries = []
+        for path in self.directory.glob("*.json"):
+            stat = path.stat()
+            entries.append((stat.st_mtime, path.stem, stat.st_size))
+
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self._total_bytes += size
+
+    def _remember(self, key: str, value: Any):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _evict(self):
+        while self._index and (
+            self._total_bytes > self.max_bytes
+            or (self.max_entries is not None and len(self._index) > self.max_entries)
+        ):
+            key, size = self._index.popitem(last=False)
+            self._total_bytes -= size
+            self._memory.pop(key, None)
+            self._path(key).unlink(missing_ok=True)
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            if key not in self._index:
+                self.misses += 1
+                return None
+
+            self._index.move_to_end(key)
+            if key in self._memory:
+                self.hits += 1
+                self._memory.move_to_end(key)
+                return self._memory[key]
+
+            path = self._path(key)
+            try:
+                value = json.loads(path.read_text())
+            except (OSError, ValueError):
+                # Entry vanished or is corrupt: drop it
+                self._total_bytes -= self._index.pop(key)
+                path.unlink(missing_ok=True)
+                self.misses += 1
+                return None
+
+            # Refresh mtime so recency survives restarts
+            os.utime(path)
+            self.hits += 1
+            self._remember(key, value)
+            return value
+
+    def set(self, key: str, value: Any):
+        data = json.dumps(value)
+        path = self._path(key)
+        tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+
+        with self._lock:
+            tmp_path.write_text(data)
+            os.replace(tmp_path, path)
+
+            self._total_bytes -= self._index.pop(key, 0)
+            self._index[key] = len(data.encode())
+            self._total_bytes += self._index[key]
+            self._remember(key, value)
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            for key in self._index:
+                self._path(key).unlink(missing_ok=True)
+            self._index.clear()
+            self._memory.clear()
+            self._total_bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._index),
+                "bytes": self._total_bytes,
+            }
@@ -0,0 +1,81 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from cache.disk_cache import DiskCache
+
+
+class TTLCache:
+    """
+    In-memory LRU cache with per-entry expiry
+
+    Responsibilities:
+    - Keeps up to `max_entries` values, evicting the least recently used.
+    - Drops entries older than `ttl` seconds.
+    - Optionally writes through to a DiskCache so entries survive
+      restarts; expiry is stored alongside the value.
+    - Counts hits and misses.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl: Optional[float] = 3600,
+        backing: Optional[DiskCache] = None,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.backing = backing
+
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        # key -> (expires_at, value)
+        self._entries: "OrderedDict[str, Tuple[Optional[float], Any]]" = OrderedDict()
+
+    def _expired(self, expires_at: Optional[float]) -> bool:
+        return expires_at is not None and expires_at <= time.time()
+
+    def _put(self, key: str, expires_at: Optional[float], value: Any):
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if not self._expired(expires_at):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+
+            if self.backing is not None:
+                stored = self.backing.get(key)
+                if stored is not None and not self._expired(stored["expires_at"]):
+                    self._put(key, stored["expires_at"], stored["value"])
+                    self.hits += 1
+                    return stored["value"]
+
+            self.misses += 1
+            return None
+
+    def set(self, key: str, value: Any):
+        expires_at = time.time() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._put(key, expires_at, value)
+        if self.backing is not None:
+            self.backing.set(key, {"expires_at": expires_at, "value": value})
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+            }
@@ -0,0 +1,139 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from config import get_config
+
+config = get_config()
+
+
+def _normalize(text: Optional[str]) -> str:
+    return re.sub(r"\s+", " ", text or "").strip().lower()
+
+
+def scene_key(scene_plan: Any, width: int, height: int, model: str = "", variant: int = 0) -> str:
+    """
+    Cache key of a base scene: prompt, negative prompt and lighting
+    map (case and whitespace normalized), output size, model and
+    variant, so best-of-N candidates each get their own backdrop. The
+    inpaint coordinates are left out, they only concern the product.
+    """
+    lighting = scene_plan.lighting_map
+    payload = {
+        "prompt": _normalize(scene_plan.prompt),
+        "negative_prompt": _normalize(scene_plan.negative_prompt),
+        "source_direction": _normalize(lighting.source_direction),
+        "temperature": _normalize(lighting.temperature),
+        "size": [int(width), int(height)],
+        "model": model,
+        "variant": int(variant),
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+class SceneCache:
+    """
+    Persistent cache of generated base scenes
+
+    Responsibilities:
+    - Stores one image file per scene key under `directory`, so a
+      backdrop shared by a whole collection is generated once.
+    - Evicts least recently used scenes once `max_bytes` is exceeded.
+      Recency is the file mtime, so it survives restarts.
+    - Keeps no image bytes in memory; counts hits and misses.
+    """
+
+    def __init__(self, directory: str = config.BASE_SCENE_CACHE_DIR, max_bytes: int = config.BASE_SCENE_CACHE_MAX_BYTES):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        # key -> size on disk, ordered from least to most recently used
+        self._index: "OrderedDict[str, int]" = OrderedDict()
+        self._total_bytes = 0
+        self._load_index()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.img"
+
+    def _load_index(self):
+        entries = []
+        for path in self.directory.glob("*.img"):
+            stat = path.stat()
+            entries.append((stat.st_mtime, path.stem, stat.st_size))
+
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self._total_bytes += size
+
+    def _evict(self):
+        while self._index and self._total_bytes > self.max_bytes:
+            key, size = self._index.popitem(last=False)
+            self._total_bytes -= size
+            self._path(key).unlink(missing_ok=True)
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            if key not in self._index:
+                self.misses += 1
+                return None
+
+            path = self._path(key)
+            try:
+                data = path.read_bytes()
+                os.utime(path)
+            except OSError:
+                # Entry vanished: drop it
+                self._total_bytes -= self._index.pop(key)
+                self.misses += 1
+                return None
+
+            self._index.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def set(self, key: str, data: bytes):
+        if len(data) > self.max_bytes:
+            return
+        path = self._path(key)
+        tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+
+        with self._lock:
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, path)
+
+            self._total_bytes -= self._index.pop(key, 0)
+            self._index[key] = len(data)
+            self._total_bytes += len(data)
+            self._evict()
+
+    def delete(self, key: str):
+        with self._lock:
+            if key in self._index:
+                self._total_bytes -= self._index.pop(key)
+                self._path(key).unlink(missing_ok=True)
+
+    def clear(self):
+        with self._lock:
+            for key in self._index:
+                self._path(key).unlink(missing_ok=True)
+            self._index.clear()
+            self._total_bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._index),
+                "bytes": self._total_bytes,
+            }
@@ -1,4 +1,6 @@
 import os
+from functools import lru_cache
+
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -15,3 +17,64 @@ class Configuration:
         self.INPUT_DIR = os.getenv("INPUT_DIR", "")
         self.MIN_ACCEPTED_SCORE = int(os.getenv("MIN_ACCEPTED_SCORE", "90"))
         self.MAX_RETRIES = int(os.getenv("MAX_RETRIES", "3"))
+        self.BATCH_MAX_IN_FLIGHT = int(os.getenv("BATCH_MAX_IN_FLIGHT", "8"))
+        self.ANALYST_CONCURRENCY = int(os.getenv("ANALYST_CONCURRENCY", "4"))
+        self.DIRECTOR_CONCURRENCY = int(os.getenv("DIRECTOR_CONCURRENCY", "4"))
+        self.PRODUCER_CONCURRENCY = int(os.getenv("PRODUCER_CONCURRENCY", "2"))
+        self.JUDGE_CONCURRENCY = int(os.getenv("JUDGE_CONCURRENCY", "4"))
+        self.LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "32"))
+        self.ANALYST_CACHE_DIR = os.getenv("ANALYST_CACHE_DIR", ".cache/analyst")
+        self.ANALYST_CACHE_MAX_BYTES = int(os.getenv("ANALYST_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+        self.UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(50 * 1024 * 1024)))
+        self.UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", str(1024 * 1024)))
+        self.STATE_DIR = os.getenv("STATE_DIR", "state")
+        self.JOB_DB_PATH = os.getenv("JOB_DB_PATH", os.path.join(self.STATE_DIR, "jobs.sqlite3"))
+        self.JOB_WORKERS = int(os.getenv("JOB_WORKERS", str(self.BATCH_MAX_IN_FLIGHT)))
+        self.JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+        self.VISION_PREPROCESS = os.getenv("VISION_PREPROCESS", "true").lower() in ("1", "true", "yes")
+        self.VISION_MAX_LONG_EDGE = int(os.getenv("VISION_MAX_LONG_EDGE", "1536"))
+        self.VISION_IMAGE_FORMAT = os.getenv("VISION_IMAGE_FORMAT", "WEBP")
+        self.VISION_IMAGE_QUALITY = int(os.getenv("VISION_IMAGE_QUALITY", "85"))
+        self.VISION_CACHE_ENTRIES = int(os.getenv("VISION_CACHE_ENTRIES", "128"))
+        self.ANALYST_BATCH_SIZE = int(os.getenv("ANALYST_BATCH_SIZE", "8"))
+        self.PRODUCER_CANDIDATES = int(os.getenv("PRODUCER_CANDIDATES", "1"))
+        self.PRESCREEN_ENABLED = os.getenv("PRESCREEN_ENABLED", "true").lower() in ("1", "true", "yes")
+        self.PRESCREEN_MIN_SIMILARITY = float(os.getenv("PRESCREEN_MIN_SIMILARITY", "0.5"))
+        self.SCENE_VARIANTS = int(os.getenv("SCENE_VARIANTS", "1"))
+        self.SCENE_CACHE_TTL = float(os.getenv("SCENE_CACHE_TTL", "86400"))
+        self.SCENE_CACHE_MAX_ENTRIES = int(os.getenv("SCENE_CACHE_MAX_ENTRIES", "1024"))
+        self.SCENE_CACHE_DIR = os.getenv("SCENE_CACHE_DIR", "")
+        self.LLM_RPM = float(os.getenv("LLM_RPM", "60"))
+        self.LLM_TPM = float(os.getenv("LLM_TPM", "1000000"))
+        self.LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+        self.LLM_MAX_ATTEMPTS = int(os.getenv("LLM_MAX_ATTEMPTS", "5"))
+        self.LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "1.0"))
+        self.LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "30.0"))
+        self.CHECKPOINT_DB_PATH = os.getenv("CHECKPOINT_DB_PATH", os.path.join(self.STATE_DIR, "checkpoints.sqlite3"))
+        self.CHECKPOINT_TTL = float(os.getenv("CHECKPOINT_TTL", str(7 * 24 * 3600)))
+        self.MANIFEST_DB_PATH = os.getenv("MANIFEST_DB_PATH", os.path.join(self.STATE_DIR, "manifest.sqlite3"))
+        self.RESULTS_DB_PATH = os.getenv("RESULTS_DB_PATH", os.path.join(self.STATE_DIR, "results.sqlite3"))
+        self.RESULTS_FLUSH_RECORDS = int(os.getenv("RESULTS_FLUSH_RECORDS", "32"))
+        self.RESULTS_FLUSH_DELAY = float(os.getenv("RESULTS_FLUSH_DELAY", "0.25"))
+        self.BLOB_DIR = os.getenv("BLOB_DIR", os.path.join(self.STATE_DIR, "blobs"))
+        self.PROGRESS_QUEUE_SIZE = int(os.getenv("PROGRESS_QUEUE_SIZE", "1000"))
+        self.PROGRESS_HEARTBEAT = float(os.getenv("PROGRESS_HEARTBEAT", "15"))
+        self.STRUCTURED_OUTPUT = os.getenv("STRUCTURED_OUTPUT", "false").lower() in ("1", "true", "yes")
+        self.JSON_REASK = os.getenv("JSON_REASK", "true").lower() in ("1", "true", "yes")
+        self.DEDUPE_ENABLED = os.getenv("DEDUPE_ENABLED", "true").lower() in ("1", "true", "yes")
+        self.DEDUPE_MIN_SIMILARITY = float(os.getenv("DEDUPE_MIN_SIMILARITY", "0.9"))
+        self.DEDUPE_DB_PATH = os.getenv("DEDUPE_DB_PATH", os.path.join(self.STATE_DIR, "duplicates.sqlite3"))
+        self.IMAGE_POOL_WORKERS = int(os.getenv("IMAGE_POOL_WORKERS", str(os.cpu_count() or 1)))
+        self.COMPOSITE_REFINE = os.getenv("COMPOSITE_REFINE", "false").lower() in ("1", "true", "yes")
+        self.COMPOSITE_TEMPERATURE_STRENGTH = float(os.getenv("COMPOSITE_TEMPERATURE_STRENGTH", "0.5"))
+        self.COMPOSITE_SHADOW_OPACITY = float(os.getenv("COMPOSITE_SHADOW_OPACITY", "0.35"))
+        self.BASE_SCENE_CACHE_DIR = os.getenv("BASE_SCENE_CACHE_DIR", ".cache/scenes")
+        self.BASE_SCENE_CACHE_MAX_BYTES = int(os.getenv("BASE_SCENE_CACHE_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+
+
+@lru_cache(maxsize=None)
+def get_config() -> Configuration:
+    """
+    Returns the process-wide Configuration, read from the environment once.
+    """
+    return Configuration()
@@ -0,0 +1,89 @@
+import re
+from typing import Any, Iterable
+
+# Retry stages: what the Producer has to redo after a rejection
+SCENE = "scene"
+COMPOSITE = "composite"
+
+# Issues a new inpaint box fixes without a new base scene
+_PLACEMENT_TERMS = (
+    "placement", "placed", "position", "offset", "off-centre", "off-center",
+    "scale", "too large", "too small", "too big", "size of the",
+    "floating", "hovering",
+)
+# Issues only the model refinement pass can fix in a kept scene; the
+# local Compositor renders them the same way again
+_BLEND_TERMS = (
+    "shadow", "edge", "halo", "fringe", "cut-out", "cutout", "outline",
+    "pasted", "blend", "seam", "tint", "color cast", "colour cast",
+    "white balance", "perspective", "rotation", "tilted",
+)
+# Issues that need a different backdrop
+_SCENE_TERMS = (
+    "background", "backdrop", "surface", "prop", "composition",
+    "lighting", "mood", "atmosphere", "depth of field", "bokeh", "clutter",
+    "extra jewel", "extra stone", "duplicate", "watermark", "lettering",
+    "brand", "style", "setting looks", "environment",
+)
+
+
+def _text(feedback: Any) -> str:
+    if feedback is None:
+        return ""
+    if isinstance(feedback, str):
+        return feedback
+    if isinstance(feedback, dict):
+        return " ".join(_text(feedback.get(key)) for key in ("feedback", "issues", "recommendations"))
+    if isinstance(feedback, (list, tuple)):
+        return " ".join(_text(item) for item in feedback)
+    if hasattr(feedback, "issues"):
+        return " ".join(_text(getattr(feedback, key, None)) for key in ("issues", "recommendations"))
+    return str(feedback)
+
+
+def _mentions(text: str, terms: Iterable[str]) -> bool:
+    return any(re.search(rf"\b{re.escape(term)}", text) for term in terms)
+
+
+def classify_feedback(feedback: Any, refine: bool = False) -> str:
+    """
+    COMPOSITE if the Judge only complains about how the product sits in
+    the scene (placement, scale; with `refine` also shadow, edges,
+    tint), SCENE otherwise. Mixed, empty or unrecognised feedback
+    counts as SCENE, so a retry never keeps a backdrop the Judge
+    objected to.
+    """
+    text = _text(feedback).lower()
+    composite_terms = _PLACEMENT_TERMS + (_BLEND_TERMS if refine else ())
+    scene_terms = _SCENE_TERMS + (() if refine else _BLEND_TERMS)
+    if _mentions(text, composite_terms) and not _mentions(text, scene_terms):
+        return COMPOSITE
+    return SCENE
+
+
+def changes_lighting(previous: Any, corrected: Any) -> bool:
+    """
+    True if the correction moves or recolours the light. The kept base
+    scene was rendered under the old lighting, so such a correction
+    needs a new scene even for composite-level feedback.
+    """
+    return getattr(previous, "lighting_map", None) != getattr(corrected, "lighting_map", None)
+
+
+def moves_product(previous: Any, corrected: Any) -> bool:
+    """
+    True if the correction places the product differently. Without a
+    refinement pass this is the only thing a composite retry can change.
+    """
+    return getattr(previous, "inpaint_coordinates", None) != getattr(corrected, "inpaint_coordinates", None)
+
+
+def keep_scene(previous: Any, corrected: Any) -> Any:
+    """
+    Scene plan for a composite-only retry: the corrected placement for
+    the composite, everything else from the previous plan so the kept
+    base scene still matches it.
+    """
+    if not hasattr(previous, "model_copy") or not hasattr(corrected, "inpaint_coordinates"):
+        return corrected
+    return previous.model_copy(update={"inpaint_coordinates": corrected.inpaint_coordinates})
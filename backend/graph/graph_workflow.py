@@ -1,22 +1,63 @@
-from typing import Optional
+import asyncio
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
 
+from langchain_core.runnables import RunnableLambda
 from langgraph.graph import StateGraph, END
-from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.base import BaseCheckpointSaver
 
-from schemas import GraphState
+from schemas import GraphState, ImageRef
 from agents.analyst import AnalystAgent
 from agents.art_director import DirectorAgent
 from agents.judge import JudgeAgent
 from agents.producer import ProducerAgent
-from config import Configuration
+from batch.events import ProgressBus
+from batch.limits import AgentLimits
+from cache.blob_store import BlobStore
+from graph.checkpoint import SqliteCheckpointer
+from graph.feedback import COMPOSITE, SCENE, changes_lighting, classify_feedback, keep_scene, moves_product
+from imaging.pool import ImagePool, run_prescreen, store_blob
+from imaging.prescreen import FidelityPrescreen
+from metrics import JUDGE_RETRIES, NODE_SECONDS
+from config import get_config
 
-config = Configuration()
+config = get_config()
 
 
 class GraphWorkflow:
     """
     Orchestrates the full 64 Facets pipeline as a directed graph:
-    Analyst -> Director -> Producer -> Judge (feedback loop)
+    Analyst -> Director -> Producer -> Judge (feedback loop through
+    Correct, where the Director revises the rejected plan)
+
+    With `candidates` > 1 the Producer generates that many candidates
+    concurrently, the Judge scores them concurrently and the best one is
+    kept; the correction loop only runs if none reaches the threshold.
+
+    Candidates that fail the local FidelityPrescreen are sent straight
+    back to the Producer without a Judge call.
+
+    Generated images are moved into a BlobStore as soon as the Producer
+    returns; the state and its checkpoints only carry ImageRefs. With
+    an ImagePool, decoding and storing candidates and the pre-screen
+    run in worker processes.
+
+    Runs are checkpointed per `thread_id`; invoking an interrupted
+    thread again resumes it after its last completed node.
+
+    With a ProgressBus, node transitions and every Judge decision are
+    emitted as events for the image being processed.
+
+    A state that already carries analysis and scene plan (fanned out
+    from a near-duplicate) enters the graph at the Producer.
+
+    Retries redo only the stage the Judge objected to: feedback about
+    placement or scale (with a refining Producer also shadow or edges)
+    re-composites the product into the kept base scene; anything else,
+    any correction that changes the lighting the scene was rendered
+    under, and a composite retry that would render the same image again
+    generates a new base scene.
     """
 
     def __init__(
@@ -25,72 +66,468 @@ class GraphWorkflow:
         director: DirectorAgent,
         producer: ProducerAgent,
         judge: JudgeAgent,
+        limits: Optional[AgentLimits] = None,
+        candidates: int = config.PRODUCER_CANDIDATES,
+        prescreen: Optional[FidelityPrescreen] = None,
+        checkpointer: Optional[BaseCheckpointSaver] = None,
+        blobs: Optional[BlobStore] = None,
+        progress: Optional[ProgressBus] = None,
+        pool: Optional[ImagePool] = None,
+        refine: Optional[bool] = None,
     ):
         self.analyst = analyst
         self.director = director
         self.producer = producer
         self.judge = judge
+        self.limits = limits or AgentLimits()
 
-        self.checkpointer = MemorySaver()
+        self.checkpointer = checkpointer or SqliteCheckpointer()
+        self.blobs = blobs or BlobStore()
+        self.progress = progress
+        self.pool = pool or ImagePool(workers=0)
         self.threshold = config.MIN_ACCEPTED_SCORE
         self.max_retries = config.MAX_RETRIES
+        self.candidates = max(candidates, 1)
+        # Whether the Producer refines composites with the model (and reads feedback)
+        self.refine = getattr(producer, "refine", False) is True if refine is None else refine
+
+        if prescreen is None and config.PRESCREEN_ENABLED:
+            prescreen = FidelityPrescreen()
+        self.prescreen = prescreen
 
     def _node_analyst(self, state: GraphState) -> GraphState:
-        state.analysis = self.analyst.analyse(state.product)
+        with self.limits.hold("analyst"):
+            state.analysis = self.analyst.analyse(state.image_path)
         return state
 
     def _node_director(self, state: GraphState) -> GraphState:
-        state.scene_plan = self.director.create_scene(state.analysis)
+        with self.limits.hold("director"):
+            state.scene_plan = self.director.create_scene(state.analysis)
         return state
 
-    def _node_producer(self, state: GraphState) -> GraphState:
-        state.generation = self.producer.generate_final_candidate(
-            product_png_path=state.analysis.product_png_path,
-            scene_plan=state.scene_plan,
-            feedback=state.judgement.feedback if state.judgement else None,
+    def _spill(self, candidate):
+        """
+        Stores a Producer candidate in the blob store and returns its
+        ImageRef. Unknown candidate types are passed through.
+        """
+        if isinstance(candidate, (bytes, bytearray)):
+            return self.pool.run_buffer(store_blob, bytes(candidate), str(self.blobs.directory), False)
+        if isinstance(getattr(candidate, "generated_image_path", None), str):
+            # Streaming file I/O; nothing to gain from another process
+            return self.blobs.put_file(candidate.generated_image_path)
+        if isinstance(getattr(candidate, "image_base64", None), str):
+            return self.pool.run_buffer(
+                store_blob, candidate.image_base64.encode("ascii"), str(self.blobs.directory), True
+            )
+        return candidate
+
+    async def _aspill(self, candidate):
+        if isinstance(candidate, (bytes, bytearray)):
+            return await self.pool.arun_buffer(store_blob, bytes(candidate), str(self.blobs.directory), False)
+        if isinstance(getattr(candidate, "image_base64", None), str):
+            return await self.pool.arun_buffer(
+                store_blob, candidate.image_base64.encode("ascii"), str(self.blobs.directory), True
+            )
+        return await asyncio.to_thread(self._spill, candidate)
+
+    def _reuses_scene(self, state: GraphState) -> bool:
+        return state.retry_stage == COMPOSITE and state.base_scene is not None
+
+    def _feedback(self, state: GraphState) -> Optional[Any]:
+        return state.judgement.get("feedback") if state.judgement else None
+
+    def _scene_bytes(self, base_scene) -> Any:
+        return self.blobs.read(base_scene) if isinstance(base_scene, ImageRef) else base_scene
+
+    def _produce(self, state: GraphState, variant: int = 0) -> Tuple[Any, Any]:
+        """
+        Returns the stored candidate and the base scene it was built on.
+        """
+        with self.limits.hold("producer"):
+            if self._reuses_scene(state):
+                base_scene = state.base_scene
+            else:
+                base_scene = self._spill(self.producer.generate_base_scene(
+                    scene_plan=state.scene_plan,
+                    feedback=self._feedback(state),
+                    variant=variant,
+                ))
+            candidate = self.producer.composite_candidate(
+                base_scene=self._scene_bytes(base_scene),
+                product_png_path=state.image_path,
+                scene_plan=state.scene_plan,
+                feedback=self._feedback(state),
+            )
+        return self._spill(candidate), base_scene
+
+    def _prescreen(self, state: GraphState, candidate) -> Optional[dict]:
+        """
+        Returns a machine-generated judgement for clearly broken
+        candidates, or None if the candidate should go to the Judge.
+        """
+        if self.prescreen is None:
+            return None
+
+        result = self.pool.run(
+            run_prescreen,
+            self.prescreen,
+            state.image_path,
+            candidate.generated_image_path,
+            getattr(state.scene_plan, "inpaint_coordinates", None),
+        )
+        return self._prescreen_judgement(result)
+
+    async def _aprescreen(self, state: GraphState, candidate) -> Optional[dict]:
+        if self.prescreen is None:
+            return None
+
+        result = await self.pool.arun(
+            run_prescreen,
+            self.prescreen,
+            state.image_path,
+            candidate.generated_image_path,
+            getattr(state.scene_plan, "inpaint_coordinates", None),
         )
+        return self._prescreen_judgement(result)
+
+    def _prescreen_judgement(self, result) -> Optional[dict]:
+        if result.passed:
+            return None
+        return {"score": 0, "feedback": result.feedback, "prescreen": True, "replan": result.plan}
+
+    def _judgement(self, evaluation) -> dict:
+        """
+        Flattens a JudgeEvaluation into the checkpointed judgement dict;
+        issues and recommendations become the feedback for the retry.
+        """
+        return {
+            "score": evaluation.score,
+            "approved": evaluation.is_approved,
+            "feedback": "; ".join(evaluation.issues + evaluation.recommendations),
+        }
+
+    def _judge_candidate(self, state: GraphState, candidate) -> dict:
+        rejected = self._prescreen(state, candidate)
+        if rejected is not None:
+            return rejected
+
+        with self.limits.hold("judge"):
+            evaluation = self.judge.evaluate(
+                state.analysis,
+                state.scene_plan,
+                original_image_path=state.image_path,
+                candidate_image_path=candidate.generated_image_path,
+            )
+        return self._judgement(evaluation)
+
+    def _keep_best(self, state: GraphState, candidates: list, judgements: List[dict]) -> GraphState:
+        best = max(range(len(candidates)), key=lambda i: judgements[i]["score"])
+        state.generation = candidates[best]
+        state.judgement = judgements[best]
+        if state.candidate_scenes:
+            state.base_scene = state.candidate_scenes[best]
+        state.candidates = None
+        state.candidate_scenes = None
+        return state
+
+    def _keep_produced(self, state: GraphState, produced: List[Tuple[Any, Any]]) -> GraphState:
+        if len(produced) == 1:
+            state.generation, state.base_scene = produced[0]
+            return state
+        state.candidates = [candidate for candidate, _ in produced]
+        state.candidate_scenes = [base_scene for _, base_scene in produced]
+        state.generation = None
         return state
 
+    def _node_producer(self, state: GraphState) -> GraphState:
+        # Compositing into a kept scene is deterministic: one candidate is enough
+        if self.candidates == 1 or self._reuses_scene(state):
+            return self._keep_produced(state, [self._produce(state)])
+
+        # Best-of-N: generate all candidates concurrently
+        with ThreadPoolExecutor(max_workers=self.candidates) as pool:
+            produced = list(pool.map(lambda i: self._produce(state, i), range(self.candidates)))
+        return self._keep_produced(state, produced)
+
     def _node_judge(self, state: GraphState) -> GraphState:
-        score, feedback = self.judge.evaluate(
-            original_image_path=state.analysis.product_png_path,
-            candidate_image_path=state.generation.generated_image_path,
+        if not state.candidates:
+            state.judgement = self._judge_candidate(state, state.generation)
+            return self._settle(state)
+
+        with ThreadPoolExecutor(max_workers=len(state.candidates)) as pool:
+            judgements = list(pool.map(lambda c: self._judge_candidate(state, c), state.candidates))
+        return self._settle(self._keep_best(state, state.candidates, judgements))
+
+    async def _acall(self, agent, method: str, *args, **kwargs):
+        """
+        Awaits the agent's native async counterpart of `method` when it
+        has one, otherwise runs the blocking method in a worker thread.
+        """
+        async_method = getattr(agent, f"a{method}", None)
+        if async_method is not None:
+            return await async_method(*args, **kwargs)
+        return await asyncio.to_thread(getattr(agent, method), *args, **kwargs)
+
+    async def _anode_analyst(self, state: GraphState) -> GraphState:
+        async with self.limits.ahold("analyst"):
+            state.analysis = await self._acall(self.analyst, "analyse", state.image_path)
+        return state
+
+    async def _anode_director(self, state: GraphState) -> GraphState:
+        async with self.limits.ahold("director"):
+            state.scene_plan = await self._acall(self.director, "create_scene", state.analysis)
+        return state
+
+    async def _aproduce(self, state: GraphState, variant: int = 0) -> Tuple[Any, Any]:
+        async with self.limits.ahold("producer"):
+            if self._reuses_scene(state):
+                base_scene = state.base_scene
+            else:
+                base_scene = await self._aspill(await self._acall(
+                    self.producer,
+                    "generate_base_scene",
+                    scene_plan=state.scene_plan,
+                    feedback=self._feedback(state),
+                    variant=variant,
+                ))
+            candidate = await self._acall(
+                self.producer,
+                "composite_candidate",
+                base_scene=await asyncio.to_thread(self._scene_bytes, base_scene),
+                product_png_path=state.image_path,
+                scene_plan=state.scene_plan,
+                feedback=self._feedback(state),
+            )
+        return await self._aspill(candidate), base_scene
+
+    async def _ajudge_candidate(self, state: GraphState, candidate) -> dict:
+        rejected = await self._aprescreen(state, candidate)
+        if rejected is not None:
+            return rejected
+
+        async with self.limits.ahold("judge"):
+            evaluation = await self._acall(
+                self.judge,
+                "evaluate",
+                state.analysis,
+                state.scene_plan,
+                original_image_path=state.image_path,
+                candidate_image_path=candidate.generated_image_path,
+            )
+        return self._judgement(evaluation)
+
+    async def _anode_producer(self, state: GraphState) -> GraphState:
+        if self.candidates == 1 or self._reuses_scene(state):
+            return self._keep_produced(state, [await self._aproduce(state)])
+
+        produced = await asyncio.gather(
+            *(self._aproduce(state, i) for i in range(self.candidates))
+        )
+        return self._keep_produced(state, list(produced))
+
+    async def _anode_judge(self, state: GraphState) -> GraphState:
+        if not state.candidates:
+            state.judgement = await self._ajudge_candidate(state, state.generation)
+            return self._settle(state)
+
+        judgements = await asyncio.gather(
+            *(self._ajudge_candidate(state, c) for c in state.candidates)
         )
-        state.judgement = {"score": score, "feedback": feedback}
+        return self._settle(self._keep_best(state, state.candidates, list(judgements)))
+
+    def _emit(self, event: str, **data: Any):
+        if self.progress is not None:
+            self.progress.emit(event, **data)
+
+    def _emit_decision(self, state: GraphState, decision: str):
+        self._emit(
+            "judgement",
+            score=state.judgement.get("score"),
+            feedback=state.judgement.get("feedback"),
+            prescreen=bool(state.judgement.get("prescreen")),
+            retries=state.retries,
+            decision=decision,
+            stage=state.retry_stage if decision == "retry" else None,
+        )
+
+    def _decision(self, state: GraphState) -> str:
+        # Also the router after the Judge, so it must not touch the
+        # state: LangGraph drops changes made in a router
+        if state.judgement.get("score", 100) >= self.threshold:
+            return "accept"
+        if state.retries >= self.max_retries:
+            return "give_up"
+        return "retry"
+
+    def _settle(self, state: GraphState) -> GraphState:
+        """
+        Emits the final Judge decision; retries are emitted by the
+        correction node once their stage is known.
+        """
+        decision = self._decision(state)
+        if decision != "retry":
+            self._emit_decision(state, decision)
         return state
 
-    def _should_retry(self, state: GraphState) -> str:
-        score = state.judgement.get("score", 100)
-        if score >= self.threshold or state.retries >= self.max_retries:
-            return "end"
+    def _needs_director(self, state: GraphState) -> bool:
+        # Broken output (blank, garbled) is regenerated from the same
+        # plan; a bad inpaint box only a corrected plan can fix
+        return not state.judgement.get("prescreen") or bool(state.judgement.get("replan"))
+
+    def _retry_stage(self, state: GraphState, corrected=None) -> str:
+        if state.judgement.get("prescreen"):
+            # A moved box can be composited into the kept scene
+            if (
+                corrected is not None
+                and moves_product(state.scene_plan, corrected)
+                and not changes_lighting(state.scene_plan, corrected)
+            ):
+                return COMPOSITE
+            return SCENE
+        stage = classify_feedback(state.judgement.get("feedback"), refine=self.refine)
+        if stage == COMPOSITE and corrected is not None and changes_lighting(state.scene_plan, corrected):
+            return SCENE
+        # Without refinement the same box in the same scene is the same image
+        if stage == COMPOSITE and not self.refine and not (
+            corrected is not None and moves_product(state.scene_plan, corrected)
+        ):
+            return SCENE
+        return stage
 
+    def _forget_scene(self, base_scene):
+        # A rejected backdrop must not be served from the scene cache again
+        forget = getattr(self.producer, "forget_scene", None)
+        if forget is not None and isinstance(base_scene, ImageRef):
+            forget(base_scene.sha256)
+
+    def _apply_correction(self, state: GraphState, corrected=None) -> GraphState:
         state.retries += 1
-        state.scene_plan = self.director.correct_scene(
-            scene_plan=state.scene_plan, feedback=state.judgement.get("feedback")
-        )
-        return "producer"
+        state.retry_stage = self._retry_stage(state, corrected)
+        JUDGE_RETRIES.inc(stage=state.retry_stage)
+        self._emit_decision(state, "retry")
+        if state.retry_stage == SCENE:
+            self._forget_scene(state.base_scene)
+
+        if corrected is None:
+            return state
+        if state.retry_stage == COMPOSITE:
+            state.scene_plan = keep_scene(state.scene_plan, corrected)
+        else:
+            state.scene_plan = corrected
+        return state
+
+    def _node_correct(self, state: GraphState) -> GraphState:
+        if not self._needs_director(state):
+            return self._apply_correction(state)
+
+        with self.limits.hold("director"):
+            corrected = self.director.correct_scene(
+                scene_plan=state.scene_plan, feedback=state.judgement.get("feedback")
+            )
+        return self._apply_correction(state, corrected)
+
+    async def _anode_correct(self, state: GraphState) -> GraphState:
+        if not self._needs_director(state):
+            return self._apply_correction(state)
+
+        async with self.limits.ahold("director"):
+            corrected = await self._acall(
+                self.director,
+                "correct_scene",
+                scene_plan=state.scene_plan,
+                feedback=state.judgement.get("feedback"),
+            )
+        return self._apply_correction(state, corrected)
+
+    def _entry(self, state: GraphState) -> str:
+        if state.analysis is not None and state.scene_plan is not None:
+            return "producer"
+        return "analyst"
+
+    def plan(self, state: GraphState) -> GraphState:
+        """
+        Runs only Analyst and Director, for output that is shared by
+        several images.
+        """
+        state = self._timed("analyst", self._node_analyst)(state)
+        return self._timed("director", self._node_director)(state)
+
+    async def aplan(self, state: GraphState) -> GraphState:
+        state = await self._atimed("analyst", self._anode_analyst)(state)
+        return await self._atimed("director", self._anode_director)(state)
+
+    def _timed(self, node: str, fn):
+        def run(state: GraphState) -> GraphState:
+            self._emit("node_started", node=node)
+            with NODE_SECONDS.time(node=node):
+                state = fn(state)
+            self._emit("node_finished", node=node)
+            return state
+        return run
+
+    def _atimed(self, node: str, afn):
+        async def run(state: GraphState) -> GraphState:
+            self._emit("node_started", node=node)
+            with NODE_SECONDS.time(node=node):
+                state = await afn(state)
+            self._emit("node_finished", node=node)
+            return state
+        return run
+
+    def _node(self, name: str, fn, afn) -> RunnableLambda:
+        return RunnableLambda(self._timed(name, fn), afunc=self._atimed(name, afn), name=name)
 
     def build(self) -> "GraphWorkflow":
         workflow = StateGraph(GraphState)
-        workflow.add_node("analyst", self._node_analyst)
-        workflow.add_node("director", self._node_director)
-        workflow.add_node("producer", self._node_producer)
-        workflow.add_node("judge", self._node_judge)
+        # Every node carries a blocking and an awaitable implementation;
+        # invoke() uses the former, ainvoke() the latter. Both are timed.
+        workflow.add_node("analyst", self._node("analyst", self._node_analyst, self._anode_analyst))
+        workflow.add_node("director", self._node("director", self._node_director, self._anode_director))
+        workflow.add_node("producer", self._node("producer", self._node_producer, self._anode_producer))
+        workflow.add_node("judge", self._node("judge", self._node_judge, self._anode_judge))
+        workflow.add_node("correct", self._node("correct", self._node_correct, self._anode_correct))
 
-        workflow.set_entry_point("analyst")
+        workflow.set_conditional_entry_point(
+            RunnableLambda(self._entry, name="entry"),
+            {"analyst": "analyst", "producer": "producer"},
+        )
 
         workflow.add_edge("analyst", "director")
         workflow.add_edge("director", "producer")
         workflow.add_edge("producer", "judge")
 
-        workflow.add_conditional_edge(
+        workflow.add_conditional_edges(
             "judge",
-            self._should_retry,
-            {"producer": "producer", "end": END},
+            RunnableLambda(self._decision, name="decision"),
+            {"accept": END, "give_up": END, "retry": "correct"},
         )
+        workflow.add_edge("correct", "producer")
 
         self.workflow = workflow.compile(checkpointer=self.checkpointer)
         return self
 
-    def invoke(self, state: GraphState) -> GraphState:
-        return self.workflow.run(state)
+    def _run_config(self, thread_id: Optional[str]) -> Dict[str, Any]:
+        # Without a stable id the run is one-off and cannot be resumed
+        return {"configurable": {"thread_id": thread_id or uuid.uuid4().hex}}
+
+    def invoke(self, state: GraphState, thread_id: Optional[str] = None) -> GraphState:
+        run_config = self._run_config(thread_id)
+        snapshot = self.workflow.get_state(run_config)
+        if snapshot.next:
+            # Interrupted earlier: continue after the last completed node
+            return GraphState(**self.workflow.invoke(None, run_config))
+
+        if snapshot.values:
+            # Finished earlier: this is a deliberate re-run
+            self.checkpointer.delete_thread(run_config["configurable"]["thread_id"])
+        return GraphState(**self.workflow.invoke(state, run_config))
+
+    async def ainvoke(self, state: GraphState, thread_id: Optional[str] = None) -> GraphState:
+        run_config = self._run_config(thread_id)
+        snapshot = await self.workflow.aget_state(run_config)
+        if snapshot.next:
+            return GraphState(**await self.workflow.ainvoke(None, run_config))
+
+        if snapshot.values:
+            await self.checkpointer.adelete_thread(run_config["configurable"]["thread_id"])
+        return GraphState(**await self.workflow.ainvoke(state, run_config))
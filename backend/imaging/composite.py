@@ -0,0 +1,280 @@
+import io
+import re
+from typing import Any, Optional, Sequence, Tuple
+
+import numpy as np
+from PIL import Image, ImageFilter
+
+from config import get_config
+
+config = get_config()
+
+# Colour temperature the product photos are assumed to be balanced for
+_NEUTRAL_KELVIN = 6500.0
+_NAMED_KELVIN = {
+    "candle": 1900.0,
+    "tungsten": 3200.0,
+    "warm": 3500.0,
+    "golden": 3500.0,
+    "neutral": 5000.0,
+    "daylight": 5600.0,
+    "cool": 7500.0,
+    "overcast": 7000.0,
+    "shade": 8000.0,
+}
+_KELVIN = re.compile(r"(\d{3,5})\s*k\b", re.IGNORECASE)
+# Unit vectors pointing from the product towards the light
+_DIRECTIONS = {
+    "left": (-1.0, 0.0),
+    "right": (1.0, 0.0),
+    "top": (0.0, -1.0),
+    "above": (0.0, -1.0),
+    "upper": (0.0, -1.0),
+    "bottom": (0.0, 1.0),
+    "below": (0.0, 1.0),
+}
+
+
+def parse_kelvin(temperature: Optional[str]) -> Optional[float]:
+    """
+    Reads "5500K", "5500 k" or a named light ("warm", "daylight").
+    """
+    if not temperature:
+        return None
+    match = _KELVIN.search(temperature)
+    if match:
+        return float(match.group(1))
+    for name, kelvin in _NAMED_KELVIN.items():
+        if name in temperature.lower():
+            return kelvin
+    return None
+
+
+def kelvin_to_rgb(kelvin: float) -> np.ndarray:
+    """
+    Approximate RGB of a black body at `kelvin`, in [0, 1].
+    (Tanner Helland's fit, accurate enough for a tint.)
+    """
+    t = np.clip(kelvin, 1000.0, 40000.0) / 100.0
+    if t <= 66:
+        r = 255.0
+        g = 99.4708025861 * np.log(t) - 161.1195681661
+        b = 0.0 if t <= 19 else 138.5177312231 * np.log(t - 10) - 305.0447927307
+    else:
+        r = 329.698727446 * (t - 60) ** -0.1332047592
+        g = 288.1221695283 * (t - 60) ** -0.0755148492
+        b = 255.0
+    return np.clip(np.array([r, g, b]), 0, 255) / 255.0
+
+
+def light_direction(source_direction: Optional[str]) -> Tuple[float, float]:
+    """
+    (dx, dy) towards the light in image coordinates; (0, 0) for
+    frontal, overhead or unknown light.
+    """
+    if not source_direction:
+        return 0.0, 0.0
+    words = re.findall(r"[a-z]+", source_direction.lower())
+    dx = sum(_DIRECTIONS[w][0] for w in words if w in _DIRECTIONS)
+    dy = sum(_DIRECTIONS[w][1] for w in words if w in _DIRECTIONS)
+    norm = float(np.hypot(dx, dy))
+    return (dx / norm, dy / norm) if norm else (0.0, 0.0)
+
+
+def clamp_box(coordinates: Sequence[Any], size: Tuple[int, int]) -> Optional[Tuple[int, int, int, int]]:
+    """
+    Inpaint coordinates as an (x1, y1, x2, y2) box clamped to an image
+    of `size`; None if they are malformed or leave less than 2x2 pixels.
+    """
+    try:
+        x1, y1, x2, y2 = (int(round(float(c))) for c in coordinates)
+    except (TypeError, ValueError):
+        return None
+
+    width, height = size
+    x1, x2 = sorted((max(0, min(x1, width)), max(0, min(x2, width))))
+    y1, y2 = sorted((max(0, min(y1, height)), max(0, min(y2, height))))
+    if x2 - x1 < 2 or y2 - y1 < 2:
+        return None
+    return x1, y1, x2, y2
+
+
+def fit_box(size: Tuple[int, int], box: Tuple[int, int, int, int]) -> Tuple[int, int, int, int]:
+    """
+    The rectangle a product of `size` fills inside `box`: aspect kept,
+    centred horizontally, resting on the bottom edge.
+    """
+    x1, y1, x2, y2 = box
+    scale = min((x2 - x1) / size[0], (y2 - y1) / size[1])
+    width, height = max(1, round(size[0] * scale)), max(1, round(size[1] * scale))
+    left = x1 + (x2 - x1 - width) // 2
+    top = y2 - height
+    return left, top, left + width, top + height
+
+
+def _field(lighting: Any, name: str) -> Optional[str]:
+    if lighting is None:
+        return None
+    if isinstance(lighting, dict):
+        return lighting.get(name)
+    return getattr(lighting, name, None)
+
+
+class Compositor:
+    """
+    Deterministic local compositing of the product into a base scene
+
+    Responsibilities:
+    - Fits the product cut-out into the ScenePlan's inpaint box
+      (aspect kept, centred, resting on the bottom edge) and
+      alpha-blends it; product pixels are never re-generated.
+    - Tints the product towards the scene's colour temperature and
+      casts a soft shadow away from the light, both read from the
+      lighting map.
+    - Works on the box region only, so a 4K scene costs milliseconds
+      plus encoding.
+    """
+
+    def __init__(
+        self,
+        temperature_strength: float = config.COMPOSITE_TEMPERATURE_STRENGTH,
+        shadow_opacity: float = config.COMPOSITE_SHADOW_OPACITY,
+        shadow_offset: float = 0.04,
+        shadow_blur: float = 0.03,
+    ):
+        self.temperature_strength = temperature_strength
+        self.shadow_opacity = shadow_opacity
+        # Both relative to the placed product's height
+        self.shadow_offset = shadow_offset
+        self.shadow_blur = shadow_blur
+
+    def _box(self, coordinates: Sequence[Any], size: Tuple[int, int]) -> Tuple[int, int, int, int]:
+        box = clamp_box(coordinates, size)
+        if box is None:
+            raise ValueError(
+                f"Compositor: inpaint box {coordinates!r} does not fit the {size[0]}x{size[1]} scene."
+            )
+        return box
+
+    def _fit(self, product: Image.Image, box: Tuple[int, int, int, int]) -> Tuple[Image.Image, int, int]:
+        left, top, right, bottom = fit_box(product.size, box)
+        fitted = product.resize((right - left, bottom - top), Image.Resampling.LANCZOS)
+        return fitted, left, top
+
+    def _tint(self, rgb: np.ndarray, temperature: Optional[str]) -> np.ndarray:
+        kelvin = parse_kelvin(temperature)
+        if kelvin is None or self.temperature_strength <= 0:
+            return rgb
+        gains = kelvin_to_rgb(kelvin) / kelvin_to_rgb(_NEUTRAL_KELVIN)
+        # Keep brightness; only shift the balance
+        gains = gains / gains.mean()
+        gains = 1.0 + self.temperature_strength * (gains - 1.0)
+        return np.clip(rgb * gains.astype(np.float32), 0.0, 1.0)
+
+    def _shadow_geometry(self, alpha: Image.Image, left: int, top: int, source_direction: Optional[str]):
+        """
+        (x, y, blur, pad) of the shadow mask in scene coordinates.
+        """
+        dx, dy = light_direction(source_direction)
+        height = alpha.height
+        # Away from the light, plus a little downwards as a contact shadow
+        offset_x = round(-dx * self.shadow_offset * height)
+        offset_y = round((-dy * self.shadow_offset + self.shadow_offset / 2) * height)
+        blur = max(1.0, self.shadow_blur * height)
+        pad = int(blur * 3)
+        return left + offset_x - pad, top + offset_y - pad, blur, pad
+
+    def _shadow(self, region: np.ndarray, alpha: Image.Image, geometry: tuple, origin: Tuple[int, int]):
+        """
+        Darkens `region`, whose top-left corner sits at `origin` in the scene.
+        """
+        sx, sy, blur, pad = geometry
+        mask = Image.new("L", (alpha.width + 2 * pad, alpha.height + 2 * pad), 0)
+        mask.paste(alpha, (pad, pad))
+        mask = mask.filter(ImageFilter.GaussianBlur(blur))
+
+        sx, sy = sx - origin[0], sy - origin[1]
+        region_h, region_w = region.shape[:2]
+        x1, y1 = max(0, sx), max(0, sy)
+        x2, y2 = min(region_w, sx + mask.width), min(region_h, sy + mask.height)
+        if x1 >= x2 or y1 >= y2:
+            return
+
+        shade = np.asarray(mask, dtype=np.float32)[y1 - sy:y2 - sy, x1 - sx:x2 - sx] / 255.0
+        region[y1:y2, x1:x2] *= (1.0 - self.shadow_opacity * shade)[..., None]
+
+    def composite_image(
+        self,
+        scene: Image.Image,
+        product: Image.Image,
+        inpaint_coordinates: Sequence[Any],
+        lighting_map: Any = None,
+    ) -> Image.Image:
+        box = self._box(inpaint_coordinates, scene.size)
+        fitted, left, top = self._fit(product.convert("RGBA"), box)
+
+        alpha = fitted.getchannel("A")
+        x1, y1, x2, y2 = left, top, left + fitted.width, top + fitted.height
+        shadow = None
+        if self.shadow_opacity > 0:
+            shadow = self._shadow_geometry(alpha, left, top, _field(lighting_map, "source_direction"))
+            sx, sy, _, pad = shadow
+            x1, y1 = min(x1, sx), min(y1, sy)
+            x2, y2 = max(x2, sx + fitted.width + 2 * pad), max(y2, sy + fitted.height + 2 * pad)
+        # Only the product and its shadow are converted and blended
+        x1, y1 = max(0, x1), max(0, y1)
+        x2, y2 = min(scene.width, x2), min(scene.height, y2)
+
+        result = scene.convert("RGB")
+        region = np.asarray(result.crop((x1, y1, x2, y2)), dtype=np.float32) / 255.0
+        if shadow is not None:
+            self._shadow(region, alpha, shadow, (x1, y1))
+
+        rgba = np.asarray(fitted, dtype=np.float32) / 255.0
+        rgb = self._tint(rgba[..., :3], _field(lighting_map, "temperature"))
+        opacity = rgba[..., 3:]
+
+        target = region[top - y1:top - y1 + fitted.height, left - x1:left - x1 + fitted.width]
+        target[:] = rgb * opacity + target * (1.0 - opacity)
+
+        result.paste(Image.fromarray((region * 255.0 + 0.5).astype(np.uint8)), (x1, y1))
+        return result
+
+    def refine_mask(
+        self,
+        scene_size: Tuple[int, int],
+        product: Image.Image,
+        inpaint_coordinates: Sequence[Any],
+    ) -> Image.Image:
+        """
+        Mask for an optional model refinement pass: white where the
+        model may repaint (the box, for contact shadows and edges),
+        black over the product itself, which must stay untouched.
+        """
+        box = self._box(inpaint_coordinates, scene_size)
+        fitted, left, top = self._fit(product.convert("RGBA"), box)
+
+        mask = Image.new("L", scene_size, 0)
+        mask.paste(255, box)
+        # Any partially opaque product pixel is protected
+        protected = fitted.getchannel("A").point(lambda a: 255 if a > 0 else 0)
+        mask.paste(0, (left, top), protected)
+        return mask
+
+    def composite(
+        self,
+        scene_bytes: bytes,
+        product_png_path: str,
+        inpaint_coordinates: Sequence[Any],
+        lighting_map: Any = None,
+    ) -> bytes:
+        """
+        Returns the composited scene as PNG bytes.
+        """
+        with Image.open(io.BytesIO(scene_bytes)) as scene, Image.open(product_png_path) as product:
+            result = self.composite_image(scene, product, inpaint_coordinates, lighting_map)
+
+        buffer = io.BytesIO()
+        # Fast encode: the blob store keeps it only until it is judged
+        result.save(buffer, format="PNG", compress_level=1)
+        return buffer.getvalue()
@@ -0,0 +1,56 @@
+import io
+
+import numpy as np
+from PIL import Image
+
+# pHash: DCT of a 32x32 grayscale thumbnail, low 8x8 frequencies
+_SIZE = 32
+_LOW = 8
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.sqrt(2 / n) * np.cos(np.pi * (2 * i + 1) * k / (2 * n))
+    matrix[0] /= np.sqrt(2)
+    return matrix
+
+
+_DCT = _dct_matrix(_SIZE)
+
+
+def perceptual_hash(image_bytes: bytes) -> int:
+    """
+    64-bit perceptual hash. Re-encodes, small crops and exposure
+    changes flip only a few bits; different pieces differ in many.
+    """
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        # Lets JPEG decode at reduced size; a no-op for other formats
+        image.draft("L", (_SIZE * 4, _SIZE * 4))
+        thumbnail = image.convert("L").resize((_SIZE, _SIZE), Image.Resampling.LANCZOS)
+
+    pixels = np.asarray(thumbnail, dtype=np.float64)
+    low = (_DCT @ pixels @ _DCT.T)[:_LOW, :_LOW].flatten()
+    # The DC term only carries overall brightness
+    bits = low > np.median(low[1:])
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def perceptual_hash_file(path: str) -> int:
+    with open(path, "rb") as _f:
+        return perceptual_hash(_f.read())
+
+
+def hamming_distances(hashes: np.ndarray, value: int) -> np.ndarray:
+    """
+    Bit distance of `value` to every hash in a uint64 array.
+    """
+    xor = np.bitwise_xor(hashes, np.uint64(value))
+    return np.unpackbits(xor.view(np.uint8)).reshape(-1, 64).sum(axis=1)
+
+
+def max_distance(min_similarity: float) -> int:
+    """
+    Largest bit distance still counted as `min_similarity` (0..1).
+    """
+    return int((1 - min_similarity) * 64)
@@ -0,0 +1,141 @@
+import asyncio
+import base64
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Callable, Iterator, Optional, TypeVar
+
+from config import get_config
+
+config = get_config()
+
+R = TypeVar("R")
+
+
+def _with_buffer(fn: Callable[..., R], name: str, size: int, args: tuple) -> R:
+    """
+    Worker side of `run_buffer`: hands `fn` a view of the shared
+    segment instead of a pickled copy of the bytes.
+    """
+    shm = SharedMemory(name=name)
+    view = shm.buf[:size]
+    try:
+        return fn(view, *args)
+    finally:
+        # Views must be released before the segment can be closed
+        view.release()
+        shm.close()
+
+
+class ImagePool:
+    """
+    Process pool for CPU-bound image work
+
+    Responsibilities:
+    - Runs decoding, hashing, resizing and encoding of large images in
+      separate processes, so they neither hold the GIL against the
+      request handlers nor stall the event loop.
+    - Moves image buffers through shared memory: one copy in, none
+      through the pickling pipe. File-backed work (blob paths) passes
+      only the path.
+    - `workers` = 0 runs everything inline in the calling thread.
+
+    Worker processes are spawned on first use, not with the pool.
+    """
+
+    def __init__(self, workers: int = config.IMAGE_POOL_WORKERS):
+        if workers < 0:
+            raise ValueError("ImagePool: workers must not be negative.")
+
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # Never fork a process that already runs threads and an event loop
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._pool
+
+    @contextmanager
+    def _shared(self, data: bytes) -> Iterator[SharedMemory]:
+        shm = SharedMemory(create=True, size=max(len(data), 1))
+        try:
+            shm.buf[:len(data)] = data
+            yield shm
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def run(self, fn: Callable[..., R], *args: Any) -> R:
+        """
+        Runs `fn(*args)` in a worker and waits for the result.
+        Arguments and result are pickled; keep them small.
+        """
+        if self.workers == 0:
+            return fn(*args)
+        return self._get_pool().submit(fn, *args).result()
+
+    async def arun(self, fn: Callable[..., R], *args: Any) -> R:
+        if self.workers == 0:
+            return await asyncio.to_thread(fn, *args)
+        return await asyncio.get_running_loop().run_in_executor(self._get_pool(), fn, *args)
+
+    def run_buffer(self, fn: Callable[..., R], data: bytes, *args: Any) -> R:
+        """
+        Runs `fn(memoryview_of_data, *args)` in a worker, sharing
+        `data` through shared memory. `fn` must not keep the view.
+        """
+        if self.workers == 0:
+            return fn(memoryview(data), *args)
+        with self._shared(data) as shm:
+            return self._get_pool().submit(_with_buffer, fn, shm.name, len(data), args).result()
+
+    async def arun_buffer(self, fn: Callable[..., R], data: bytes, *args: Any) -> R:
+        if self.workers == 0:
+            return await asyncio.to_thread(fn, memoryview(data), *args)
+        with self._shared(data) as shm:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._get_pool(), _with_buffer, fn, shm.name, len(data), args
+            )
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True)
+
+
+# Worker functions. They live at module level so spawned workers can
+# import them by name.
+
+def store_blob(buffer: memoryview, directory: str, encoded: bool):
+    """
+    Decodes (if base64) and stores an image in the BlobStore at
+    `directory`; returns its ImageRef.
+    """
+    from cache.blob_store import BlobStore
+
+    data = base64.b64decode(buffer) if encoded else buffer
+    return BlobStore(directory).put(data)
+
+
+def run_prescreen(prescreen, original_image_path: str, candidate_image_path: str, inpaint_coordinates):
+    return prescreen.check(
+        original_image_path=original_image_path,
+        candidate_image_path=candidate_image_path,
+        inpaint_coordinates=inpaint_coordinates,
+    )
+
+
+def run_composite(buffer: memoryview, compositor, product_png_path: str, inpaint_coordinates, lighting_map) -> bytes:
+    """
+    Composites the product into the base scene in `buffer`; returns PNG bytes.
+    """
+    return compositor.composite(buffer, product_png_path, inpaint_coordinates, lighting_map)
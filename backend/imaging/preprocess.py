@@ -0,0 +1,174 @@
+import hashlib
+import io
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from PIL import Image
+from pydantic import BaseModel
+
+from config import get_config
+
+config = get_config()
+logger = logging.getLogger(__name__)
+
+_MIME_TYPES = {
+    "PNG": "image/png",
+    "JPEG": "image/jpeg",
+    "WEBP": "image/webp",
+    "GIF": "image/gif",
+}
+
+_MAGIC_BYTES = {
+    b"\x89PNG\r\n\x1a\n": "image/png",
+    b"\xff\xd8\xff": "image/jpeg",
+    b"GIF8": "image/gif",
+}
+
+
+def detect_mime_type(image_bytes: bytes) -> str:
+    """
+    Returns the MIME type announced by the image's magic bytes.
+    Falls back to image/png for unknown payloads.
+    """
+    if image_bytes[:4] == b"RIFF" and image_bytes[8:12] == b"WEBP":
+        return "image/webp"
+    for magic, mime_type in _MAGIC_BYTES.items():
+        if image_bytes.startswith(magic):
+            return mime_type
+    return "image/png"
+
+
+class PreparedImage(BaseModel):
+    data: bytes
+    mime_type: str
+    original_bytes: int
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.original_bytes - len(self.data)
+
+
+class ImagePreprocessor:
+    """
+    Vision payload preprocessing
+
+    Responsibilities:
+    - Detects the real image format instead of trusting the extension.
+    - Downscales to `max_long_edge` and re-encodes to a compact format
+      before the bytes are sent to a vision model.
+    - Caches prepared payloads per content hash.
+    - Tracks the bytes saved per call.
+    """
+
+    def __init__(
+        self,
+        max_long_edge: int = config.VISION_MAX_LONG_EDGE,
+        image_format: str = config.VISION_IMAGE_FORMAT,
+        quality: int = config.VISION_IMAGE_QUALITY,
+        cache_entries: int = config.VISION_CACHE_ENTRIES,
+    ):
+        image_format = image_format.upper()
+        if image_format not in _MIME_TYPES:
+            raise ValueError(f"ImagePreprocessor: unsupported format '{image_format}'.")
+
+        self.max_long_edge = max_long_edge
+        self.image_format = image_format
+        self.quality = quality
+        self.cache_entries = cache_entries
+
+        self.calls = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[str, PreparedImage]" = OrderedDict()
+
+    def _encode(self, image_bytes: bytes) -> PreparedImage:
+        original_mime = detect_mime_type(image_bytes)
+
+        with Image.open(io.BytesIO(image_bytes)) as img:
+            original_mime = _MIME_TYPES.get(img.format, original_mime)
+            img.load()
+
+            if max(img.size) > self.max_long_edge:
+                img.thumbnail((self.max_long_edge, self.max_long_edge), Image.Resampling.LANCZOS)
+
+            if self.image_format == "JPEG" and img.mode not in ("RGB", "L"):
+                # JPEG has no alpha channel: flatten onto white
+                background = Image.new("RGB", img.size, (255, 255, 255))
+                img = img.convert("RGBA")
+                background.paste(img, mask=img.getchannel("A"))
+                img = background
+            elif img.mode not in ("RGB", "RGBA", "L"):
+                img = img.convert("RGBA")
+
+            out = io.BytesIO()
+            img.save(out, format=self.image_format, quality=self.quality, optimize=True)
+            encoded = out.getvalue()
+
+        # Never send more than the original
+        if len(encoded) >= len(image_bytes):
+            return PreparedImage(data=image_bytes, mime_type=original_mime, original_bytes=len(image_bytes))
+
+        return PreparedImage(
+            data=encoded,
+            mime_type=_MIME_TYPES[self.image_format],
+            original_bytes=len(image_bytes),
+        )
+
+    def prepare(self, image_bytes: bytes) -> PreparedImage:
+        key = hashlib.sha256(image_bytes).hexdigest()
+
+        with self._lock:
+            prepared = self._cache.get(key)
+            if prepared is not None:
+                self._cache.move_to_end(key)
+
+        if prepared is None:
+            prepared = self._encode(image_bytes)
+            with self._lock:
+                self._cache[key] = prepared
+                while len(self._cache) > self.cache_entries:
+                    self._cache.popitem(last=False)
+
+        with self._lock:
+            self.calls += 1
+            self.bytes_in += prepared.original_bytes
+            self.bytes_out += len(prepared.data)
+
+        logger.debug(
+            "vision payload %s: %d -> %d bytes (saved %d)",
+            key[:12], prepared.original_bytes, len(prepared.data), prepared.bytes_saved
+        )
+        return prepared
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+                "bytes_saved": self.bytes_in - self.bytes_out,
+                "cached": len(self._cache),
+            }
+
+
+_shared_preprocessor: Optional[ImagePreprocessor] = None
+_shared_preprocessor_lock = threading.Lock()
+
+
+def get_shared_preprocessor() -> Optional[ImagePreprocessor]:
+    """
+    Returns the process-wide preprocessor, or None when
+    preprocessing is disabled via VISION_PREPROCESS.
+    """
+    global _shared_preprocessor
+    if not config.VISION_PREPROCESS:
+        return None
+    if _shared_preprocessor is None:
+        with _shared_preprocessor_lock:
+            if _shared_preprocessor is None:
+                _shared_preprocessor = ImagePreprocessor()
+    return _shared_preprocessor
@@ -0,0 +1,134 @@
+from typing import Any, List, Optional, Sequence
+
+import numpy as np
+from PIL import Image, UnidentifiedImageError
+from pydantic import BaseModel
+
+from config import get_config
+from imaging.composite import clamp_box, fit_box
+
+config = get_config()
+
+# Side length the crop and the product are compared at
+_COMPARE_SIZE = 64
+_BLOCK = 8
+
+
+class PrescreenResult(BaseModel):
+    passed: bool
+    issues: List[str] = []
+    similarity: Optional[float] = None
+    # The failure comes from the scene plan (its inpaint box), so
+    # regenerating from the same plan cannot fix it
+    plan: bool = False
+
+    @property
+    def feedback(self) -> str:
+        return "Automatic pre-screen failed: " + "; ".join(self.issues)
+
+
+def _block_ssim(a: np.ndarray, b: np.ndarray) -> float:
+    """
+    Mean SSIM over non-overlapping 8x8 blocks of two equally sized
+    grayscale arrays in [0, 255].
+    """
+    c1, c2 = (0.01 * 255) ** 2, (0.03 * 255) ** 2
+    h, w = a.shape
+    shape = (h // _BLOCK, _BLOCK, w // _BLOCK, _BLOCK)
+    a = a.reshape(shape).swapaxes(1, 2).reshape(-1, _BLOCK * _BLOCK)
+    b = b.reshape(shape).swapaxes(1, 2).reshape(-1, _BLOCK * _BLOCK)
+
+    mu_a, mu_b = a.mean(axis=1), b.mean(axis=1)
+    var_a, var_b = a.var(axis=1), b.var(axis=1)
+    cov = ((a - mu_a[:, None]) * (b - mu_b[:, None])).mean(axis=1)
+
+    ssim = ((2 * mu_a * mu_b + c1) * (2 * cov + c2)) / (
+        (mu_a ** 2 + mu_b ** 2 + c1) * (var_a + var_b + c2)
+    )
+    return float(ssim.mean())
+
+
+class FidelityPrescreen:
+    """
+    Local pre-screen in front of the Judge
+
+    Catches obviously broken candidates without a model call:
+    - undecodable, tiny or blank images
+    - inpaint coordinates that are malformed or leave no room in the
+      image (a box partly outside is clamped, as in the Compositor)
+    - a product region that does not resemble the original PNG
+      (block SSIM against the product, over the rectangle the
+      Compositor actually filled inside the box)
+
+    The last two are flagged as `plan` failures: only a corrected scene
+    plan can fix them.
+    """
+
+    def __init__(
+        self,
+        min_similarity: float = config.PRESCREEN_MIN_SIMILARITY,
+        min_size: int = 64,
+        min_stddev: float = 2.0,
+    ):
+        self.min_similarity = min_similarity
+        self.min_size = min_size
+        self.min_stddev = min_stddev
+
+    def check(
+        self,
+        original_image_path: str,
+        candidate_image_path: str,
+        inpaint_coordinates: Optional[Sequence[Any]] = None,
+    ) -> PrescreenResult:
+        try:
+            with Image.open(candidate_image_path) as img:
+                candidate = img.convert("RGB")
+        except (OSError, UnidentifiedImageError):
+            return PrescreenResult(passed=False, issues=["candidate image is missing or cannot be decoded"])
+
+        if min(candidate.size) < self.min_size:
+            return PrescreenResult(
+                passed=False,
+                issues=[f"candidate is only {candidate.size[0]}x{candidate.size[1]} pixels"]
+            )
+
+        gray = np.asarray(candidate.convert("L"), dtype=np.float64)
+        if gray.std() < self.min_stddev:
+            return PrescreenResult(passed=False, issues=["candidate image is blank"])
+
+        if inpaint_coordinates is None:
+            return PrescreenResult(passed=True)
+
+        # Clamped exactly like the Compositor clamps the box it fills
+        box = clamp_box(inpaint_coordinates, candidate.size)
+        if box is None:
+            return PrescreenResult(
+                passed=False,
+                issues=[f"inpaint coordinates {list(inpaint_coordinates)} do not fit a "
+                        f"{candidate.size[0]}x{candidate.size[1]} image"],
+                plan=True
+            )
+
+        with Image.open(original_image_path) as img:
+            product = img.convert("RGBA")
+
+        # The Compositor keeps the aspect ratio, so the product fills
+        # only part of the box
+        crop = candidate.crop(fit_box(product.size, box)).resize((_COMPARE_SIZE, _COMPARE_SIZE)).convert("L")
+        product = product.resize((_COMPARE_SIZE, _COMPARE_SIZE))
+        # Compare only where the product cut-out is opaque
+        mask = np.asarray(product.getchannel("A"), dtype=np.float64) / 255.0
+        product_gray = np.asarray(product.convert("L"), dtype=np.float64)
+        crop_gray = np.asarray(crop, dtype=np.float64)
+
+        similarity = _block_ssim(product_gray * mask, crop_gray * mask)
+        if similarity < self.min_similarity:
+            return PrescreenResult(
+                passed=False,
+                issues=[f"product region at {list(box)} does not match the original "
+                        f"(similarity {similarity:.2f} < {self.min_similarity:.2f})"],
+                similarity=similarity,
+                plan=True
+            )
+
+        return PrescreenResult(passed=True, similarity=similarity)
@@ -1,18 +1,99 @@
+import asyncio
 from abc import ABC, abstractmethod
+from typing import Any, List, Optional
+
+
+def _schema_kwargs(response_schema: Optional[Any]) -> dict:
+    # Clients written before response_schema existed keep working
+    return {} if response_schema is None else {"response_schema": response_schema}
 
 
 class BaseLLMClient(ABC):
+    """
+    Text methods take an optional `response_schema` (a Pydantic model,
+    or a list of one); adapters that support schema-constrained output
+    use it, the others may ignore it.
+    """
 
     @abstractmethod
-    def invoke(self, prompt: str) -> str:
+    def invoke(self, prompt: str, response_schema: Optional[Any] = None) -> str:
         """
         Text prompt -> text response
         """
         pass
 
     @abstractmethod
-    def invoke_with_image(self, prompt: str, image_bytes: bytes) -> str:
+    def invoke_with_image(self, prompt: str, image_bytes: bytes, response_schema: Optional[Any] = None) -> str:
         """
         Image + Text -> Text Response
         """
         pass
+
+    @abstractmethod
+    def invoke_with_images(self, prompt: str, images: List[bytes], response_schema: Optional[Any] = None) -> str:
+        """
+        Several images (in order) + Text -> Text Response
+        """
+        pass
+
+    @abstractmethod
+    def invoke_image(
+        self,
+        prompt: str,
+        negative_prompt: str = "",
+        width: int = 1024,
+        height: int = 1024,
+    ) -> str:
+        """
+        Text prompt -> base64 encoded image
+        """
+        pass
+
+    def invoke_image_edit(self, prompt: str, image_bytes: bytes, mask_bytes: bytes) -> str:
+        """
+        Image + mask + Text -> base64 encoded image. Only the white
+        area of the mask may change. Optional; clients without an
+        editing model raise NotImplementedError.
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not support image editing.")
+
+    # Async counterparts. The defaults run the blocking call in a worker
+    # thread; adapters with a native async transport should override them.
+
+    async def ainvoke(self, prompt: str, response_schema: Optional[Any] = None) -> str:
+        """
+        Text prompt -> text response (async)
+        """
+        return await asyncio.to_thread(self.invoke, prompt, **_schema_kwargs(response_schema))
+
+    async def ainvoke_with_image(self, prompt: str, image_bytes: bytes, response_schema: Optional[Any] = None) -> str:
+        """
+        Image + Text -> Text Response (async)
+        """
+        return await asyncio.to_thread(self.invoke_with_image, prompt, image_bytes, **_schema_kwargs(response_schema))
+
+    async def ainvoke_with_images(self, prompt: str, images: List[bytes], response_schema: Optional[Any] = None) -> str:
+        """
+        Several images (in order) + Text -> Text Response (async)
+        """
+        return await asyncio.to_thread(self.invoke_with_images, prompt, images, **_schema_kwargs(response_schema))
+
+    async def ainvoke_image(
+        self,
+        prompt: str,
+        negative_prompt: str = "",
+        width: int = 1024,
+        height: int = 1024,
+    ) -> str:
+        """
+        Text prompt -> base64 encoded image (async)
+        """
+        return await asyncio.to_thread(
+            self.invoke_image, prompt, negative_prompt, width, height
+        )
+
+    async def ainvoke_image_edit(self, prompt: str, image_bytes: bytes, mask_bytes: bytes) -> str:
+        """
+        Image + mask + Text -> base64 encoded image (async)
+        """
+        return await asyncio.to_thread(self.invoke_image_edit, prompt, image_bytes, mask_bytes)
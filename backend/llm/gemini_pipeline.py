@@ -1,28 +1,262 @@
+import asyncio
+import base64
+import threading
+from typing import Any, List, Optional
+
+import httpx
 from google import genai
 from google.genai import types
+from imaging.preprocess import ImagePreprocessor, detect_mime_type
 from llm.base import BaseLLMClient
+from llm.rate_limit import RateLimiter, estimate_tokens, get_rate_limiter
+from metrics import LLM_CALL_SECONDS, LLM_PAYLOAD_BYTES, LLM_TOKENS
+from config import get_config
+
+config = get_config()
+
+# Aspect ratios accepted by the image generation endpoint
+_ASPECT_RATIOS = {"1:1": 1.0, "3:4": 3 / 4, "4:3": 4 / 3, "9:16": 9 / 16, "16:9": 16 / 9}
+
+_shared_client: Optional[genai.Client] = None
+_shared_client_lock = threading.Lock()
+
+
+def get_shared_client() -> genai.Client:
+    """
+    Returns the process-wide Gemini client.
+
+    All adapters share one client so that sync and async calls reuse
+    the same bounded HTTP connection pools instead of opening one
+    pool per agent.
+    """
+    global _shared_client
+    if _shared_client is None:
+        with _shared_client_lock:
+            if _shared_client is None:
+                limits = httpx.Limits(
+                    max_connections=config.LLM_MAX_CONNECTIONS,
+                    max_keepalive_connections=config.LLM_MAX_CONNECTIONS,
+                )
+                _shared_client = genai.Client(
+                    api_key=config.GEMINI_API_KEY or None,
+                    http_options=types.HttpOptions(
+                        client_args={"limits": limits},
+                        async_client_args={"limits": limits},
+                    ),
+                )
+    return _shared_client
+
+
+async def close_shared_client():
+    """
+    Releases the pooled connections of the shared client.
+    """
+    global _shared_client
+    with _shared_client_lock:
+        client, _shared_client = _shared_client, None
+    if client is not None:
+        await client.aio.aclose()
+        client.close()
+
+
+def _closest_aspect_ratio(width: int, height: int) -> str:
+    ratio = width / height
+    return min(_ASPECT_RATIOS, key=lambda name: abs(_ASPECT_RATIOS[name] - ratio))
 
 
 class GeminiAdapter(BaseLLMClient):
 
-    def __init__(self, model: str):
-        self.client = genai.Client()
+    def __init__(
+        self,
+        model: str,
+        client: Optional[genai.Client] = None,
+        preprocessor: Optional[ImagePreprocessor] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+    ):
+        self._client = client
         self.model = model
+        self.preprocessor = preprocessor
+        self.rate_limiter = rate_limiter or get_rate_limiter(model)
 
-    def invoke(self, prompt: str) -> str:
-        res = self.client.models.generate_content(
-            model=self.model,
-            contents=prompt
-        )
-        return res.text
+    @property
+    def client(self) -> genai.Client:
+        # Resolved on first call, so agents can be built without an API key
+        return self._client or get_shared_client()
 
-    def invoke_with_image(self, prompt: str, image_bytes: bytes) -> str:
-        part = types.Part.from_bytes(
+    def _image_part(self, image_bytes: bytes) -> types.Part:
+        if self.preprocessor is not None:
+            prepared = self.preprocessor.prepare(image_bytes)
+            LLM_PAYLOAD_BYTES.inc(len(prepared.data), model=self.model)
+            return types.Part.from_bytes(
+                data=prepared.data,
+                mime_type=prepared.mime_type
+            )
+
+        LLM_PAYLOAD_BYTES.inc(len(image_bytes), model=self.model)
+        return types.Part.from_bytes(
             data=image_bytes,
-            mime_type="image/png"
+            mime_type=detect_mime_type(image_bytes)
         )
-        res = self.client.models.generate_content(
-            model=self.model,
-            contents=[prompt, part]
+
+    def _image_config(self, negative_prompt: str, width: int, height: int) -> types.GenerateImagesConfig:
+        return types.GenerateImagesConfig(
+            negative_prompt=negative_prompt or None,
+            number_of_images=1,
+            aspect_ratio=_closest_aspect_ratio(width, height),
+        )
+
+    def _edit_request(self, image_bytes: bytes, mask_bytes: bytes) -> dict:
+        # Insertion inpainting restricted to the user-provided mask
+        return {
+            "reference_images": [
+                types.RawReferenceImage(
+                    reference_id=1,
+                    reference_image=types.Image(image_bytes=image_bytes, mime_type="image/png"),
+                ),
+                types.MaskReferenceImage(
+                    reference_id=2,
+                    reference_image=types.Image(image_bytes=mask_bytes, mime_type="image/png"),
+                    config=types.MaskReferenceConfig(mask_mode=types.MaskReferenceMode.MASK_MODE_USER_PROVIDED),
+                ),
+            ],
+            "config": types.EditImageConfig(
+                edit_mode=types.EditMode.EDIT_MODE_INPAINT_INSERTION,
+                number_of_images=1,
+                output_mime_type="image/png",
+            ),
+        }
+
+    def _record_usage(self, res):
+        usage = getattr(res, "usage_metadata", None)
+        for kind, field in (("prompt", "prompt_token_count"), ("output", "candidates_token_count")):
+            count = getattr(usage, field, None)
+            if isinstance(count, int):
+                LLM_TOKENS.inc(count, model=self.model, kind=kind)
+
+    def _content_config(self, response_schema: Optional[Any]) -> Optional[types.GenerateContentConfig]:
+        if response_schema is None:
+            return None
+        # Schema-constrained decoding: the response is JSON for the schema
+        return types.GenerateContentConfig(
+            response_mime_type="application/json",
+            response_schema=response_schema,
         )
+
+    def _generate_content(self, contents, estimated_tokens: int, response_schema: Optional[Any] = None):
+        with LLM_CALL_SECONDS.time(model=self.model, method="generate_content"):
+            res = self.rate_limiter.call(
+                lambda: self.client.models.generate_content(
+                    model=self.model,
+                    contents=contents,
+                    config=self._content_config(response_schema)
+                ),
+                estimated_tokens
+            )
+        self._record_usage(res)
+        return res
+
+    async def _agenerate_content(self, contents, estimated_tokens: int, response_schema: Optional[Any] = None):
+        with LLM_CALL_SECONDS.time(model=self.model, method="generate_content"):
+            res = await self.rate_limiter.acall(
+                lambda: self.client.aio.models.generate_content(
+                    model=self.model,
+                    contents=contents,
+                    config=self._content_config(response_schema)
+                ),
+                estimated_tokens
+            )
+        self._record_usage(res)
+        return res
+
+    def invoke(self, prompt: str, response_schema: Optional[Any] = None) -> str:
+        res = self._generate_content(prompt, estimate_tokens(prompt), response_schema)
+        return res.text
+
+    def invoke_with_image(self, prompt: str, image_bytes: bytes, response_schema: Optional[Any] = None) -> str:
+        part = self._image_part(image_bytes)
+        res = self._generate_content([prompt, part], estimate_tokens(prompt, images=1), response_schema)
+        return res.text
+
+    def invoke_with_images(self, prompt: str, images: List[bytes], response_schema: Optional[Any] = None) -> str:
+        parts = [self._image_part(image_bytes) for image_bytes in images]
+        res = self._generate_content([prompt, *parts], estimate_tokens(prompt, images=len(parts)), response_schema)
+        return res.text
+
+    def invoke_image(
+        self,
+        prompt: str,
+        negative_prompt: str = "",
+        width: int = 1024,
+        height: int = 1024,
+    ) -> str:
+        with LLM_CALL_SECONDS.time(model=self.model, method="generate_images"):
+            res = self.rate_limiter.call(
+                lambda: self.client.models.generate_images(
+                    model=self.model,
+                    prompt=prompt,
+                    config=self._image_config(negative_prompt, width, height)
+                )
+            )
+        return base64.b64encode(res.generated_images[0].image.image_bytes).decode("ascii")
+
+    def invoke_image_edit(self, prompt: str, image_bytes: bytes, mask_bytes: bytes) -> str:
+        LLM_PAYLOAD_BYTES.inc(len(image_bytes) + len(mask_bytes), model=self.model)
+        with LLM_CALL_SECONDS.time(model=self.model, method="edit_image"):
+            res = self.rate_limiter.call(
+                lambda: self.client.models.edit_image(
+                    model=self.model,
+                    prompt=prompt,
+                    **self._edit_request(image_bytes, mask_bytes)
+                )
+            )
+        return base64.b64encode(res.generated_images[0].image.image_bytes).decode("ascii")
+
+    async def ainvoke(self, prompt: str, response_schema: Optional[Any] = None) -> str:
+        res = await self._agenerate_content(prompt, estimate_tokens(prompt), response_schema)
         return res.text
+
+    async def ainvoke_with_image(
+        self, prompt: str, image_bytes: bytes, response_schema: Optional[Any] = None
+    ) -> str:
+        # Decoding and re-encoding is CPU work; keep it off the event loop
+        part = await asyncio.to_thread(self._image_part, image_bytes)
+        res = await self._agenerate_content([prompt, part], estimate_tokens(prompt, images=1), response_schema)
+        return res.text
+
+    async def ainvoke_with_images(
+        self, prompt: str, images: List[bytes], response_schema: Optional[Any] = None
+    ) -> str:
+        parts = await asyncio.to_thread(lambda: [self._image_part(b) for b in images])
+        res = await self._agenerate_content(
+            [prompt, *parts], estimate_tokens(prompt, images=len(parts)), response_schema
+        )
+        return res.text
+
+    async def ainvoke_image(
+        self,
+        prompt: str,
+        negative_prompt: str = "",
+        width: int = 1024,
+        height: int = 1024,
+    ) -> str:
+        with LLM_CALL_SECONDS.time(model=self.model, method="generate_images"):
+            res = await self.rate_limiter.acall(
+                lambda: self.client.aio.models.generate_images(
+                    model=self.model,
+                    prompt=prompt,
+                    config=self._image_config(negative_prompt, width, height)
+                )
+            )
+        return base64.b64encode(res.generated_images[0].image.image_bytes).decode("ascii")
+
+    async def ainvoke_image_edit(self, prompt: str, image_bytes: bytes, mask_bytes: bytes) -> str:
+        LLM_PAYLOAD_BYTES.inc(len(image_bytes) + len(mask_bytes), model=self.model)
+        with LLM_CALL_SECONDS.time(model=self.model, method="edit_image"):
+            res = await self.rate_limiter.acall(
+                lambda: self.client.aio.models.edit_image(
+                    model=self.model,
+                    prompt=prompt,
+                    **self._edit_request(image_bytes, mask_bytes)
+                )
+            )
+        return base64.b64encode(res.generated_images[0].image.image_bytes).decode("ascii")
@@ -0,0 +1,292 @@
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import httpx
+from google.genai import errors
+
+from config import get_config
+from metrics import LLM_RETRIES, LLM_THROTTLED
+
+config = get_config()
+
+# Status codes worth retrying: quota exhaustion and transient server errors
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+def is_retryable(exc: Exception) -> bool:
+    if isinstance(exc, errors.APIError):
+        return exc.code in RETRYABLE_STATUS
+    return isinstance(exc, (httpx.TransportError, asyncio.TimeoutError))
+
+
+def is_throttled(exc: Exception) -> bool:
+    return isinstance(exc, errors.APIError) and exc.code == 429
+
+
+class TokenBucket:
+    """
+    Per-minute budget that refills continuously.
+
+    `reserve` always books the amount and returns how long the caller
+    must wait before the booking is covered, so concurrent callers
+    queue up fairly instead of racing for the same refill.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float) -> float:
+        with self._lock:
+            self._refill()
+            self.tokens -= min(amount, self.capacity)
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def adjust(self, delta: float):
+        """
+        Books (or refunds, if negative) a correction after the fact.
+        """
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens - delta)
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD concurrency limit shared by threads and event loops.
+
+    The limit grows by roughly one slot per window of successful calls
+    and is cut multiplicatively on throttling, so the number of calls in
+    flight settles just below what the provider accepts.
+    """
+
+    def __init__(
+        self,
+        initial: int,
+        minimum: int = 1,
+        maximum: int = 64,
+        decrease: float = 0.5,
+        cooldown: float = 1.0,
+    ):
+        self.minimum = minimum
+        self.maximum = max(maximum, minimum)
+        self.limit = float(min(max(initial, minimum), self.maximum))
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self.in_flight = 0
+
+        self._lock = threading.Lock()
+        self._waiters = deque()
+        self._last_decrease = 0.0
+
+    def _has_slot(self) -> bool:
+        return self.in_flight < int(self.limit)
+
+    def _wake(self):
+        # Hands free slots to waiters; caller holds the lock
+        while self._waiters and self._has_slot():
+            waiter = self._waiters.popleft()
+            self.in_flight += 1
+            if isinstance(waiter, threading.Event):
+                waiter.set()
+            else:
+                loop, future = waiter
+                loop.call_soon_threadsafe(self._resolve, future)
+
+    def _resolve(self, future: asyncio.Future):
+        if future.cancelled():
+            # The waiter gave up after its slot was handed over
+            self.release()
+        else:
+            future.set_result(None)
+
+    def acquire(self):
+        with self._lock:
+            if self._has_slot():
+                self.in_flight += 1
+                return
+            event = threading.Event()
+            self._waiters.append(event)
+        event.wait()
+
+    async def aacquire(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._has_slot():
+                self.in_flight += 1
+                return
+            future = loop.create_future()
+            waiter = (loop, future)
+            self._waiters.append(waiter)
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+            if future.done() and not future.cancelled():
+                # Cancelled after the slot was already handed over
+                self.release()
+            raise
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+            self._wake()
+
+    def on_success(self):
+        with self._lock:
+            self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self._wake()
+
+    def on_throttle(self):
+        with self._lock:
+            now = time.monotonic()
+            # One cut per burst of 429s, not one per failed call
+            if now - self._last_decrease >= self.cooldown:
+                self.limit = max(float(self.minimum), self.limit * self.decrease)
+                self._last_decrease = now
+
+
+class RateLimiter:
+    """
+    Client-side quota guard for one model
+
+    Responsibilities:
+    - Keeps requests and tokens per minute under the configured quota.
+    - Bounds calls in flight with an AIMD concurrency limit.
+    - Retries retryable errors with jittered exponential backoff.
+    """
+
+    def __init__(
+        self,
+        model: str = "",
+        requests_per_minute: float = config.LLM_RPM,
+        tokens_per_minute: float = config.LLM_TPM,
+        max_concurrency: int = config.LLM_MAX_CONCURRENCY,
+        max_attempts: int = config.LLM_MAX_ATTEMPTS,
+        backoff_base: float = config.LLM_BACKOFF_BASE,
+        backoff_max: float = config.LLM_BACKOFF_MAX,
+    ):
+        self.model = model
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.concurrency = AdaptiveConcurrency(
+            initial=max(1, max_concurrency // 2),
+            maximum=max_concurrency
+        )
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self.retries = 0
+        self.throttled = 0
+
+    def _budget_delay(self, estimated_tokens: int) -> float:
+        return max(self.requests.reserve(1), self.tokens.reserve(estimated_tokens))
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _reconcile(self, estimated_tokens: int, response: Any):
+        usage = getattr(response, "usage_metadata", None)
+        actual = getattr(usage, "total_token_count", None)
+        if isinstance(actual, int):
+            self.tokens.adjust(actual - estimated_tokens)
+
+    def _on_error(self, exc: Exception, attempt: int) -> float:
+        """
+        Returns the backoff delay, or re-raises if the error is final.
+        """
+        if not is_retryable(exc) or attempt + 1 >= self.max_attempts:
+            raise exc
+        if is_throttled(exc):
+            self.throttled += 1
+            LLM_THROTTLED.inc(model=self.model)
+            self.concurrency.on_throttle()
+        self.retries += 1
+        LLM_RETRIES.inc(model=self.model)
+        return self._backoff(attempt)
+
+    def call(self, fn: Callable[[], Any], estimated_tokens: int = 0) -> Any:
+        for attempt in range(self.max_attempts):
+            time.sleep(self._budget_delay(estimated_tokens))
+
+            self.concurrency.acquire()
+            try:
+                response = fn()
+            except Exception as exc:
+                delay = self._on_error(exc, attempt)
+            else:
+                self.concurrency.on_success()
+                self._reconcile(estimated_tokens, response)
+                return response
+            finally:
+                self.concurrency.release()
+
+            time.sleep(delay)
+
+    async def acall(self, fn: Callable[[], Awaitable[Any]], estimated_tokens: int = 0) -> Any:
+        for attempt in range(self.max_attempts):
+            await asyncio.sleep(self._budget_delay(estimated_tokens))
+
+            await self.concurrency.aacquire()
+            try:
+                response = await fn()
+            except Exception as exc:
+                delay = self._on_error(exc, attempt)
+            else:
+                self.concurrency.on_success()
+                self._reconcile(estimated_tokens, response)
+                return response
+            finally:
+                self.concurrency.release()
+
+            await asyncio.sleep(delay)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "concurrency_limit": int(self.concurrency.limit),
+            "in_flight": self.concurrency.in_flight,
+            "retries": self.retries,
+            "throttled": self.throttled,
+        }
+
+
+_limiters: Dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(model: str) -> RateLimiter:
+    """
+    Returns the process-wide limiter for `model`, shared by every
+    adapter (and therefore every agent) that calls it.
+    """
+    with _limiters_lock:
+        if model not in _limiters:
+            _limiters[model] = RateLimiter(model)
+        return _limiters[model]
+
+
+def rate_limiter_stats() -> Dict[str, Dict[str, float]]:
+    with _limiters_lock:
+        return {model: limiter.stats() for model, limiter in _limiters.items()}
+
+
+def estimate_tokens(prompt: str, images: int = 0) -> int:
+    # ~4 characters per text token; Gemini bills a fixed budget per image
+    return len(prompt) // 4 + images * 258
@@ -0,0 +1,253 @@
+import asyncio
+import base64
+import io
+import json
+import random
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from google.genai import errors
+from PIL import Image
+from pydantic import BaseModel
+
+from llm.base import BaseLLMClient
+
+
+class SimulationProfile(BaseModel):
+    """
+    Knobs for SimulatedLLMClient. Latencies are in seconds and drawn
+    from a log-normal distribution with the given median and spread.
+    """
+
+    text_latency: float = 0.8
+    image_latency: float = 6.0
+    latency_sigma: float = 0.4
+    per_image_latency: float = 0.15
+    failure_rate: float = 0.0
+    failure_code: int = 503
+    malformed_rate: float = 0.0
+    # Valid JSON wrapped in prose and a markdown fence, with a trailing
+    # comma: broken for a strict parser, fixable by local repair
+    fenced_rate: float = 0.0
+    # Share of Judge verdicts that reject the candidate, so the
+    # correction and retry path runs
+    reject_rate: float = 0.0
+    image_bytes: int = 1_500_000
+    seed: Optional[int] = None
+
+
+# Canned, schema-valid answers keyed by the agent that asks
+_PRODUCT_SPECS = {
+    "metal_type": "18k yellow gold",
+    "main_stone": {"cut": "round brilliant", "color": "D", "clarity": "VVS1", "carat": "1.2"},
+    "setting_style": "six-prong solitaire",
+    "unique_imperfections": "faint polishing lines on the inner shank",
+}
+_SCENE_PLAN = {
+    "prompt": "Ring on black marble, soft window light from the left, shallow depth of field",
+    "negative_prompt": "text, watermark, extra stones, distorted prongs",
+    "lighting_map": {"source_direction": "left", "temperature": "5600K"},
+    "inpaint_coordinates": [384, 384, 640, 640],
+}
+_JUDGE_EVALUATION = {
+    "score": 92.0,
+    "is_approved": True,
+    "issues": [],
+    "recommendations": ["Slightly warmer fill light"],
+}
+# Rejections alternate between a placement issue (composite retry once
+# the Director moves the box) and a backdrop issue (scene retry)
+_REJECTIONS = [
+    {"score": 55.0, "is_approved": False, "issues": ["The ring sits slightly off-center"], "recommendations": []},
+    {"score": 50.0, "is_approved": False, "issues": ["Background marble is too busy"], "recommendations": []},
+]
+# A corrected plan moves the product, so placement feedback can be acted on
+_CORRECTED_PLAN = {**_SCENE_PLAN, "inpaint_coordinates": [400, 400, 656, 656]}
+_IMAGE_INSTRUCTION = {
+    "prompt": _SCENE_PLAN["prompt"],
+    "negative_prompt": _SCENE_PLAN["negative_prompt"],
+    "width": 1024,
+    "height": 1024,
+    "infer": True,
+}
+
+_BATCH_COUNT = re.compile(r"JSON array with exactly (\d+) objects")
+# Re-asks carry the JSON schema of the model they expect
+_REASKS = {
+    "ProductSpecs": _PRODUCT_SPECS,
+    "ScenePlan": _SCENE_PLAN,
+    "JudgeEvaluation": _JUDGE_EVALUATION,
+    "ImageInstruction": _IMAGE_INSTRUCTION,
+}
+
+
+class SimulatedLLMClient(BaseLLMClient):
+    """
+    Offline stand-in for GeminiAdapter
+
+    Responsibilities:
+    - Sleeps for a realistic, configurable latency per call.
+    - Fails with a retryable APIError or returns malformed or fenced
+      JSON at the configured rates, so retry, repair and re-ask paths
+      are exercised. Schema-constrained calls always return valid JSON.
+    - Returns schema-valid canned output for the agent that asks,
+      recognised from its system prompt; the Judge rejects at
+      `reject_rate`, and corrections move the product.
+    - Returns a PNG of the requested size and roughly `image_bytes`
+      for image generation.
+
+    No network access and no API key are needed.
+    """
+
+    def __init__(self, profile: Optional[SimulationProfile] = None):
+        self.profile = profile or SimulationProfile()
+        self.calls = 0
+
+        self._random = random.Random(self.profile.seed)
+        self._lock = threading.Lock()
+        self._images: Dict[Tuple[int, int], str] = {}
+
+    def _draw(self, median: float) -> Dict[str, Any]:
+        # One locked draw per call keeps seeded runs reproducible
+        with self._lock:
+            self.calls += 1
+            return {
+                "latency": median * self._random.lognormvariate(0, self.profile.latency_sigma),
+                "fail": self._random.random() < self.profile.failure_rate,
+                "malformed": self._random.random() < self.profile.malformed_rate,
+                "fenced": self._random.random() < self.profile.fenced_rate,
+                "reject": self._random.random() < self.profile.reject_rate,
+                "rejection": self._random.choice(_REJECTIONS),
+            }
+
+    def _fail(self):
+        raise errors.APIError(
+            self.profile.failure_code,
+            {"error": {"code": self.profile.failure_code, "message": "simulated failure"}}
+        )
+
+    def _answer(self, prompt: str, draw: Dict[str, Any]) -> Any:
+        if prompt.startswith("Your previous answer could not be parsed"):
+            for title, answer in _REASKS.items():
+                if f'"title": "{title}"' in prompt:
+                    return answer
+        if "Gemologist" in prompt:
+            batch = _BATCH_COUNT.search(prompt)
+            if batch:
+                return [_PRODUCT_SPECS] * int(batch.group(1))
+            return _PRODUCT_SPECS
+        if "Art Director" in prompt:
+            return _CORRECTED_PLAN if "The Judge rejected" in prompt else _SCENE_PLAN
+        if "Creative Judge" in prompt:
+            return draw["rejection"] if draw["reject"] else _JUDGE_EVALUATION
+        if "Image Producer" in prompt:
+            return _IMAGE_INSTRUCTION
+        return {}
+
+    def _text_draw(self, images: int) -> Dict[str, Any]:
+        return self._draw(self.profile.text_latency + images * self.profile.per_image_latency)
+
+    def _text(self, prompt: str, draw: Dict[str, Any], response_schema: Optional[Any]) -> str:
+        if draw["fail"]:
+            self._fail()
+
+        text = json.dumps(self._answer(prompt, draw))
+        if response_schema is not None:
+            return text
+        if draw["malformed"]:
+            # Truncated output, the most common real-world failure
+            return text[: len(text) // 2]
+        if draw["fenced"] and text[-1] in "}]":
+            return f"Here is the JSON:\n```json\n{text[:-1]},{text[-1]}\n```"
+        return text
+
+    def _image(self, width: int, height: int) -> str:
+        with self._lock:
+            if (width, height) not in self._images:
+                # Noise barely compresses and flat grey compresses to almost
+                # nothing: enough noisy rows put the PNG close to the
+                # requested payload size at the requested resolution
+                pixels = np.full((height, width, 3), 128, dtype=np.uint8)
+                rows = min(height, self.profile.image_bytes // (width * 3))
+                pixels[:rows] = np.random.default_rng(self.profile.seed).integers(
+                    0, 256, (rows, width, 3), dtype=np.uint8
+                )
+                buffer = io.BytesIO()
+                Image.fromarray(pixels).save(buffer, format="PNG")
+                self._images[(width, height)] = base64.b64encode(buffer.getvalue()).decode("ascii")
+            return self._images[(width, height)]
+
+    def _sync_text(self, prompt: str, images: int, response_schema: Optional[Any] = None) -> str:
+        draw = self._text_draw(images)
+        time.sleep(draw["latency"])
+        return self._text(prompt, draw, response_schema)
+
+    async def _async_text(self, prompt: str, images: int, response_schema: Optional[Any] = None) -> str:
+        draw = self._text_draw(images)
+        await asyncio.sleep(draw["latency"])
+        return self._text(prompt, draw, response_schema)
+
+    def invoke(self, prompt: str, response_schema: Optional[Any] = None) -> str:
+        return self._sync_text(prompt, 0, response_schema)
+
+    def invoke_with_image(self, prompt: str, image_bytes: bytes, response_schema: Optional[Any] = None) -> str:
+        return self._sync_text(prompt, 1, response_schema)
+
+    def invoke_with_images(self, prompt: str, images: List[bytes], response_schema: Optional[Any] = None) -> str:
+        return self._sync_text(prompt, len(images), response_schema)
+
+    def invoke_image(
+        self,
+        prompt: str,
+        negative_prompt: str = "",
+        width: int = 1024,
+        height: int = 1024,
+    ) -> str:
+        draw = self._draw(self.profile.image_latency)
+        time.sleep(draw["latency"])
+        if draw["fail"]:
+            self._fail()
+        return self._image(width, height)
+
+    def invoke_image_edit(self, prompt: str, image_bytes: bytes, mask_bytes: bytes) -> str:
+        draw = self._draw(self.profile.image_latency)
+        time.sleep(draw["latency"])
+        if draw["fail"]:
+            self._fail()
+        # The edit is simulated as a no-op, so the product stays intact
+        return base64.b64encode(image_bytes).decode("ascii")
+
+    # Native async variants so simulated latency does not occupy worker
+    # threads and cap the concurrency being measured
+
+    async def ainvoke(self, prompt: str, response_schema: Optional[Any] = None) -> str:
+        return await self._async_text(prompt, 0, response_schema)
+
+    async def ainvoke_with_image(self, prompt: str, image_bytes: bytes, response_schema: Optional[Any] = None) -> str:
+        return await self._async_text(prompt, 1, response_schema)
+
+    async def ainvoke_with_images(self, prompt: str, images: List[bytes], response_schema: Optional[Any] = None) -> str:
+        return await self._async_text(prompt, len(images), response_schema)
+
+    async def ainvoke_image(
+        self,
+        prompt: str,
+        negative_prompt: str = "",
+        width: int = 1024,
+        height: int = 1024,
+    ) -> str:
+        draw = self._draw(self.profile.image_latency)
+        await asyncio.sleep(draw["latency"])
+        if draw["fail"]:
+            self._fail()
+        return await asyncio.to_thread(self._image, width, height)
+
+    async def ainvoke_image_edit(self, prompt: str, image_bytes: bytes, mask_bytes: bytes) -> str:
+        draw = self._draw(self.profile.image_latency)
+        await asyncio.sleep(draw["latency"])
+        if draw["fail"]:
+            self._fail()
+        return base64.b64encode(image_bytes).decode("ascii")
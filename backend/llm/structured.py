@@ -0,0 +1,224 @@
+import json
+import re
+from typing import Any, Generic, List, Optional, Tuple, Type, TypeVar
+
+from pydantic import BaseModel
+
+from llm.base import BaseLLMClient, _schema_kwargs
+from metrics import JSON_PARSE_FAILURES, JSON_PARSE_OUTCOMES
+from config import get_config
+
+config = get_config()
+
+T = TypeVar("T", bound=BaseModel)
+
+_FENCE = re.compile(r"```(?:json|JSON)?\s*\n?(.*?)(?:```|$)", re.DOTALL)
+_LITERALS = {"True": "true", "False": "false", "None": "null"}
+_CLOSING = {"{": "}", "[": "]"}
+
+
+class StructuredOutputError(ValueError):
+    """
+    Model output that is not valid for the requested schema, even
+    after local repair (and a re-ask, if one was allowed).
+    """
+
+    def __init__(self, agent: str, raw_output: str, error: Exception):
+        self.agent = agent
+        self.raw_output = raw_output
+        self.error = error
+        super().__init__(
+            f"{agent}: JSON parsing failed.\n"
+            f"Raw model output:\n{raw_output}\n"
+            f"Validation error: {error}"
+        )
+
+
+def repair_json(text: str) -> str:
+    """
+    Extracts the JSON value from free-form model text and fixes the
+    usual slips: markdown fences, prose around the value, comments,
+    trailing commas, Python literals and output cut off mid-value.
+    """
+    fenced = _FENCE.search(text)
+    if fenced:
+        text = fenced.group(1)
+
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    if not starts:
+        return text.strip()
+
+    out: List[str] = []
+    stack: List[str] = []
+    i = min(starts)
+    in_string = False
+    escaped = False
+
+    while i < len(text):
+        char = text[i]
+        if in_string:
+            out.append(char)
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+            i += 1
+            continue
+
+        if char == '"':
+            in_string = True
+            out.append(char)
+        elif text.startswith("//", i):
+            newline = text.find("\n", i)
+            i = len(text) if newline < 0 else newline
+            continue
+        elif text.startswith("/*", i):
+            end = text.find("*/", i + 2)
+            i = len(text) if end < 0 else end + 2
+            continue
+        elif char in _CLOSING:
+            stack.append(_CLOSING[char])
+            out.append(char)
+        elif char in "}]":
+            _drop_trailing_comma(out)
+            out.append(char)
+            if stack:
+                stack.pop()
+            if not stack:
+                # Anything after the top-level value is commentary
+                break
+        elif char.isalpha():
+            end = i
+            while end < len(text) and (text[end].isalnum() or text[end] == "_"):
+                end += 1
+            word = text[i:end]
+            out.append(_LITERALS.get(word, word))
+            i = end
+            continue
+        else:
+            out.append(char)
+        i += 1
+
+    if in_string:
+        out.append('"')
+    while stack:
+        # Truncated output: close what was opened. Validation still
+        # rejects the result if required fields went missing.
+        _drop_trailing_comma(out)
+        out.append(stack.pop())
+
+    return "".join(out)
+
+
+def _drop_trailing_comma(out: List[str]):
+    while out and out[-1].isspace():
+        out.pop()
+    if out and out[-1] == ",":
+        out.pop()
+
+
+def reask_prompt(schema: Type[BaseModel], raw_output: str, error: Exception) -> str:
+    return (
+        "Your previous answer could not be parsed as JSON for the schema below.\n\n"
+        f"Schema:\n{json.dumps(schema.model_json_schema())}\n\n"
+        f"Error:\n{error}\n\n"
+        f"Previous answer:\n{raw_output}\n\n"
+        "Return only the corrected JSON, with no commentary and no markdown."
+    )
+
+
+class StructuredParser(Generic[T]):
+    """
+    Turns model text into a validated Pydantic model
+
+    Responsibilities:
+    - Validates strictly first; clean output costs nothing extra.
+    - Falls back to local repair (repair_json) before spending a call.
+    - Only if that fails, re-asks the model once with the error and the
+      schema. The re-ask is text only, so images are not uploaded again.
+    - Counts each outcome per agent (clean, repaired, reasked, failed),
+      so the calls saved by repair are visible in /metrics.
+    """
+
+    def __init__(
+        self,
+        agent: str,
+        schema: Type[T],
+        reask: bool = config.JSON_REASK,
+        structured: bool = False,
+    ):
+        self.agent = agent
+        self.schema = schema
+        self.reask = reask
+        # Ask for schema-constrained output on the re-ask as well
+        self.response_schema = schema if structured else None
+
+    def _validate(self, raw_output: str) -> Tuple[T, str]:
+        try:
+            return self.schema.model_validate_json(raw_output), "clean"
+        except Exception:
+            pass
+        try:
+            return self.schema.model_validate_json(repair_json(raw_output)), "repaired"
+        except Exception as exc:
+            raise StructuredOutputError(self.agent, raw_output, exc)
+
+    def _failed(self):
+        # Only once repair and any re-ask are exhausted
+        JSON_PARSE_FAILURES.inc(agent=self.agent)
+        JSON_PARSE_OUTCOMES.inc(agent=self.agent, outcome="failed")
+
+    def _first(self, raw_output: str, can_reask: bool) -> Tuple[Optional[T], Optional[str]]:
+        """
+        Returns the parsed model, or the re-ask prompt to send instead.
+        """
+        try:
+            parsed, outcome = self._validate(raw_output)
+        except StructuredOutputError as exc:
+            if not (self.reask and can_reask):
+                self._failed()
+                raise
+            return None, reask_prompt(self.schema, raw_output, exc.error)
+        JSON_PARSE_OUTCOMES.inc(agent=self.agent, outcome=outcome)
+        return parsed, None
+
+    def _second(self, raw_output: str) -> T:
+        try:
+            parsed, _ = self._validate(raw_output)
+        except StructuredOutputError:
+            self._failed()
+            raise
+        JSON_PARSE_OUTCOMES.inc(agent=self.agent, outcome="reasked")
+        return parsed
+
+    def parse(self, raw_output: str, client: Optional[BaseLLMClient] = None) -> T:
+        """
+        Parses `raw_output`; `client` is used for the re-ask, without
+        one a failed repair raises right away.
+        """
+        parsed, prompt = self._first(raw_output, client is not None)
+        if prompt is None:
+            return parsed
+        return self._second(client.invoke(prompt, **_schema_kwargs(self.response_schema)))
+
+    async def aparse(self, raw_output: str, client: Optional[BaseLLMClient] = None) -> T:
+        parsed, prompt = self._first(raw_output, client is not None)
+        if prompt is None:
+            return parsed
+        return self._second(await client.ainvoke(prompt, **_schema_kwargs(self.response_schema)))
+
+
+def parse_json_lenient(raw_output: str) -> Any:
+    """
+    json.loads with repair_json as fallback; None if neither works.
+    """
+    try:
+        return json.loads(raw_output)
+    except ValueError:
+        pass
+    try:
+        return json.loads(repair_json(raw_output))
+    except ValueError:
+        return None
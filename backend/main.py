@@ -1,14 +1,60 @@
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
+import time
 
-from routes import router as api_router
-from config import Configuration
+_IMPORT_STARTED = time.perf_counter()
+
+import asyncio  # noqa: E402
+import logging  # noqa: E402
+import sys  # noqa: E402
+from contextlib import asynccontextmanager  # noqa: E402
+
+from fastapi import FastAPI  # noqa: E402
+from fastapi.middleware.cors import CORSMiddleware  # noqa: E402
+from fastapi.responses import PlainTextResponse  # noqa: E402
+
+from routes import router as api_router, ensure_directories  # noqa: E402
+from services import services  # noqa: E402
+from config import get_config  # noqa: E402
+from metrics import REGISTRY, STARTUP_SECONDS  # noqa: E402
+
+config = get_config()
+logger = logging.getLogger(__name__)
+
+
+def collect_garbage():
+    # Drop checkpoints of runs nobody resumed within CHECKPOINT_TTL,
+    # and the candidate images only they referenced
+    services.checkpointer.prune()
+    services.blobs.prune()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    ensure_directories()
+    # Background workers drain the persistent job queue; agents and
+    # the graph are built when the first image arrives
+    services.job_workers.start()
+    # Garbage collection runs off the startup path
+    gc = asyncio.create_task(asyncio.to_thread(collect_garbage))
+
+    startup = time.perf_counter() - _IMPORT_STARTED
+    STARTUP_SECONDS.collect = lambda: startup
+    logger.info("Startup took %.3fs", startup)
+    yield
+    await services.job_workers.stop()
+    await asyncio.gather(gc, return_exceptions=True)
+    pool = services.built("image_pool")
+    if pool is not None:
+        await asyncio.to_thread(pool.shutdown)
+    # Only agents import the Gemini client; without one there is nothing to close
+    pipeline = sys.modules.get("llm.gemini_pipeline")
+    if pipeline is not None:
+        await pipeline.close_shared_client()
 
-config = Configuration()
 
 app = FastAPI(
     title="Autonomous Luxury Studio API",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS Middleware
@@ -27,3 +73,9 @@ app.include_router(api_router)
 @app.get("/health")
 def health_check():
     return {"status": "OK"}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    # Prometheus text exposition format
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
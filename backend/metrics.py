@@ -0,0 +1,206 @@
+import bisect
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+LabelValues = Tuple[str, ...]
+
+# Latency buckets in seconds, from cache hits up to slow image generations
+DEFAULT_BUCKETS = (0.005, 0.025, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def _header(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self._header() + [
+            f"{self.name}{_format_labels(self.label_names, key)} {value}"
+            for key, value in items
+        ]
+
+
+class Gauge(_Metric):
+    """
+    Gauge whose value is read from `collect` at scrape time.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str):
+        super().__init__(name, documentation)
+        self.collect: Optional[Callable[[], float]] = None
+
+    def render(self) -> List[str]:
+        if self.collect is None:
+            return []
+        return self._header() + [f"{self.name} {self.collect()}"]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        # key -> (per-bucket counts incl. +Inf, sum)
+        self._values: Dict[LabelValues, Tuple[List[int], float]] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.get(key) or ([0] * (len(self.buckets) + 1), 0.0)
+            counts[index] += 1
+            self._values[key] = (counts, total + value)
+
+    def count(self, **labels: str) -> int:
+        with self._lock:
+            entry = self._values.get(self._key(labels))
+        return sum(entry[0]) if entry else 0
+
+    @contextmanager
+    def time(self, **labels: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+
+        lines = self._header()
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                labels = _format_labels(self.label_names, key, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+NODE_SECONDS = REGISTRY.register(Histogram(
+    "studio_graph_node_seconds", "Time spent in each GraphWorkflow node.", ["node"]
+))
+LLM_CALL_SECONDS = REGISTRY.register(Histogram(
+    "studio_llm_call_seconds", "Latency of LLM calls including retries.", ["model", "method"]
+))
+LLM_PAYLOAD_BYTES = REGISTRY.register(Counter(
+    "studio_llm_payload_bytes_total", "Image bytes sent to LLM calls.", ["model"]
+))
+LLM_TOKENS = REGISTRY.register(Counter(
+    "studio_llm_tokens_total", "Tokens reported by the provider.", ["model", "kind"]
+))
+LLM_RETRIES = REGISTRY.register(Counter(
+    "studio_llm_retries_total", "LLM calls retried after a retryable error.", ["model"]
+))
+LLM_THROTTLED = REGISTRY.register(Counter(
+    "studio_llm_throttled_total", "LLM calls rejected with HTTP 429.", ["model"]
+))
+JUDGE_RETRIES = REGISTRY.register(Counter(
+    "studio_judge_retries_total", "Rejected candidates sent back to the Producer (Judge or pre-screen), by the stage redone: scene or composite.", ["stage"]
+))
+JSON_PARSE_FAILURES = REGISTRY.register(Counter(
+    "studio_json_parse_failures_total", "Model outputs that failed JSON validation after local repair and any re-ask.", ["agent"]
+))
+JSON_PARSE_OUTCOMES = REGISTRY.register(Counter(
+    "studio_json_parse_outcomes_total",
+    "Parsed model outputs by how they became valid: clean, repaired, reasked or failed.",
+    ["agent", "outcome"]
+))
+QUEUE_DEPTH = REGISTRY.register(Gauge(
+    "studio_job_queue_depth", "Images waiting in the job queue."
+))
+STARTUP_SECONDS = REGISTRY.register(Gauge(
+    "studio_startup_seconds", "Time from importing the app until it served requests."
+))
+PEAK_RSS_BYTES = REGISTRY.register(Gauge(
+    "studio_process_peak_rss_bytes", "Peak resident memory of this worker process."
+))
+
+
+def _peak_rss_bytes() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return float(peak if sys.platform == "darwin" else peak * 1024)
+
+
+PEAK_RSS_BYTES.collect = _peak_rss_bytes
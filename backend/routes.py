@@ -1,106 +1,448 @@
-import os
+import asyncio
+import hashlib
 import json
+import logging
+from datetime import datetime
 from pathlib import Path
-from typing import List
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, List, Optional, Tuple
 
-from fastapi import APIRouter, UploadFile, File, HTTPException
+from fastapi import APIRouter, UploadFile, File, HTTPException, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
 
-from agents.analyst import AnalystAgent
-from agents.art_director import DirectorAgent
-from agents.judge import JudgeAgent
-from agents.producer import ProducerAgent
-from graph.graph_workflow import GraphWorkflow
-from schemas import GraphState, ProductSpecs
-from config import Configuration
+from batch.uploads import ImageUploadError, stream_upload
+from schemas import GraphState, ImageRef, ProductSpecs, ScenePlan
+from services import services
+from config import get_config
+
+if TYPE_CHECKING:
+    from batch.duplicates import DuplicateGroup
+    from batch.results import ResultBuffer
 
 router = APIRouter()
-config = Configuration()
+config = get_config()
+logger = logging.getLogger(__name__)
 
 INPUT_DIR = Path(config.INPUT_DIR)
 OUTPUT_DIR = Path(config.OUTPUT_DIR)
 
-INPUT_DIR.mkdir(parents=True, exist_ok=True)
-OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
-
-analyst = AnalystAgent()
-director = DirectorAgent()
-producer = ProducerAgent()
-judge = JudgeAgent()
 
-workflow = GraphWorkflow(analyst, director, producer, judge).build()
+def ensure_directories():
+    INPUT_DIR.mkdir(parents=True, exist_ok=True)
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
 
-def clear_directory(directory: Path):
-    for f in directory.iterdir():
-        f.unlink(missing_ok=True)
+def write_generation(image_path: Path, state: GraphState):
+    if isinstance(state.generation, ImageRef):
+        # Links the stored blob instead of copying bytes through memory
+        services.blobs.export(state.generation, OUTPUT_DIR / f"{image_path.stem}_generated.png")
 
 
 def run_single(image_path: Path) -> GraphState:
-    specs = ProductSpecs(image_path=str(image_path))
-    state = GraphState(product=specs)
-    state = workflow.invoke(state)
+    from graph.checkpoint import image_thread_id
+
+    state = GraphState(image_path=str(image_path))
+    state = services.workflow.invoke(state, thread_id=image_thread_id(str(image_path)))
+
+    write_generation(image_path, state)
+
+    return state
+
+
+async def arun_single(image_path: Path, seed: Optional[Dict[str, Any]] = None) -> GraphState:
+    """
+    With a `seed` (analysis and scene plan of a near-duplicate) the
+    run starts at the Producer.
+    """
+    from graph.checkpoint import image_thread_id
 
-    if state.generation:
-        generated_bytes = state.generation
-        img_path = OUTPUT_DIR / f"{image_path.stem}_generated.png"
-        with open(img_path, "wb") as f:
-            f.write(generated_bytes)
+    state = GraphState(image_path=str(image_path))
+    if seed is not None:
+        # Seeds loaded from the duplicate index are plain JSON, planned ones models
+        state.analysis = ProductSpecs.model_validate(seed["analysis"])
+        state.scene_plan = ScenePlan.model_validate(seed["scene_plan"])
+    thread_id = await asyncio.to_thread(image_thread_id, str(image_path))
+    state = await services.workflow.ainvoke(state, thread_id=thread_id)
+
+    await asyncio.to_thread(write_generation, image_path, state)
 
     return state
 
 
-def save_result(image_path: Path, state: GraphState):
-    out_path = OUTPUT_DIR / f"{image_path.stem}_result.json"
-    payload = {
+def result_record(image_path: Path, state: GraphState, representative: Optional[str] = None) -> dict:
+    return {
         "image": str(image_path),
-        "analysis": state.analysis,
+        "analysis": state.analysis.model_dump() if state.analysis else None,
         "scene_plan": state.scene_plan.model_dump() if state.scene_plan else None,
         "generation_file": str(OUTPUT_DIR / f"{image_path.stem}_generated.png") if state.generation else None,
         "judgement": state.judgement,
-        "retries": state.retries
+        "retries": state.retries,
+        "representative": representative
     }
-    with open(out_path, "w") as f:
-        json.dump(payload, f, indent=4)
 
 
-def batch_process_folder():
-    files = [f for f in INPUT_DIR.iterdir() if f.suffix.lower() in [".png", ".jpg", ".jpeg"]]
+def served_from(image_path: Path, seed: Optional[Dict[str, Any]]) -> Optional[str]:
+    """
+    Name of the near-duplicate whose analysis and plan were reused.
+    """
+    if seed is None or Path(seed["path"]) == image_path:
+        return None
+    return Path(seed["path"]).name
+
+
+async def save_result(
+    image_path: Path,
+    state: GraphState,
+    representative: Optional[str] = None,
+    results: Optional["ResultBuffer"] = None,
+) -> int:
+    """
+    Writes the result through the job's buffer if it has one.
+    """
+    record = result_record(image_path, state, representative)
+    if results is None:
+        return await asyncio.to_thread(services.results.add, record)
+    return await results.add(record)
+
+
+async def find_duplicate(image_path: Path, version: str) -> Tuple[int, Optional[Dict[str, Any]]]:
+    from imaging.phash import perceptual_hash_file
+
+    phash = await services.image_pool.arun(perceptual_hash_file, str(image_path))
+    return phash, await asyncio.to_thread(services.duplicates.match, phash, version)
+
+
+async def prewarm_analyses(files: List[Path]):
+    """
+    Analyses `files` with a few multi-image calls, so the per-image
+    graph runs start from cached ProductSpecs. On failure every image
+    is simply analysed on its own by its graph run.
+    """
     if not files:
-        raise HTTPException(status_code=400, detail="No valid images in INPUT_DIR.")
+        return
+    try:
+        await services.analyst.aanalyse_many([str(f) for f in files])
+    except Exception:
+        logger.warning("Batch analysis of %d images failed; analysing them one by one", len(files), exc_info=True)
 
-    results = []
 
-    for img in files:
-        try:
-            state = run_single(img)
-            save_result(img, state)
-            results.append({"file": img.name, "status": "processed"})
-        except Exception as e:
-            results.append({"file": img.name, "error": str(e)})
+async def plan_group(group: "DuplicateGroup", version: str) -> Dict[str, Any]:
+    """
+    Analysis and scene plan shared by every member of `group`.
+    """
+    if group.seed is not None:
+        return group.seed
+
+    state = await services.workflow.aplan(GraphState(image_path=group.representative))
+    await asyncio.to_thread(
+        services.duplicates.remember, group.representative, group.phash, version, state.analysis, state.scene_plan
+    )
+    return {"path": group.representative, "analysis": state.analysis, "scene_plan": state.scene_plan}
+
+
+async def plan_duplicates(files: List[Path]) -> Dict[str, Dict[str, Any]]:
+    """
+    Groups the near-duplicates among `files` and plans every group once.
+    Returns the seed for each file whose group could be planned.
+    """
+    from imaging.phash import perceptual_hash_file
+
+    version = pipeline_version()
+    # Decoding every image is the expensive part; spread it over the pool
+    hashes = await asyncio.gather(*(services.image_pool.arun(perceptual_hash_file, str(f)) for f in files))
+    groups = await asyncio.to_thread(services.duplicates.group, files, version, list(hashes))
+
+    # Only representatives without a stored result get analysed at all
+    await prewarm_analyses([Path(g.representative) for g in groups if g.seed is None])
+
+    async def plan(group: "DuplicateGroup") -> Dict[str, Any]:
+        return await plan_group(group, version)
+
+    seeds = await services.executor.map(plan, groups)
+    planned = {}
+    for group, seed in zip(groups, seeds):
+        if isinstance(seed, Exception):
+            # Its members fall back to running the whole graph
+            logger.warning("Planning %s failed: %s", group.representative, seed)
+            continue
+        for member in group.members:
+            planned[member] = seed
+    return planned
+
+
+async def prepare_job(job_id: str, files: List[Path]) -> Dict[str, Any]:
+    """
+    Runs once per job, before any of its images is processed. The
+    returned dict is handed to process_job_item with each image.
+
+    Grouping here, rather than per image, is what lets near-duplicates
+    of the same job share one Analyst and Director run: concurrent
+    workers would otherwise all look each other up before any of them
+    had stored a result.
+    """
+    from batch.results import ResultBuffer
+
+    if config.DEDUPE_ENABLED:
+        seeds = await plan_duplicates(files)
+    else:
+        await prewarm_analyses(files)
+        seeds = {}
+    return {"results": ResultBuffer(services.results), "seeds": seeds}
+
+
+async def process_job_item(image_path: Path, job: Optional[Dict[str, Any]] = None) -> dict:
+    # Files from incremental folder runs stay in place; uploads are consumed
+    tracked = await asyncio.to_thread(services.manifest.is_tracked, str(image_path))
+    try:
+        # Planned with its near-duplicates when the job was prepared
+        seed = job["seeds"].get(str(image_path)) if job else None
+        lookup = config.DEDUPE_ENABLED and seed is None
+        if lookup:
+            # Near-duplicates of earlier images reuse their analysis and plan
+            version = pipeline_version()
+            phash, seed = await find_duplicate(image_path, version)
+        state = await arun_single(image_path, seed)
+        if lookup and seed is None:
+            await asyncio.to_thread(
+                services.duplicates.remember, str(image_path), phash, version, state.analysis, state.scene_plan
+            )
+        representative = served_from(image_path, seed)
+        result_id = await save_result(image_path, state, representative, job["results"] if job else None)
+    except Exception:
+        if tracked:
+            await asyncio.to_thread(services.manifest.finish, str(image_path), None, True)
+        raise
+    finally:
+        if not tracked:
+            image_path.unlink(missing_ok=True)
+
+    if tracked:
+        await asyncio.to_thread(services.manifest.finish, str(image_path), f"results/{result_id}")
+
+    return {
+        "result_id": result_id,
+        "judgement": state.judgement,
+        "retries": state.retries,
+        "representative": representative
+    }
+
+
+services.job_processor = process_job_item
+services.job_preparer = prepare_job
+
 
-    clear_directory(INPUT_DIR)
-    return results
+def pipeline_version() -> str:
+    """
+    Changes whenever a model or an agent prompt changes, so incremental
+    runs reprocess files produced by an older pipeline.
+    """
+    parts = [
+        config.ANALYST_MODEL, config.ART_DIRECTOR_MODEL, config.JUDGE_MODEL, config.PRODUCER_MODEL,
+        str(config.MIN_ACCEPTED_SCORE),
+    ] + [
+        agent.system_prompt
+        for agent in (services.analyst, services.director, services.producer, services.judge)
+    ]
+    return hashlib.sha256("\x00".join(parts).encode()).hexdigest()[:12]
 
 
-@router.post("/process/upload-batch")
+def list_input_images() -> List[Path]:
+    return sorted(f for f in INPUT_DIR.iterdir() if f.suffix.lower() in [".png", ".jpg", ".jpeg"])
+
+
+async def enqueue_files(files: List[Path]) -> str:
+    """
+    Queues files that are not already part of an unfinished job.
+    A retried request gets the id of the job already holding its files.
+    """
+    fresh = []
+    existing = None
+    # Identical uploads in one request are stored under one path; two
+    # items for it would share a checkpoint thread and delete each other's input
+    for f in dict.fromkeys(files):
+        active = await asyncio.to_thread(services.jobs.active_job_for, str(f))
+        if active is None:
+            fresh.append(str(f))
+        else:
+            existing = existing or active
+
+    if not fresh:
+        return existing
+
+    job_id = await asyncio.to_thread(services.jobs.enqueue, fresh)
+    services.job_workers.notify()
+    return job_id
+
+
+@router.post("/process/upload-batch", status_code=202)
 async def upload_and_process_batch(files: List[UploadFile] = File(...)):
+    saved = []
+    rejected = []
     for file in files:
-        save_path = INPUT_DIR / file.filename
-        with open(save_path, "wb") as f:
-            f.write(await file.read())
+        try:
+            saved.append(await stream_upload(file, INPUT_DIR))
+        except ImageUploadError as e:
+            rejected.append({"file": file.filename, "error": str(e)})
+        finally:
+            await file.close()
+
+    if not saved:
+        raise HTTPException(status_code=400, detail={"message": "No valid images uploaded.", "rejected": rejected})
+
+    job_id = await enqueue_files(saved)
+    return {
+        "job_id": job_id,
+        "input_count": len(files),
+        "rejected": rejected,
+        "output_dir": str(OUTPUT_DIR)
+    }
+
+
+@router.post("/process/folder", status_code=202)
+async def process_existing_folder(incremental: bool = False):
+    files = list_input_images()
+    if not files:
+        raise HTTPException(status_code=400, detail="No valid images in INPUT_DIR.")
+
+    if not incremental:
+        job_id = await enqueue_files(files)
+        return {
+            "job_id": job_id,
+            "input_count": len(files),
+            "output_dir": str(OUTPUT_DIR)
+        }
 
-    results = batch_process_folder()
+    changed, skipped = await asyncio.to_thread(services.manifest.changed_files, files, pipeline_version())
+    job_id = await enqueue_files(changed) if changed else None
     return {
+        "job_id": job_id,
         "input_count": len(files),
-        "output_dir": str(OUTPUT_DIR),
-        "results": results
+        "queued": len(changed),
+        "skipped": skipped,
+        "output_dir": str(OUTPUT_DIR)
     }
 
 
-@router.post("/process/folder")
-async def process_existing_folder():
-    results = batch_process_folder()
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = await asyncio.to_thread(services.jobs.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job.")
+    return job
+
+
+@router.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    if not await asyncio.to_thread(services.jobs.cancel, job_id):
+        raise HTTPException(status_code=404, detail="Unknown job.")
+    services.progress.publish(job_id, "cancelled")
+    return await asyncio.to_thread(services.jobs.get, job_id)
+
+
+_JOB_DONE = ("completed", "cancelled")
+
+
+async def job_events(job_id: str) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Yields a snapshot of the job, then its live progress events, and
+    finally the finished job once no image is pending or running.
+    """
+    # Subscribe before the snapshot so nothing falls between the two
+    async with services.progress.subscribe(job_id) as events:
+        job = await asyncio.to_thread(services.jobs.get, job_id)
+        yield {"event": "snapshot", **job}
+
+        while job["status"] not in _JOB_DONE:
+            try:
+                event = await asyncio.wait_for(events.get(), config.PROGRESS_HEARTBEAT)
+            except asyncio.TimeoutError:
+                yield {"event": "heartbeat", "job_id": job_id}
+            else:
+                yield event
+                if event["event"] not in ("item_finished", "cancelled"):
+                    continue
+            # Only finished images change the job status; the heartbeat
+            # re-check also covers events a lagging client lost
+            job = await asyncio.to_thread(services.jobs.get, job_id)
+
+        yield {"event": "job_finished", **job}
+
+
+def sse_message(event: Dict[str, Any]) -> str:
+    if event["event"] == "heartbeat":
+        return ": heartbeat\n\n"
+    return f"event: {event['event']}\ndata: {json.dumps(event, default=str)}\n\n"
+
+
+@router.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str):
+    if await asyncio.to_thread(services.jobs.get, job_id) is None:
+        raise HTTPException(status_code=404, detail="Unknown job.")
+
+    async def body():
+        async for event in job_events(job_id):
+            yield sse_message(event)
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        # Proxies must not buffer the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.websocket("/jobs/{job_id}/ws")
+async def job_events_socket(websocket: WebSocket, job_id: str):
+    await websocket.accept()
+    if await asyncio.to_thread(services.jobs.get, job_id) is None:
+        await websocket.close(code=4404, reason="Unknown job.")
+        return
+
+    try:
+        async for event in job_events(job_id):
+            await websocket.send_text(json.dumps(event, default=str))
+    except WebSocketDisconnect:
+        return
+    await websocket.close()
+
+
+@router.get("/results")
+async def query_results(
+    min_score: Optional[float] = None,
+    score_below: Optional[float] = None,
+    min_retries: Optional[int] = None,
+    max_retries: Optional[int] = None,
+    sku: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    cursor: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=500),
+):
+    return await asyncio.to_thread(
+        services.results.query,
+        min_score=min_score,
+        score_below=score_below,
+        min_retries=min_retries,
+        max_retries=max_retries,
+        sku=sku,
+        since=since.timestamp() if since else None,
+        until=until.timestamp() if until else None,
+        cursor=cursor,
+        limit=limit,
+    )
+
+
+@router.get("/cache/stats")
+def cache_stats():
+    from imaging.preprocess import get_shared_preprocessor
+
+    # Agents that were never built have no cache to report
+    analyst = services.built("analyst")
+    director = services.built("director")
+    producer = services.built("producer")
+    preprocessor = get_shared_preprocessor()
     return {
-        "output_dir": str(OUTPUT_DIR),
-        "results": results
+        "analyst": analyst.cache.stats() if analyst and analyst.cache else None,
+        "director": director.cache.stats() if director and director.cache else None,
+        "base_scenes": producer.scene_cache.stats() if producer and producer.scene_cache else None,
+        "vision_preprocess": preprocessor.stats() if preprocessor else None
     }
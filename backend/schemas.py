@@ -1,4 +1,4 @@
-from typing import Any, Dict, Optional, List
+from typing import Any, Dict, Optional, List, Union
 from pydantic import BaseModel
 
 
@@ -28,10 +28,54 @@ class ScenePlan(BaseModel):
     inpaint_coordinates: List[Any]
 
 
+class ImageInstruction(BaseModel):
+    """
+    Producer's runnable image generation request for a ScenePlan.
+    """
+    prompt: str
+    negative_prompt: str
+    width: int
+    height: int
+    infer: bool = True
+
+
+class ImageResult(BaseModel):
+    image_base64: str
+    metadata: Dict[str, Any] = {}
+
+
+class JudgeEvaluation(BaseModel):
+    score: float
+    is_approved: bool
+    issues: List[str] = []
+    recommendations: List[str] = []
+
+
+class ImageRef(BaseModel):
+    """
+    Pointer to an image in the BlobStore; the bytes stay on disk.
+    """
+    sha256: str
+    path: str
+    size: int
+    mime_type: str = "image/png"
+
+    @property
+    def generated_image_path(self) -> str:
+        return self.path
+
+
 class GraphState(BaseModel):
-    product: ProductSpecs
-    analysis: Optional[Dict[str, Any]] = None
+    # Product photo the run starts from; also the cut-out that is composited
+    image_path: str
+    analysis: Optional[ProductSpecs] = None
     scene_plan: Optional[ScenePlan] = None
-    generation: Optional[Dict[str, Any]] = None
+    generation: Optional[Union[ImageRef, Dict[str, Any]]] = None
+    candidates: Optional[List[Any]] = None
+    # Base scene of the current generation, kept for composite-only retries
+    base_scene: Optional[ImageRef] = None
+    candidate_scenes: Optional[List[Any]] = None
     judgement: Optional[Dict[str, Any]] = None
     retries: int = 0
+    # Stage the next Producer run redoes: "scene" or "composite"
+    retry_stage: Optional[str] = None
@@ -0,0 +1,168 @@
+import threading
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from config import get_config
+
+config = get_config()
+
+
+class Services:
+    """
+    Lazily built application singletons
+
+    Responsibilities:
+    - Builds agents, Gemini clients, stores and the compiled graph on
+      first use instead of at import, so workers boot fast and code
+      paths that never touch an agent never pay for one.
+    - Shares one instance of each per process.
+    - Lets benchmarks and tests swap an instance via `override`.
+
+    Heavy modules are imported inside the factories for the same reason.
+    """
+
+    def __init__(self):
+        # Re-entrant: the workflow factory pulls in the agents
+        self._lock = threading.RLock()
+        self._instances: Dict[str, Any] = {}
+        self.job_processor: Optional[Callable[..., Awaitable[Dict[str, Any]]]] = None
+        self.job_preparer: Optional[Callable[..., Awaitable[Any]]] = None
+
+    def _get(self, name: str, factory: Callable[[], Any]) -> Any:
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        with self._lock:
+            if name not in self._instances:
+                self._instances[name] = factory()
+            return self._instances[name]
+
+    def built(self, name: str) -> Optional[Any]:
+        """
+        Returns the instance if it was already built, without building it.
+        """
+        return self._instances.get(name)
+
+    def override(self, name: str, instance: Any):
+        with self._lock:
+            self._instances[name] = instance
+
+    @property
+    def analyst(self):
+        def build():
+            from agents.analyst import AnalystAgent
+            return AnalystAgent()
+        return self._get("analyst", build)
+
+    @property
+    def director(self):
+        def build():
+            from agents.art_director import DirectorAgent
+            return DirectorAgent()
+        return self._get("director", build)
+
+    @property
+    def producer(self):
+        def build():
+            from agents.producer import ProducerAgent
+            return ProducerAgent(pool=self.image_pool)
+        return self._get("producer", build)
+
+    @property
+    def judge(self):
+        def build():
+            from agents.judge import JudgeAgent
+            return JudgeAgent()
+        return self._get("judge", build)
+
+    @property
+    def progress(self):
+        def build():
+            from batch.events import ProgressBus
+            return ProgressBus()
+        return self._get("progress", build)
+
+    @property
+    def checkpointer(self):
+        def build():
+            from graph.checkpoint import SqliteCheckpointer
+            return SqliteCheckpointer()
+        return self._get("checkpointer", build)
+
+    @property
+    def blobs(self):
+        def build():
+            from cache.blob_store import BlobStore
+            return BlobStore()
+        return self._get("blobs", build)
+
+    @property
+    def image_pool(self):
+        def build():
+            from imaging.pool import ImagePool
+            return ImagePool()
+        return self._get("image_pool", build)
+
+    @property
+    def workflow(self):
+        def build():
+            from graph.graph_workflow import GraphWorkflow
+            return GraphWorkflow(
+                self.analyst, self.director, self.producer, self.judge,
+                checkpointer=self.checkpointer,
+                blobs=self.blobs,
+                progress=self.progress,
+                pool=self.image_pool,
+            ).build()
+        return self._get("workflow", build)
+
+    @property
+    def executor(self):
+        def build():
+            from batch.executor import BatchExecutor
+            return BatchExecutor()
+        return self._get("executor", build)
+
+    @property
+    def jobs(self):
+        def build():
+            from batch.jobs import JobQueue
+            from metrics import QUEUE_DEPTH
+            queue = JobQueue()
+            QUEUE_DEPTH.collect = queue.pending_count
+            return queue
+        return self._get("jobs", build)
+
+    @property
+    def job_workers(self):
+        def build():
+            from batch.jobs import JobWorkers
+            if self.job_processor is None:
+                raise RuntimeError("Services: job_processor must be set before the workers are built.")
+            return JobWorkers(
+                self.jobs, self.job_processor, progress=self.progress, preparer=self.job_preparer
+            )
+        return self._get("job_workers", build)
+
+    @property
+    def manifest(self):
+        def build():
+            from batch.manifest import FolderManifest
+            return FolderManifest()
+        return self._get("manifest", build)
+
+    @property
+    def duplicates(self):
+        def build():
+            from batch.duplicates import DuplicateIndex
+            return DuplicateIndex()
+        return self._get("duplicates", build)
+
+    @property
+    def results(self):
+        def build():
+            from batch.results import ResultStore
+            return ResultStore()
+        return self._get("results", build)
+
+
+services = Services()
@@ -1,12 +1,85 @@
-import pytest
+from unittest.mock import MagicMock
 
 from agents.analyst import AnalystAgent
+from cache.disk_cache import DiskCache
 from schemas import ProductSpecs
 
+SPECS_JSON = (
+    '{"metal_type": "gold", '
+    '"main_stone": {"cut": "oval", "color": "D", "clarity": "VS1"}, '
+    '"setting_style": "prong", "unique_imperfections": "none"}'
+)
 
-@pytest.mark.parametrize("image_path", ["tests/test_image.png"])
-def test_analyst_returns_product_specs(image_path):
-    analyst = AnalystAgent()
-    result = analyst.analyse(image_path)
+
+def test_analyst_returns_product_specs(tmp_path):
+    image_path = tmp_path / "ring.png"
+    image_path.write_bytes(b"PNG_BYTES")
+
+    analyst = AnalystAgent(cache=DiskCache(str(tmp_path / "cache")))
+    analyst.model = MagicMock()
+    analyst.model.invoke_with_image.return_value = SPECS_JSON
+
+    result = analyst.analyse(str(image_path))
 
     assert isinstance(result, ProductSpecs)
+
+
+def test_analyst_serves_repeat_images_from_cache(tmp_path):
+    image_path = tmp_path / "ring.png"
+    image_path.write_bytes(b"PNG_BYTES")
+
+    analyst = AnalystAgent(cache=DiskCache(str(tmp_path / "cache")))
+    analyst.model = MagicMock()
+    analyst.model.invoke_with_image.return_value = (
+        '{"metal_type": "gold", '
+        '"main_stone": {"cut": "oval", "color": "D", "clarity": "VS1"}, '
+        '"setting_style": "prong", "unique_imperfections": "none"}'
+    )
+
+    first = analyst.analyse(str(image_path))
+    second = analyst.analyse(str(image_path))
+
+    assert first == second
+    analyst.model.invoke_with_image.assert_called_once()
+    assert analyst.cache.stats()["hits"] == 1
+
+
+def test_analyse_many_batches_and_falls_back(tmp_path):
+    paths = []
+    for i in range(3):
+        path = tmp_path / f"ring_{i}.png"
+        path.write_bytes(f"PNG_{i}".encode())
+        paths.append(str(path))
+
+    analyst = AnalystAgent(cache=DiskCache(str(tmp_path / "cache")), batch_size=3)
+    analyst.model = MagicMock()
+    # Second entry is invalid and must be re-analysed on its own
+    analyst.model.invoke_with_images.return_value = f'[{SPECS_JSON}, {{"metal_type": 1}}, {SPECS_JSON}]'
+    analyst.model.invoke_with_image.return_value = SPECS_JSON
+
+    results = analyst.analyse_many(paths)
+
+    assert len(results) == 3
+    assert all(isinstance(r, ProductSpecs) for r in results)
+    analyst.model.invoke_with_images.assert_called_once()
+    assert analyst.model.invoke_with_image.call_count == 1
+
+
+def test_failed_batch_is_logged_with_image_paths(tmp_path, caplog):
+    paths = []
+    for i in range(2):
+        path = tmp_path / f"ring_{i}.png"
+        path.write_bytes(f"PNG_{i}".encode())
+        paths.append(str(path))
+
+    analyst = AnalystAgent(cache=DiskCache(str(tmp_path / "cache")), batch_size=2)
+    analyst.model = MagicMock()
+    analyst.model.invoke_with_images.side_effect = RuntimeError("quota")
+    analyst.model.invoke_with_image.return_value = SPECS_JSON
+
+    with caplog.at_level("WARNING", logger="agents.analyst"):
+        results = analyst.analyse_many(paths)
+
+    assert all(isinstance(r, ProductSpecs) for r in results)
+    assert paths[0] in caplog.text and paths[1] in caplog.text
+    assert "quota" in caplog.text
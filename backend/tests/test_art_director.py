@@ -1,8 +1,9 @@
 import pytest
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 
 from agents.art_director import DirectorAgent
-from schemas import ProductSpecs, ScenePlan
+from cache.memory_cache import TTLCache
+from schemas import MainStone, ProductSpecs, ScenePlan
 
 
 @pytest.fixture
@@ -12,7 +13,12 @@ def director():
 
 @pytest.fixture
 def product_specs():
-    return ProductSpecs(image_path="tests/test_image.png")
+    return ProductSpecs(
+        metal_type="18k yellow gold",
+        main_stone=MainStone(cut="oval", color="D", clarity="VS1"),
+        setting_style="prong",
+        unique_imperfections="none"
+    )
 
 
 @pytest.fixture
@@ -35,7 +41,7 @@ def fake_scene_json():
 
 def test_director_creates_scene(director, product_specs, fake_scene_json):
     with patch.object(
-        director.model, "invoke_text",
+        director.model, "invoke",
         return_value=fake_scene_json
     ):
         scene = director.create_scene(product_specs)
@@ -45,3 +51,51 @@ def test_director_creates_scene(director, product_specs, fake_scene_json):
     assert scene.lighting_map.source_direction
     assert isinstance(scene.inpaint_coordinates, list)
     assert len(scene.inpaint_coordinates) == 4
+
+
+@pytest.fixture
+def specs():
+    return ProductSpecs(
+        metal_type="platinum",
+        main_stone=MainStone(cut="round", color="E", clarity="VVS2"),
+        setting_style="halo",
+        unique_imperfections="none"
+    )
+
+
+def test_director_memoizes_identical_specs(specs, fake_scene_json):
+    director = DirectorAgent(cache=TTLCache(ttl=60))
+    director.model = MagicMock()
+    director.model.invoke.return_value = fake_scene_json
+
+    first = director.create_scene(specs)
+    second = director.create_scene(specs.model_copy())
+
+    assert first == second
+    director.model.invoke.assert_called_once()
+
+
+def test_director_cache_can_be_bypassed(specs, fake_scene_json):
+    director = DirectorAgent(variants=0)
+    director.model = MagicMock()
+    director.model.invoke.return_value = fake_scene_json
+
+    director.create_scene(specs)
+    director.create_scene(specs)
+
+    assert director.cache is None
+    assert director.model.invoke.call_count == 2
+
+
+def test_director_corrects_scene_from_feedback(fake_scene_json):
+    director = DirectorAgent(variants=0)
+    director.model = MagicMock()
+    director.model.invoke.return_value = fake_scene_json
+    rejected = ScenePlan.model_validate_json(fake_scene_json)
+
+    corrected = director.correct_scene(rejected, "Ring is floating above the surface")
+
+    assert isinstance(corrected, ScenePlan)
+    prompt = director.model.invoke.call_args.args[0]
+    assert "Ring is floating above the surface" in prompt
+    assert rejected.prompt in prompt
@@ -0,0 +1,137 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from batch.executor import BatchExecutor
+from batch.limits import AgentLimits
+
+
+def test_executor_keeps_input_order():
+    executor = BatchExecutor(max_in_flight=4)
+
+    def job(i):
+        # Later items finish first
+        time.sleep(0.01 * (5 - i))
+        return i * 10
+
+    results = asyncio.run(executor.map(job, range(5)))
+    executor.shutdown()
+
+    assert results == [0, 10, 20, 30, 40]
+
+
+def test_executor_isolates_failures():
+    executor = BatchExecutor(max_in_flight=2)
+
+    def job(i):
+        if i == 1:
+            raise RuntimeError("boom")
+        return i
+
+    results = asyncio.run(executor.map(job, [0, 1, 2]))
+    executor.shutdown()
+
+    assert results[0] == 0
+    assert isinstance(results[1], RuntimeError)
+    assert results[2] == 2
+
+
+def test_executor_bounds_in_flight_jobs():
+    executor = BatchExecutor(max_in_flight=3)
+    lock = threading.Lock()
+    active = {"now": 0, "peak": 0}
+
+    def job(_):
+        with lock:
+            active["now"] += 1
+            active["peak"] = max(active["peak"], active["now"])
+        time.sleep(0.02)
+        with lock:
+            active["now"] -= 1
+
+    asyncio.run(executor.map(job, range(12)))
+    executor.shutdown()
+
+    assert active["peak"] == 3
+
+
+def test_agent_limits_rejects_invalid_limit():
+    with pytest.raises(ValueError):
+        AgentLimits({"analyst": 0})
+
+
+def test_agent_limits_ignores_unknown_agent():
+    limits = AgentLimits({"analyst": 1})
+
+    with limits.hold("unknown"):
+        pass
+
+
+def test_executor_awaits_coroutine_jobs():
+    executor = BatchExecutor(max_in_flight=2)
+
+    async def job(i):
+        await asyncio.sleep(0.01 * (3 - i))
+        return i
+
+    results = asyncio.run(executor.map(job, range(3)))
+
+    assert results == [0, 1, 2]
+
+
+def test_agent_limits_bounds_async_holders():
+    limits = AgentLimits({"judge": 2})
+    active = {"now": 0, "peak": 0}
+
+    async def job():
+        async with limits.ahold("judge"):
+            active["now"] += 1
+            active["peak"] = max(active["peak"], active["now"])
+            await asyncio.sleep(0.01)
+            active["now"] -= 1
+
+    async def main():
+        await asyncio.gather(*(job() for _ in range(6)))
+
+    asyncio.run(main())
+
+    assert active["peak"] == 2
+
+
+def test_agent_limits_share_slots_between_threads_and_tasks():
+    limits = AgentLimits({"judge": 2})
+    active = {"now": 0, "peak": 0}
+    lock = threading.Lock()
+
+    def enter():
+        with lock:
+            active["now"] += 1
+            active["peak"] = max(active["peak"], active["now"])
+
+    def leave():
+        with lock:
+            active["now"] -= 1
+
+    def sync_job():
+        with limits.hold("judge"):
+            enter()
+            time.sleep(0.02)
+            leave()
+
+    async def async_job():
+        async with limits.ahold("judge"):
+            enter()
+            await asyncio.sleep(0.02)
+            leave()
+
+    async def main():
+        await asyncio.gather(
+            *(asyncio.to_thread(sync_job) for _ in range(4)),
+            *(async_job() for _ in range(4)),
+        )
+
+    asyncio.run(main())
+
+    assert active["peak"] == 2
@@ -0,0 +1,45 @@
+import os
+import time
+
+from cache.blob_store import BlobStore
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"pixels" * 100
+
+
+def test_put_is_content_addressed(tmp_path):
+    store = BlobStore(str(tmp_path))
+
+    first = store.put(PNG)
+    second = store.put(PNG)
+
+    assert first == second
+    assert first.mime_type == "image/png"
+    assert first.path.endswith(".png")
+    assert store.read(first) == PNG
+    assert len(list(tmp_path.rglob("*.png"))) == 1
+
+
+def test_put_file_streams_existing_file(tmp_path):
+    source = tmp_path / "candidate.png"
+    source.write_bytes(PNG)
+    store = BlobStore(str(tmp_path / "blobs"))
+
+    ref = store.put_file(str(source))
+
+    assert ref == store.put(PNG)
+    assert source.exists()
+
+
+def test_export_and_prune(tmp_path):
+    store = BlobStore(str(tmp_path / "blobs"))
+    ref = store.put(PNG)
+    out = tmp_path / "ring_generated.png"
+
+    store.export(ref, out)
+    old = time.time() - 3600
+    os.utime(ref.path, (old, old))
+
+    assert store.prune(older_than=60) == 1
+    assert not os.path.exists(ref.path)
+    # The published copy survives
+    assert out.read_bytes() == PNG
@@ -0,0 +1,89 @@
+import time
+
+import pytest
+from langgraph.graph import StateGraph, END
+from pydantic import BaseModel
+
+from graph.checkpoint import SqliteCheckpointer, image_thread_id
+
+
+class Counter(BaseModel):
+    value: int = 0
+
+
+def build_graph(checkpointer, calls, fail_second=False):
+    def first(state: Counter) -> Counter:
+        calls.append("first")
+        state.value += 1
+        return state
+
+    def second(state: Counter) -> Counter:
+        calls.append("second")
+        if fail_second:
+            raise RuntimeError("worker crashed")
+        state.value += 10
+        return state
+
+    graph = StateGraph(Counter)
+    graph.add_node("first", first)
+    graph.add_node("second", second)
+    graph.set_entry_point("first")
+    graph.add_edge("first", "second")
+    graph.add_edge("second", END)
+    return graph.compile(checkpointer=checkpointer)
+
+
+def test_run_resumes_after_last_completed_node(tmp_path):
+    path = str(tmp_path / "checkpoints.sqlite3")
+    run_config = {"configurable": {"thread_id": "image-1"}}
+    calls = []
+
+    with pytest.raises(RuntimeError):
+        build_graph(SqliteCheckpointer(path), calls, fail_second=True).invoke(Counter(), run_config)
+
+    # A fresh process sees the completed first node on disk
+    resumed = build_graph(SqliteCheckpointer(path), calls)
+    assert resumed.get_state(run_config).next == ("second",)
+
+    result = resumed.invoke(None, run_config)
+
+    assert result["value"] == 11
+    assert calls == ["first", "second", "second"]
+
+
+def test_delete_threads_removes_checkpoints_in_bulk():
+    checkpointer = SqliteCheckpointer(":memory:")
+    graph = build_graph(checkpointer, [])
+    for thread_id in ("a", "b", "c"):
+        graph.invoke(Counter(), {"configurable": {"thread_id": thread_id}})
+
+    assert checkpointer.delete_threads(["a", "b"]) > 0
+
+    threads = {t.config["configurable"]["thread_id"] for t in checkpointer.list(None)}
+    assert threads == {"c"}
+
+
+def test_prune_drops_only_stale_threads():
+    checkpointer = SqliteCheckpointer(":memory:")
+    graph = build_graph(checkpointer, [])
+    graph.invoke(Counter(), {"configurable": {"thread_id": "old"}})
+    time.sleep(0.05)
+    graph.invoke(Counter(), {"configurable": {"thread_id": "new"}})
+
+    assert checkpointer.prune(older_than=0.025) == 1
+    assert checkpointer.get_tuple({"configurable": {"thread_id": "old"}}) is None
+    assert checkpointer.get_tuple({"configurable": {"thread_id": "new"}}) is not None
+
+
+def test_image_thread_id_depends_on_path_and_content(tmp_path):
+    a = tmp_path / "ring.png"
+    b = tmp_path / "ring-copy.png"
+    a.write_bytes(b"same")
+    b.write_bytes(b"same")
+    first = image_thread_id(str(a))
+
+    # Identical photos in one job get their own threads
+    assert image_thread_id(str(b)) != first
+    assert image_thread_id(str(a)) == first
+    a.write_bytes(b"different")
+    assert image_thread_id(str(a)) != first
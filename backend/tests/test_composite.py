@@ -0,0 +1,112 @@
+import io
+import time
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from imaging.composite import Compositor, light_direction, parse_kelvin
+from schemas import LightingMap
+
+
+def png(image: Image.Image) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def product_path(tmp_path):
+    # Opaque grey square in a transparent border
+    product = Image.new("RGBA", (100, 100), (0, 0, 0, 0))
+    product.paste((128, 128, 128, 255), (20, 20, 80, 80))
+    path = tmp_path / "product.png"
+    product.save(path)
+    return str(path)
+
+
+def scene(size=(400, 300), color=(200, 200, 200)) -> bytes:
+    return png(Image.new("RGB", size, color))
+
+
+def decode(data: bytes) -> np.ndarray:
+    return np.asarray(Image.open(io.BytesIO(data)).convert("RGB")).astype(int)
+
+
+def test_parses_lighting_map():
+    assert parse_kelvin("5600K") == 5600
+    assert parse_kelvin("warm tungsten") == 3200
+    assert parse_kelvin("unknown") is None
+    assert light_direction("upper left") == pytest.approx((-0.7071, -0.7071), abs=1e-3)
+    assert light_direction("front") == (0.0, 0.0)
+
+
+def test_product_pixels_are_placed_unchanged(product_path):
+    compositor = Compositor(temperature_strength=0, shadow_opacity=0)
+    out = decode(compositor.composite(scene(), product_path, [100, 50, 300, 250]))
+
+    # 100x100 product scaled 2x into the 200x200 box
+    assert (out[100:200, 150:250] == 128).all()
+    # Transparent border and everything outside the box keep the scene
+    assert (out[55, 105] == 200).all()
+    assert (out[10, 10] == 200).all()
+
+
+def test_product_keeps_aspect_and_rests_on_box_bottom(product_path):
+    compositor = Compositor(temperature_strength=0, shadow_opacity=0)
+    out = decode(compositor.composite(scene(), product_path, [0, 0, 400, 100]))
+
+    # Fitted to 100x100, centred horizontally, bottom-aligned
+    assert (out[20:80, 170:230] == 128).all()
+    assert (out[50, 100] == 200).all()
+
+
+def test_temperature_and_shadow_follow_lighting_map(product_path):
+    compositor = Compositor(temperature_strength=1.0, shadow_opacity=0.5)
+    lighting = LightingMap(source_direction="left", temperature="3000K")
+    out = decode(compositor.composite(scene(), product_path, [100, 50, 300, 250], lighting))
+
+    # Warm light: red above blue on the neutral grey product
+    r, _, b = out[150, 200]
+    assert r > b
+    # Light from the left casts the shadow to the right of the product
+    assert out[150, 265].mean() < 195
+    assert out[150, 120].mean() == 200
+
+
+def test_leaves_scene_outside_product_and_shadow_untouched(product_path):
+    rng = np.random.default_rng(0)
+    base = Image.fromarray(rng.integers(0, 255, size=(300, 400, 3), dtype=np.uint8))
+    lighting = LightingMap(source_direction="left", temperature="3000K")
+    with Image.open(product_path) as product:
+        out = np.asarray(Compositor().composite_image(base, product, [100, 50, 300, 250], lighting)).astype(int)
+
+    before = np.asarray(base).astype(int)
+    assert (out[:, :100] == before[:, :100]).all()
+    assert (out[:40] == before[:40]).all()
+    assert (out[150, 150:250] != before[150, 150:250]).any()
+
+
+def test_refine_mask_protects_product(product_path):
+    compositor = Compositor()
+    with Image.open(product_path) as product:
+        mask = np.asarray(compositor.refine_mask((400, 300), product, [100, 50, 300, 250]))
+
+    assert mask[150, 200] == 0
+    assert mask[60, 110] == 255
+    assert mask[10, 10] == 0
+
+
+def test_rejects_box_outside_scene(product_path):
+    with pytest.raises(ValueError):
+        Compositor().composite(scene(), product_path, [500, 500, 600, 600])
+    with pytest.raises(ValueError):
+        Compositor().composite(scene(), product_path, ["left", "top"])
+
+
+def test_composites_large_scene_quickly(product_path):
+    compositor = Compositor()
+    with Image.open(product_path) as product:
+        started = time.perf_counter()
+        compositor.composite_image(Image.new("RGB", (4096, 4096)), product, [1500, 1500, 2500, 2500])
+    assert time.perf_counter() - started < 2.0
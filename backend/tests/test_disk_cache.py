@@ -0,0 +1,52 @@
+import pytest
+
+from cache.disk_cache import DiskCache
+
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    return tmp_path / "cache"
+
+
+def test_cache_roundtrip_counts_hits_and_misses(cache_dir):
+    cache = DiskCache(str(cache_dir))
+
+    assert cache.get("a") is None
+    cache.set("a", {"metal_type": "gold"})
+
+    assert cache.get("a") == {"metal_type": "gold"}
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_cache_survives_restart(cache_dir):
+    DiskCache(str(cache_dir)).set("a", [1, 2, 3])
+
+    reopened = DiskCache(str(cache_dir))
+
+    assert reopened.get("a") == [1, 2, 3]
+    assert reopened.stats()["entries"] == 1
+
+
+def test_cache_evicts_least_recently_used(cache_dir):
+    cache = DiskCache(str(cache_dir), max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+
+    # Touch "a" so "b" becomes the eviction candidate
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert not (cache_dir / "b.json").exists()
+
+
+def test_cache_respects_byte_budget(cache_dir):
+    cache = DiskCache(str(cache_dir), max_bytes=40)
+    cache.set("a", "x" * 20)
+    cache.set("b", "y" * 20)
+
+    assert cache.stats()["bytes"] <= 40
+    assert cache.get("a") is None
@@ -0,0 +1,131 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image, ImageEnhance
+
+from batch.duplicates import DuplicateIndex
+from imaging.phash import perceptual_hash
+
+VERSION = "v1"
+
+
+def piece(seed: int) -> Image.Image:
+    # Smooth random blobs: structured like a product photo, unlike noise
+    rng = np.random.default_rng(seed)
+    small = rng.integers(0, 256, (8, 8, 3), dtype=np.uint8)
+    return Image.fromarray(small).resize((256, 256), Image.Resampling.BICUBIC)
+
+
+def save(image: Image.Image, path, fmt="PNG"):
+    image.save(path, format=fmt)
+    return path
+
+
+def distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def encode(image: Image.Image, fmt="PNG", **options) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format=fmt, **options)
+    return buffer.getvalue()
+
+
+def test_phash_tolerates_small_edits_but_separates_pieces():
+    original = piece(1)
+    base = perceptual_hash(encode(original))
+
+    cropped = original.crop((4, 4, 252, 252))
+    brighter = ImageEnhance.Brightness(original).enhance(1.15)
+    assert distance(base, perceptual_hash(encode(cropped))) <= 6
+    assert distance(base, perceptual_hash(encode(brighter, "JPEG", quality=80))) <= 6
+    assert distance(base, perceptual_hash(encode(piece(2)))) > 6
+
+
+def test_group_batches_near_duplicates(tmp_path):
+    index = DuplicateIndex(":memory:", min_similarity=0.9)
+    files = [
+        save(piece(1), tmp_path / "a.png"),
+        save(piece(2), tmp_path / "b.png"),
+        save(ImageEnhance.Brightness(piece(1)).enhance(1.1), tmp_path / "a-retake.jpg", "JPEG"),
+    ]
+
+    groups = index.group(files, VERSION)
+
+    assert [(g.representative, g.members) for g in groups] == [
+        (str(files[0]), [str(files[0]), str(files[2])]),
+        (str(files[1]), [str(files[1])]),
+    ]
+    assert all(g.seed is None for g in groups)
+
+
+def test_results_are_reused_across_batches_of_the_same_version(tmp_path):
+    db = str(tmp_path / "duplicates.sqlite3")
+    first = save(piece(1), tmp_path / "a.png")
+    index = DuplicateIndex(db)
+    phash = index.hash_file(str(first))
+    index.remember(str(first), phash, VERSION, {"metal_type": "gold"}, {"prompt": "marble"})
+    index.close()
+
+    # A later batch, after a restart
+    retake = save(piece(1).crop((2, 2, 254, 254)), tmp_path / "a-retake.png")
+    index = DuplicateIndex(db)
+    [group] = index.group([retake], VERSION)
+
+    assert group.seed["path"] == str(first)
+    assert group.seed["analysis"] == {"metal_type": "gold"}
+    assert group.seed["scene_plan"] == {"prompt": "marble"}
+    assert index.group([retake], "v2")[0].seed is None
+
+
+@pytest.mark.parametrize("similarity,expected", [(1.0, 2), (0.0, 1)])
+def test_threshold_is_configurable(tmp_path, similarity, expected):
+    files = [save(piece(1), tmp_path / "a.png"), save(piece(1).crop((6, 6, 250, 250)), tmp_path / "b.png")]
+    assert len(DuplicateIndex(":memory:", min_similarity=similarity).group(files, VERSION)) == expected
+
+
+def test_job_plans_each_group_once(tmp_path, monkeypatch):
+    import asyncio
+    from unittest.mock import AsyncMock, MagicMock
+
+    import routes
+    from batch.executor import BatchExecutor
+    from batch.results import ResultStore
+    from imaging.pool import ImagePool
+    from schemas import GraphState
+    from services import services
+
+    files = [
+        save(piece(1), tmp_path / "a.png"),
+        save(ImageEnhance.Brightness(piece(1)).enhance(1.1), tmp_path / "a-retake.png"),
+        save(piece(2), tmp_path / "b.png"),
+    ]
+
+    async def aplan(state: GraphState) -> GraphState:
+        return state.model_copy(update={"analysis": None, "scene_plan": None})
+
+    workflow = MagicMock()
+    workflow.aplan = AsyncMock(side_effect=aplan)
+    analyst = MagicMock()
+    analyst.aanalyse_many = AsyncMock()
+    monkeypatch.setattr(services, "_instances", {
+        "workflow": workflow,
+        "analyst": analyst,
+        "duplicates": DuplicateIndex(":memory:", min_similarity=0.9),
+        "image_pool": ImagePool(workers=0),
+        "executor": BatchExecutor(),
+        "results": ResultStore(":memory:"),
+    })
+    monkeypatch.setattr(routes, "pipeline_version", lambda: VERSION)
+    monkeypatch.setattr(routes.config, "DEDUPE_ENABLED", True)
+
+    job = asyncio.run(routes.prepare_job("job", files))
+
+    # Analyst (batched) and Director once per group, before any image runs
+    analyst.aanalyse_many.assert_awaited_once_with([str(files[0]), str(files[2])])
+    assert workflow.aplan.await_count == 2
+    seeds = job["seeds"]
+    assert seeds[str(files[0])] is seeds[str(files[1])]
+    assert seeds[str(files[1])]["path"] == str(files[0])
+    assert seeds[str(files[2])]["path"] == str(files[2])
@@ -0,0 +1,89 @@
+import asyncio
+import threading
+
+from batch.events import ProgressBus
+from batch.jobs import JobQueue, JobWorkers
+
+
+def test_publish_reaches_subscribers_of_that_job_only():
+    bus = ProgressBus()
+
+    async def main():
+        async with bus.subscribe("a") as a, bus.subscribe("b") as b:
+            bus.publish("a", "item_started", position=0)
+            event = await asyncio.wait_for(a.get(), 1)
+            assert b.empty()
+            return event
+
+    event = asyncio.run(main())
+    assert event["event"] == "item_started"
+    assert event["job_id"] == "a"
+    assert event["position"] == 0
+
+
+def test_emit_uses_tracked_item_and_works_from_threads():
+    bus = ProgressBus()
+
+    async def main():
+        async with bus.subscribe("job") as events:
+            bus.emit("node_started", node="analyst")  # not tracked: dropped
+            with bus.track("job", 3, "ring.png"):
+                # to_thread copies the context, like graph nodes do
+                await asyncio.to_thread(bus.emit, "node_started", node="judge")
+            return await asyncio.wait_for(events.get(), 1), events.empty()
+
+    event, empty = asyncio.run(main())
+    assert event["node"] == "judge"
+    assert (event["position"], event["file"]) == (3, "ring.png")
+    assert empty
+
+
+def test_slow_subscriber_loses_oldest_events():
+    bus = ProgressBus(queue_size=2)
+
+    async def main():
+        async with bus.subscribe("job") as events:
+            thread = threading.Thread(target=lambda: [bus.publish("job", "tick", n=n) for n in range(5)])
+            thread.start()
+            thread.join()
+            await asyncio.sleep(0.01)
+            return [events.get_nowait()["n"] for _ in range(events.qsize())]
+
+    assert asyncio.run(main()) == [3, 4]
+
+
+def test_workers_announce_items_and_attribute_nested_events(tmp_path):
+    bus = ProgressBus()
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"))
+    job_id = queue.enqueue(["in/a.png", "in/b.png"])
+
+    async def processor(path):
+        bus.emit("node_started", node="analyst")
+        if path.name == "b.png":
+            raise RuntimeError("boom")
+        return {"score": 95}
+
+    async def main():
+        async with bus.subscribe(job_id) as events:
+            workers = JobWorkers(queue, processor, workers=1, poll_interval=0.01, progress=bus)
+            workers.start()
+            received = []
+            while len([e for e in received if e["event"] == "item_finished"]) < 2:
+                received.append(await asyncio.wait_for(events.get(), 1))
+            await workers.stop()
+            return received
+
+    received = asyncio.run(main())
+    queue.close()
+
+    assert [(e["event"], e["file"]) for e in received] == [
+        ("item_started", "a.png"),
+        ("node_started", "a.png"),
+        ("item_finished", "a.png"),
+        ("item_started", "b.png"),
+        ("node_started", "b.png"),
+        ("item_finished", "b.png"),
+    ]
+    assert received[2]["result"] == {"score": 95}
+    assert received[5]["status"] == "failed"
+    assert received[5]["error"] == "boom"
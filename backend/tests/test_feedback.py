@@ -0,0 +1,59 @@
+from unittest.mock import MagicMock
+
+from graph.feedback import COMPOSITE, SCENE, changes_lighting, classify_feedback, keep_scene, moves_product
+from schemas import LightingMap, ScenePlan
+
+
+def plan(prompt: str, coordinates, direction: str) -> ScenePlan:
+    return ScenePlan(
+        prompt=prompt,
+        negative_prompt="extra jewellery",
+        lighting_map=LightingMap(source_direction=direction, temperature="5600K"),
+        inpaint_coordinates=coordinates,
+    )
+
+
+def test_placement_issues_are_composite_level():
+    assert classify_feedback("Ring is too small and slightly off-center") == COMPOSITE
+    assert classify_feedback({"feedback": "The ring is floating"}) == COMPOSITE
+
+
+def test_blend_issues_are_composite_level_only_with_refinement():
+    assert classify_feedback("Visible halo around the cut-out edges", refine=True) == COMPOSITE
+    assert classify_feedback({"feedback": "The shadow falls the wrong way"}, refine=True) == COMPOSITE
+    assert classify_feedback(MagicMock(issues=["product looks pasted"], recommendations=[]), refine=True) == COMPOSITE
+
+    assert classify_feedback("Visible halo around the cut-out edges") == SCENE
+    assert classify_feedback("The ring is floating; the shadow falls the wrong way") == SCENE
+
+
+def test_backdrop_mixed_and_unknown_issues_are_scene_level():
+    assert classify_feedback("Background marble is too busy") == SCENE
+    assert classify_feedback(["Shadow is too hard", "lighting feels flat"]) == SCENE
+    assert classify_feedback("The stone cut does not match the original") == SCENE
+    assert classify_feedback(None) == SCENE
+
+
+def test_keep_scene_takes_only_placement():
+    previous = plan("marble", [0, 0, 10, 10], "left")
+    corrected = plan("velvet", [5, 5, 20, 20], "right")
+
+    kept = keep_scene(previous, corrected)
+
+    assert kept.prompt == "marble"
+    assert kept.inpaint_coordinates == [5, 5, 20, 20]
+    assert kept.lighting_map.source_direction == "left"
+
+
+def test_moves_product():
+    previous = plan("marble", [0, 0, 10, 10], "left")
+
+    assert not moves_product(previous, plan("velvet", [0, 0, 10, 10], "right"))
+    assert moves_product(previous, plan("marble", [5, 5, 20, 20], "left"))
+
+
+def test_changes_lighting():
+    previous = plan("marble", [0, 0, 10, 10], "left")
+
+    assert not changes_lighting(previous, plan("velvet", [5, 5, 20, 20], "left"))
+    assert changes_lighting(previous, plan("marble", [0, 0, 10, 10], "right"))
@@ -0,0 +1,80 @@
+import asyncio
+import base64
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from llm import gemini_pipeline
+from llm.base import BaseLLMClient
+from llm.gemini_pipeline import GeminiAdapter
+
+
+@pytest.fixture
+def fake_client(monkeypatch):
+    client = MagicMock()
+    monkeypatch.setattr(gemini_pipeline, "_shared_client", None)
+    monkeypatch.setattr(gemini_pipeline.genai, "Client", MagicMock(return_value=client))
+    return client
+
+
+def test_adapters_share_one_client(fake_client):
+    analyst = GeminiAdapter(model="analyst-model")
+    judge = GeminiAdapter(model="judge-model")
+
+    assert analyst.client is judge.client is fake_client
+    gemini_pipeline.genai.Client.assert_called_once()
+
+
+def test_ainvoke_uses_async_transport(fake_client):
+    fake_client.aio.models.generate_content = AsyncMock(return_value=MagicMock(text="OK"))
+
+    adapter = GeminiAdapter(model="m")
+    result = asyncio.run(adapter.ainvoke("hello"))
+
+    assert result == "OK"
+    fake_client.aio.models.generate_content.assert_awaited_once()
+    fake_client.models.generate_content.assert_not_called()
+
+
+def test_invoke_image_returns_base64(fake_client):
+    generated = MagicMock()
+    generated.image.image_bytes = b"PNG"
+    fake_client.models.generate_images.return_value = MagicMock(generated_images=[generated])
+
+    adapter = GeminiAdapter(model="imagen")
+    result = adapter.invoke_image("scene", "noise", width=1920, height=1080)
+
+    assert base64.b64decode(result) == b"PNG"
+    config = fake_client.models.generate_images.call_args.kwargs["config"]
+    assert config.aspect_ratio == "16:9"
+
+
+def test_base_client_async_defaults_fall_back_to_sync():
+    class EchoClient(BaseLLMClient):
+        def invoke(self, prompt):
+            return prompt
+
+        def invoke_with_image(self, prompt, image_bytes):
+            return f"{prompt}:{len(image_bytes)}"
+
+        def invoke_with_images(self, prompt, images):
+            return f"{prompt}:{len(images)}"
+
+        def invoke_image(self, prompt, negative_prompt="", width=1024, height=1024):
+            return "IMG"
+
+    client = EchoClient()
+
+    assert asyncio.run(client.ainvoke("hi")) == "hi"
+    assert asyncio.run(client.ainvoke_with_image("hi", b"abc")) == "hi:3"
+    assert asyncio.run(client.ainvoke_with_images("hi", [b"a", b"b"])) == "hi:2"
+    assert asyncio.run(client.ainvoke_image("hi")) == "IMG"
+
+
+def test_image_part_uses_detected_mime_type(fake_client):
+    adapter = GeminiAdapter(model="m")
+    jpeg_bytes = b"\xff\xd8\xff\xe0" + b"0" * 16
+
+    part = adapter._image_part(jpeg_bytes)
+
+    assert part.inline_data.mime_type == "image/jpeg"
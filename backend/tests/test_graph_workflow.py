@@ -1,8 +1,32 @@
+import asyncio
+import hashlib
+
 import pytest
 from unittest.mock import MagicMock
 
+from cache.blob_store import BlobStore
+from graph.checkpoint import SqliteCheckpointer
 from graph.graph_workflow import GraphWorkflow
-from schemas import GraphState, ProductSpecs
+from schemas import GraphState, ImageRef, JudgeEvaluation, LightingMap, MainStone, ProductSpecs, ScenePlan
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 64
+SPECS = ProductSpecs(
+    metal_type="18k white gold",
+    main_stone=MainStone(cut="round", color="F", clarity="VS1"),
+    setting_style="solitaire",
+    unique_imperfections="none"
+)
+
+PLAN = ScenePlan(
+    prompt="Ring on black marble",
+    negative_prompt="extra jewellery",
+    lighting_map=LightingMap(source_direction="left", temperature="5600K"),
+    inpaint_coordinates=[10, 20, 30, 40]
+)
+
+
+def verdict(score, *issues):
+    return JudgeEvaluation(score=score, is_approved=score >= 90, issues=list(issues))
 
 
 @pytest.fixture
@@ -12,6 +36,8 @@ def mock_agents():
     producer = MagicMock()
     judge = MagicMock()
 
+    producer.generate_base_scene.return_value = PNG
+
     return {
         "analyst": analyst,
         "director": director,
@@ -21,41 +47,37 @@ def mock_agents():
 
 
 @pytest.fixture
-def workflow(mock_agents):
+def workflow(mock_agents, tmp_path):
     wf = GraphWorkflow(
         mock_agents["analyst"],
         mock_agents["director"],
         mock_agents["producer"],
-        mock_agents["judge"]
+        mock_agents["judge"],
+        checkpointer=SqliteCheckpointer(":memory:"),
+        blobs=BlobStore(str(tmp_path / "blobs"))
     ).build()
+    # Candidate paths in these tests are placeholders
+    wf.prescreen = None
     return wf
 
 
 @pytest.fixture
 def initial_state():
-    specs = ProductSpecs(image_path="tests/test_image.png")
-    return GraphState(product=specs)
+    return GraphState(image_path="tests/test_image.png")
 
 
 def test_graph_workflow_runs_once(workflow, mock_agents, initial_state):
-    # Analyst returns analysis dict
-    mock_agents["analyst"].analyse.return_value = {
-        "product_png_path": "tests/test_image.png"
-    }
+    # Analyst returns ProductSpecs
+    mock_agents["analyst"].analyse.return_value = SPECS
 
     # Director returns scene plan
-    mock_agents["director"].create_scene.return_value = {"prompt": "p"}
+    mock_agents["director"].create_scene.return_value = PLAN
 
     # Producer returns generation output
-    mock_agents["producer"].generate_final_candidate.return_value = {
-        "generated_image_path": "tests/test_candidate_image.png"
-    }
+    mock_agents["producer"].composite_candidate.return_value = PNG + b"candidate"
 
     # Judge returns good score (workflow stops immediately)
-    mock_agents["judge"].evaluate.return_value = (
-        95,
-        {"score": 95, "feedback": "looks good"}
-    )
+    mock_agents["judge"].evaluate.return_value = verdict(95)
 
     final_state = workflow.invoke(initial_state)
 
@@ -66,30 +88,53 @@ def test_graph_workflow_runs_once(workflow, mock_agents, initial_state):
 
     mock_agents["analyst"].analyse.assert_called_once()
     mock_agents["director"].create_scene.assert_called_once()
-    mock_agents["producer"].generate_final_candidate.assert_called_once()
+    mock_agents["producer"].composite_candidate.assert_called_once()
     mock_agents["judge"].evaluate.assert_called_once()
 
     assert final_state.retries == 0
 
 
+def test_graph_workflow_ainvoke_runs_once(tmp_path):
+    # Sync-only agents: the async nodes fall back to worker threads
+    analyst = MagicMock(spec=["analyse"])
+    director = MagicMock(spec=["create_scene"])
+    producer = MagicMock(spec=["generate_base_scene", "composite_candidate"])
+    judge = MagicMock(spec=["evaluate"])
+    analyst.analyse.return_value = SPECS
+    director.create_scene.return_value = PLAN
+    producer.generate_base_scene.return_value = PNG
+    producer.composite_candidate.return_value = PNG + b"candidate"
+    judge.evaluate.return_value = verdict(95)
+
+    wf = GraphWorkflow(
+        analyst, director, producer, judge,
+        checkpointer=SqliteCheckpointer(":memory:"),
+        blobs=BlobStore(str(tmp_path / "blobs"))
+    ).build()
+    wf.prescreen = None
+
+    final_state = asyncio.run(wf.ainvoke(GraphState(image_path="tests/test_image.png")))
+
+    assert isinstance(final_state.generation, ImageRef)
+    assert final_state.judgement["score"] == 95
+    assert judge.evaluate.call_args.kwargs["candidate_image_path"] == final_state.generation.path
+
+
 def test_graph_retries_until_threshold(workflow, mock_agents, initial_state):
     # Analyst always returns basic analysis
-    mock_agents["analyst"].analyse.return_value = {
-        "product_png_path": "tests/test_image.png"
-    }
+    mock_agents["analyst"].analyse.return_value = SPECS
 
     # Director always returns same scene
-    mock_agents["director"].create_scene.return_value = {"prompt": "p"}
+    mock_agents["director"].create_scene.return_value = PLAN
+    mock_agents["director"].correct_scene.return_value = PLAN
 
     # Producer returns same generated image path
-    mock_agents["producer"].generate_final_candidate.return_value = {
-        "generated_image_path": "tests/test_candidate_image.png"
-    }
+    mock_agents["producer"].composite_candidate.return_value = PNG + b"candidate"
 
     # First evaluation fails, second passes
     mock_agents["judge"].evaluate.side_effect = [
-        (20, {"score": 20, "feedback": "bad"}),
-        (91, {"score": 91, "feedback": "good"}),
+        verdict(20, "bad"),
+        verdict(91),
     ]
 
     final_state = workflow.invoke(initial_state)
@@ -99,11 +144,291 @@ def test_graph_retries_until_threshold(workflow, mock_agents, initial_state):
 
     assert mock_agents["analyst"].analyse.call_count == 1
     assert mock_agents["director"].create_scene.call_count == 1
+    mock_agents["director"].correct_scene.assert_called_once()
 
     # Producer should run twice (first try + retry)
-    assert mock_agents["producer"].generate_final_candidate.call_count == 2
+    assert mock_agents["producer"].composite_candidate.call_count == 2
 
     # Judge should also be called twice
     assert mock_agents["judge"].evaluate.call_count == 2
 
     assert final_state.judgement["score"] == 91
+
+
+def test_best_of_n_keeps_highest_scoring_candidate(mock_agents, tmp_path):
+    wf = GraphWorkflow(
+        mock_agents["analyst"],
+        mock_agents["director"],
+        mock_agents["producer"],
+        mock_agents["judge"],
+        candidates=3,
+        checkpointer=SqliteCheckpointer(":memory:"),
+        blobs=BlobStore(str(tmp_path / "blobs"))
+    )
+    wf.prescreen = None
+    state = GraphState.model_construct(
+        image_path="tests/test_image.png",
+        analysis=MagicMock(),
+        scene_plan={"prompt": "p"},
+        judgement=None,
+        candidates=None,
+        retries=0
+    )
+
+    for name in ("a", "b", "c"):
+        (tmp_path / f"{name}.png").write_bytes(name.encode())
+    mock_agents["producer"].composite_candidate.side_effect = [
+        MagicMock(generated_image_path=str(tmp_path / f"{name}.png")) for name in ("a", "b", "c")
+    ]
+    scores = {b"a": 40, b"b": 93, b"c": 70}
+
+    def evaluate(specs, plan, original_image_path, candidate_image_path):
+        with open(candidate_image_path, "rb") as f:
+            return verdict(scores[f.read()], "feedback")
+
+    mock_agents["judge"].evaluate.side_effect = evaluate
+
+    state = wf._node_producer(state)
+    assert len(state.candidates) == 3
+    assert all(isinstance(c, ImageRef) for c in state.candidates)
+
+    state = wf._node_judge(state)
+
+    with open(state.generation.generated_image_path, "rb") as f:
+        assert f.read() == b"b"
+    assert state.judgement["score"] == 93
+    assert state.candidates is None
+    assert mock_agents["judge"].evaluate.call_count == 3
+
+
+def test_prescreen_failure_skips_judge_and_director(mock_agents):
+    wf = GraphWorkflow(
+        mock_agents["analyst"],
+        mock_agents["director"],
+        mock_agents["producer"],
+        mock_agents["judge"]
+    )
+    wf.prescreen = MagicMock()
+    wf.prescreen.check.return_value = MagicMock(passed=False, feedback="candidate image is blank", plan=False)
+
+    state = GraphState.model_construct(
+        image_path="tests/test_image.png",
+        analysis=MagicMock(),
+        scene_plan=MagicMock(inpaint_coordinates=[10, 20, 30, 40]),
+        generation=MagicMock(generated_image_path="candidate.png"),
+        judgement=None,
+        candidates=None,
+        retries=0
+    )
+
+    state = wf._node_judge(state)
+
+    assert state.judgement["score"] == 0
+    assert state.judgement["prescreen"] is True
+    mock_agents["judge"].evaluate.assert_not_called()
+
+    assert wf._decision(state) == "retry"
+    state = wf._node_correct(state)
+
+    assert state.retries == 1
+    assert state.retry_stage == "scene"
+    mock_agents["director"].correct_scene.assert_not_called()
+
+
+def test_prescreen_plan_failure_asks_director_for_new_box(mock_agents):
+    wf = GraphWorkflow(
+        mock_agents["analyst"],
+        mock_agents["director"],
+        mock_agents["producer"],
+        mock_agents["judge"]
+    )
+    wf.prescreen = MagicMock()
+    wf.prescreen.check.return_value = MagicMock(
+        passed=False, feedback="inpaint coordinates [900, 900, 1100, 1100] do not fit", plan=True
+    )
+    mock_agents["director"].correct_scene.return_value = PLAN.model_copy(
+        update={"inpaint_coordinates": [400, 400, 600, 600]}
+    )
+
+    state = GraphState.model_construct(
+        image_path="tests/test_image.png",
+        analysis=SPECS,
+        scene_plan=PLAN,
+        generation=MagicMock(generated_image_path="candidate.png"),
+        judgement=None,
+        candidates=None,
+        retries=0
+    )
+    state = wf._node_correct(wf._node_judge(state))
+
+    mock_agents["director"].correct_scene.assert_called_once()
+    assert "do not fit" in mock_agents["director"].correct_scene.call_args.kwargs["feedback"]
+    # Only the box moved: the kept base scene is reused
+    assert state.retry_stage == "composite"
+    assert state.scene_plan.inpaint_coordinates == [400, 400, 600, 600]
+
+
+def test_producer_candidates_are_spilled_to_blob_store(mock_agents, tmp_path):
+    workflow = GraphWorkflow(
+        mock_agents["analyst"],
+        mock_agents["director"],
+        mock_agents["producer"],
+        mock_agents["judge"],
+        checkpointer=SqliteCheckpointer(":memory:"),
+        blobs=BlobStore(str(tmp_path / "blobs"))
+    )
+    png = PNG + b"candidate"
+    mock_agents["producer"].composite_candidate.return_value = png
+
+    state = GraphState.model_construct(
+        image_path="tests/test_image.png",
+        analysis=MagicMock(),
+        scene_plan=MagicMock(),
+        generation=None,
+        judgement=None,
+        candidates=None,
+        retries=0
+    )
+
+    state = workflow._node_producer(state)
+
+    assert isinstance(state.generation, ImageRef)
+    assert state.generation.size == len(png)
+    with open(state.generation.generated_image_path, "rb") as f:
+        assert f.read() == png
+
+
+def test_composite_feedback_keeps_base_scene(workflow, mock_agents, initial_state):
+    mock_agents["analyst"].analyse.return_value = SPECS
+    mock_agents["director"].create_scene.return_value = PLAN
+    mock_agents["director"].correct_scene.return_value = PLAN.model_copy(
+        update={"prompt": "Ring on velvet", "inpaint_coordinates": [12, 22, 32, 42]}
+    )
+    mock_agents["producer"].composite_candidate.return_value = PNG + b"candidate"
+    mock_agents["judge"].evaluate.side_effect = [
+        verdict(20, "The ring is floating and slightly off-center"),
+        verdict(91),
+    ]
+
+    final_state = workflow.invoke(initial_state)
+
+    assert final_state.retries == 1
+    assert final_state.retry_stage == "composite"
+    # One base scene, composited twice
+    mock_agents["producer"].generate_base_scene.assert_called_once()
+    assert mock_agents["producer"].composite_candidate.call_count == 2
+    base_scenes = [c.kwargs["base_scene"] for c in mock_agents["producer"].composite_candidate.call_args_list]
+    assert base_scenes == [PNG, PNG]
+    # Only the placement of the correction is applied to the kept scene
+    assert final_state.scene_plan.prompt == PLAN.prompt
+    assert final_state.scene_plan.inpaint_coordinates == [12, 22, 32, 42]
+
+
+def test_composite_feedback_without_new_placement_regenerates_base_scene(
+    workflow, mock_agents, initial_state
+):
+    mock_agents["analyst"].analyse.return_value = SPECS
+    mock_agents["director"].create_scene.return_value = PLAN
+    # Same box: re-compositing without refinement would repeat the image
+    mock_agents["director"].correct_scene.return_value = PLAN
+    mock_agents["producer"].composite_candidate.return_value = PNG + b"candidate"
+    mock_agents["judge"].evaluate.side_effect = [
+        verdict(20, "The ring is slightly off-center"),
+        verdict(91),
+    ]
+
+    final_state = workflow.invoke(initial_state)
+
+    assert final_state.retry_stage == "scene"
+    assert mock_agents["producer"].generate_base_scene.call_count == 2
+
+
+def test_blend_feedback_keeps_base_scene_when_refining(mock_agents, tmp_path, initial_state):
+    mock_agents["producer"].refine = True
+    workflow = GraphWorkflow(
+        mock_agents["analyst"],
+        mock_agents["director"],
+        mock_agents["producer"],
+        mock_agents["judge"],
+        checkpointer=SqliteCheckpointer(":memory:"),
+        blobs=BlobStore(str(tmp_path / "blobs")),
+    ).build()
+    workflow.prescreen = None
+    mock_agents["analyst"].analyse.return_value = SPECS
+    mock_agents["director"].create_scene.return_value = PLAN
+    mock_agents["director"].correct_scene.return_value = PLAN
+    mock_agents["producer"].composite_candidate.return_value = PNG + b"candidate"
+    mock_agents["judge"].evaluate.side_effect = [
+        verdict(20, "The shadow is too hard"),
+        verdict(91),
+    ]
+
+    final_state = workflow.invoke(initial_state)
+
+    assert final_state.retry_stage == "composite"
+    mock_agents["producer"].generate_base_scene.assert_called_once()
+
+
+def test_scene_feedback_regenerates_base_scene(workflow, mock_agents, initial_state):
+    mock_agents["analyst"].analyse.return_value = SPECS
+    mock_agents["director"].create_scene.return_value = PLAN
+    mock_agents["director"].correct_scene.return_value = PLAN.model_copy(update={"prompt": "Ring on linen"})
+    mock_agents["producer"].composite_candidate.return_value = PNG + b"candidate"
+    mock_agents["judge"].evaluate.side_effect = [
+        verdict(20, "Background is cluttered and the shadow is too hard"),
+        verdict(91),
+    ]
+
+    final_state = workflow.invoke(initial_state)
+
+    assert final_state.retry_stage == "scene"
+    assert mock_agents["producer"].generate_base_scene.call_count == 2
+    assert final_state.scene_plan.prompt == "Ring on linen"
+    # The rejected backdrop is evicted from the scene cache
+    mock_agents["producer"].forget_scene.assert_called_once_with(hashlib.sha256(PNG).hexdigest())
+
+
+def test_relighting_correction_regenerates_base_scene(workflow, mock_agents, initial_state):
+    mock_agents["analyst"].analyse.return_value = SPECS
+    mock_agents["director"].create_scene.return_value = PLAN
+    # Composite-level feedback, but the Director moves the light
+    mock_agents["director"].correct_scene.return_value = PLAN.model_copy(
+        update={"lighting_map": LightingMap(source_direction="right", temperature="5600K")}
+    )
+    mock_agents["producer"].composite_candidate.return_value = PNG + b"candidate"
+    mock_agents["judge"].evaluate.side_effect = [
+        verdict(20, "The shadow falls the wrong way"),
+        verdict(91),
+    ]
+
+    final_state = workflow.invoke(initial_state)
+
+    assert final_state.retry_stage == "scene"
+    assert mock_agents["producer"].generate_base_scene.call_count == 2
+    assert final_state.scene_plan.lighting_map.source_direction == "right"
+
+
+def test_progress_reports_each_judge_decision(mock_agents, tmp_path):
+    progress = MagicMock()
+    wf = GraphWorkflow(
+        mock_agents["analyst"],
+        mock_agents["director"],
+        mock_agents["producer"],
+        mock_agents["judge"],
+        checkpointer=SqliteCheckpointer(":memory:"),
+        blobs=BlobStore(str(tmp_path / "blobs")),
+        progress=progress
+    ).build()
+    wf.prescreen = None
+    wf.max_retries = 1
+    mock_agents["analyst"].analyse.return_value = SPECS
+    mock_agents["director"].create_scene.return_value = PLAN
+    mock_agents["director"].correct_scene.return_value = PLAN
+    mock_agents["producer"].composite_candidate.return_value = PNG + b"candidate"
+    mock_agents["judge"].evaluate.return_value = verdict(20, "Background is cluttered")
+
+    final_state = wf.invoke(GraphState(image_path="tests/test_image.png"))
+
+    decisions = [c.kwargs["decision"] for c in progress.emit.call_args_list if c.args[0] == "judgement"]
+    assert decisions == ["retry", "give_up"]
+    assert final_state.retries == 1
@@ -0,0 +1,70 @@
+import asyncio
+import base64
+import io
+
+import pytest
+from PIL import Image
+
+from imaging.phash import perceptual_hash, perceptual_hash_file
+from imaging.composite import Compositor
+from imaging.pool import ImagePool, run_composite, store_blob
+
+
+def png(color=(200, 30, 30), size=(64, 64)) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def _buffer_length(buffer: memoryview) -> int:
+    return len(buffer)
+
+
+@pytest.fixture(params=[0, 1], ids=["inline", "processes"])
+def pool(request):
+    pool = ImagePool(workers=request.param)
+    yield pool
+    pool.shutdown()
+
+
+def test_run_buffer_shares_data_with_worker(pool):
+    data = b"x" * 1_000_000
+    assert pool.run_buffer(_buffer_length, data) == len(data)
+    assert pool.run_buffer(_buffer_length, b"") == 0
+
+
+def test_store_blob_decodes_base64_in_worker(pool, tmp_path):
+    data = png()
+    ref = pool.run_buffer(store_blob, base64.b64encode(data), str(tmp_path), True)
+
+    assert ref.mime_type == "image/png"
+    assert open(ref.path, "rb").read() == data
+
+
+def test_async_variants(pool, tmp_path):
+    path = tmp_path / "ring.png"
+    path.write_bytes(png())
+
+    async def main():
+        ref = await pool.arun_buffer(store_blob, png(), str(tmp_path / "blobs"), False)
+        phash = await pool.arun(perceptual_hash_file, str(path))
+        return ref, phash
+
+    ref, phash = asyncio.run(main())
+    assert ref.size == len(png())
+    assert phash == perceptual_hash(png())
+
+
+def test_composite_runs_in_worker(pool, tmp_path):
+    product = tmp_path / "product.png"
+    Image.new("RGBA", (16, 16), (10, 20, 30, 255)).save(product)
+    compositor = Compositor(temperature_strength=0, shadow_opacity=0)
+
+    out = pool.run_buffer(run_composite, png(), compositor, str(product), [16, 16, 48, 48], None)
+
+    assert Image.open(io.BytesIO(out)).getpixel((32, 32)) == (10, 20, 30)
+
+
+def test_negative_worker_count_is_rejected():
+    with pytest.raises(ValueError):
+        ImagePool(workers=-1)
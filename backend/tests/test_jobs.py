@@ -0,0 +1,189 @@
+import asyncio
+
+import pytest
+
+from batch.jobs import JobQueue, JobWorkers
+
+
+@pytest.fixture
+def queue(tmp_path):
+    q = JobQueue(str(tmp_path / "jobs.sqlite3"))
+    yield q
+    q.close()
+
+
+def test_enqueue_reports_queued_job(queue):
+    job_id = queue.enqueue(["a.png", "b.png"])
+    job = queue.get(job_id)
+
+    assert job["status"] == "queued"
+    assert job["total"] == 2
+    assert job["progress"]["pending"] == 2
+    assert [r["file"] for r in job["results"]] == ["a.png", "b.png"]
+
+
+def test_claim_and_finish_items(queue):
+    job_id = queue.enqueue(["a.png", "b.png"])
+
+    first = queue.claim()
+    assert first["file"] == "a.png"
+    assert queue.get(job_id)["status"] == "running"
+
+    queue.finish(job_id, first["position"], result={"score": 95})
+    second = queue.claim()
+    queue.finish(job_id, second["position"], error="boom")
+
+    job = queue.get(job_id)
+    assert job["status"] == "completed"
+    assert job["results"][0]["result"] == {"score": 95}
+    assert job["results"][1]["status"] == "failed"
+    assert job["results"][1]["error"] == "boom"
+    assert queue.claim() is None
+
+
+def test_cancel_skips_pending_items(queue):
+    job_id = queue.enqueue(["a.png", "b.png"])
+    running = queue.claim()
+
+    assert queue.cancel(job_id)
+    assert queue.claim() is None
+
+    queue.finish(job_id, running["position"], result={})
+    job = queue.get(job_id)
+    assert job["status"] == "cancelled"
+    assert job["progress"]["cancelled"] == 1
+    assert not queue.cancel("missing")
+
+
+def test_queue_survives_restart(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    # The process dies mid-image and its lease runs out
+    queue = JobQueue(path, lease_seconds=0)
+    job_id = queue.enqueue(["a.png"])
+    queue.claim()
+    queue.close()
+
+    reopened = JobQueue(path)
+    assert reopened.requeue_interrupted() == 1
+    assert reopened.claim()["job_id"] == job_id
+    reopened.close()
+
+
+def test_live_sibling_keeps_its_images(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    sibling = JobQueue(path, lease_seconds=60)
+    job_id = sibling.enqueue(["a.png"])
+    running = sibling.claim()
+
+    starting = JobQueue(path)
+    assert starting.requeue_interrupted() == 0
+    assert starting.claim() is None
+    # Only the owner can finish it
+    starting.finish(job_id, running["position"], error="not mine")
+    assert starting.get(job_id)["results"][0]["status"] == "running"
+
+    assert sibling.renew_leases() == 1
+    assert sibling.requeue_owned() == 1
+    assert starting.claim()["job_id"] == job_id
+    sibling.close()
+    starting.close()
+
+
+def test_active_job_for_finds_unfinished_files(queue):
+    job_id = queue.enqueue(["a.png"])
+
+    assert queue.active_job_for("a.png") == job_id
+    assert queue.active_job_for("b.png") is None
+
+
+def test_workers_drain_queue(queue, tmp_path):
+    seen = []
+
+    async def processor(path):
+        seen.append(path.name)
+        if path.name == "bad.png":
+            raise ValueError("broken")
+        return {"file": path.name}
+
+    async def main():
+        workers = JobWorkers(queue, processor, workers=2, poll_interval=0.01)
+        workers.start()
+        job_id = queue.enqueue(["a.png", "bad.png", "c.png"])
+        workers.notify()
+        for _ in range(200):
+            if queue.get(job_id)["status"] == "completed":
+                break
+            await asyncio.sleep(0.01)
+        await workers.stop()
+        return queue.get(job_id)
+
+    job = asyncio.run(main())
+
+    assert sorted(seen) == ["a.png", "bad.png", "c.png"]
+    assert job["progress"]["processed"] == 2
+    assert job["progress"]["failed"] == 1
+
+
+def run_job(queue, files, processor, preparer, workers=3):
+    async def main():
+        pool = JobWorkers(queue, processor, workers=workers, poll_interval=0.01, preparer=preparer)
+        pool.start()
+        job_id = queue.enqueue(files)
+        pool.notify()
+        for _ in range(200):
+            if queue.get(job_id)["status"] == "completed":
+                break
+            await asyncio.sleep(0.01)
+        await pool.stop()
+        return job_id, queue.get(job_id)
+
+    return asyncio.run(main())
+
+
+def test_preparer_runs_once_per_job_before_its_images(queue):
+    prepared = []
+    seen = []
+
+    async def preparer(job_id, files):
+        await asyncio.sleep(0.05)
+        prepared.append((job_id, [f.name for f in files]))
+        return {"job": job_id}
+
+    async def processor(path, job):
+        # No image of the job starts before its preparation finished
+        seen.append((path.name, job, len(prepared)))
+        return {}
+
+    job_id, job = run_job(queue, ["a.png", "b.png", "c.png"], processor, preparer)
+
+    assert prepared == [(job_id, ["a.png", "b.png", "c.png"])]
+    assert sorted(seen) == [(name, {"job": job_id}, 1) for name in ("a.png", "b.png", "c.png")]
+    assert job["progress"]["processed"] == 3
+
+
+def test_failing_preparer_leaves_images_unprepared(queue):
+    async def preparer(job_id, files):
+        raise RuntimeError("batch call failed")
+
+    async def processor(path, job):
+        return {"prepared": job}
+
+    _, job = run_job(queue, ["a.png", "b.png"], processor, preparer)
+
+    assert job["progress"]["processed"] == 2
+    assert [r["result"] for r in job["results"]] == [{"prepared": None}, {"prepared": None}]
+
+
+def test_enqueue_files_queues_each_path_once(queue, monkeypatch):
+    from pathlib import Path
+    from unittest.mock import MagicMock
+
+    import routes
+    from services import services
+
+    monkeypatch.setattr(services, "_instances", {"jobs": queue, "job_workers": MagicMock()})
+    files = [Path("a-1234.png"), Path("b-5678.png"), Path("a-1234.png")]
+
+    job_id = asyncio.run(routes.enqueue_files(files))
+
+    assert [r["file"] for r in queue.get(job_id)["results"]] == ["a-1234.png", "b-5678.png"]
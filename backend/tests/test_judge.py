@@ -2,6 +2,7 @@ import pytest
 from unittest.mock import MagicMock
 
 from agents.judge import JudgeAgent
+from schemas import JudgeEvaluation, LightingMap, MainStone, ProductSpecs, ScenePlan
 
 
 @pytest.fixture
@@ -11,24 +12,54 @@ def judge():
     return agent
 
 
-def test_judge_evaluates_correctly(judge):
-    # Mock returned image parts
-    judge.model.load_image.return_value = {"mock": "image_part"}
+@pytest.fixture
+def specs():
+    return ProductSpecs(
+        metal_type="platinum",
+        main_stone=MainStone(cut="round", color="E", clarity="VVS2"),
+        setting_style="halo",
+        unique_imperfections="none"
+    )
+
+
+@pytest.fixture
+def plan():
+    return ScenePlan(
+        prompt="Ring on black marble",
+        negative_prompt="extra jewellery",
+        lighting_map=LightingMap(source_direction="left", temperature="5600K"),
+        inpaint_coordinates=[10, 20, 30, 40]
+    )
 
+
+def test_judge_evaluates_correctly(judge, specs, plan):
     # Mock model output (strict JSON emulation)
-    judge.model.invoke_with_image.return_value = \
-        '{"score": 85, "feedback": "Lighting mismatch"}'
+    judge.model.invoke.return_value = (
+        '{"score": 85, "is_approved": false, "issues": ["Lighting mismatch"], "recommendations": []}'
+    )
+
+    evaluation = judge.evaluate(specs, plan)
 
-    score, feedback = judge.evaluate(
-        original_image_path="tests/test_image.png",
-        candidate_image_path="tests/test_candidate_image.png"
+    assert isinstance(evaluation, JudgeEvaluation)
+    assert evaluation.score == 85
+    assert evaluation.issues == ["Lighting mismatch"]
+    judge.model.invoke.assert_called_once()
+
+
+def test_judge_sends_original_and_candidate_images(judge, specs, plan, tmp_path):
+    original = tmp_path / "original.png"
+    candidate = tmp_path / "candidate.png"
+    original.write_bytes(b"ORIGINAL")
+    candidate.write_bytes(b"CANDIDATE")
+    judge.model.invoke_with_images.return_value = (
+        '{"score": 94, "is_approved": true, "issues": [], "recommendations": []}'
     )
 
-    # Assertions
-    assert isinstance(score, int)
-    assert feedback["score"] == 85
-    assert feedback["feedback"] == "Lighting mismatch"
+    evaluation = judge.evaluate(
+        specs, plan, original_image_path=str(original), candidate_image_path=str(candidate)
+    )
 
-    # Ensure correct model calls
-    assert judge.model.load_image.call_count == 2
-    judge.model.invoke_with_image.assert_called_once()
+    assert evaluation.is_approved
+    prompt, images = judge.model.invoke_with_images.call_args.args
+    assert images == [b"ORIGINAL", b"CANDIDATE"]
+    judge.model.invoke.assert_not_called()
@@ -0,0 +1,64 @@
+import os
+
+from batch.manifest import FolderManifest
+
+
+def write(path, data: bytes):
+    path.write_bytes(data)
+    return path
+
+
+def test_only_new_files_are_queued(tmp_path):
+    manifest = FolderManifest(":memory:")
+    a = write(tmp_path / "a.png", b"a")
+    b = write(tmp_path / "b.png", b"b")
+
+    changed, skipped = manifest.changed_files([a, b], "v1")
+    assert changed == [a, b] and skipped == 0
+    manifest.finish(str(a), "out/a_result.json")
+    manifest.finish(str(b), "out/b_result.json")
+
+    c = write(tmp_path / "c.png", b"c")
+    changed, skipped = manifest.changed_files([a, b, c], "v1")
+
+    assert changed == [c]
+    assert skipped == 2
+    assert manifest.get(str(a))["output"] == "out/a_result.json"
+
+
+def test_changed_content_and_version_are_reprocessed(tmp_path):
+    manifest = FolderManifest(":memory:")
+    a = write(tmp_path / "a.png", b"a")
+    b = write(tmp_path / "b.png", b"b")
+    manifest.changed_files([a, b], "v1")
+    manifest.finish(str(a), "out/a")
+    manifest.finish(str(b), "out/b")
+
+    write(a, b"a, retouched")
+    assert manifest.changed_files([a, b], "v1") == ([a], 1)
+
+    manifest.finish(str(a), "out/a")
+    assert manifest.changed_files([a, b], "v2") == ([a, b], 0)
+
+
+def test_touched_but_identical_file_is_skipped(tmp_path):
+    manifest = FolderManifest(":memory:")
+    a = write(tmp_path / "a.png", b"a")
+    manifest.changed_files([a], "v1")
+    manifest.finish(str(a), "out/a")
+
+    stat = os.stat(a)
+    os.utime(a, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    assert manifest.changed_files([a], "v1") == ([], 1)
+    assert manifest.get(str(a))["mtime_ns"] == stat.st_mtime_ns + 10**9
+
+
+def test_failed_files_are_retried(tmp_path):
+    manifest = FolderManifest(":memory:")
+    a = write(tmp_path / "a.png", b"a")
+    manifest.changed_files([a], "v1")
+    manifest.finish(str(a), failed=True)
+
+    assert manifest.is_tracked(str(a))
+    assert manifest.changed_files([a], "v1") == ([a], 0)
@@ -0,0 +1,42 @@
+import time
+
+from cache.disk_cache import DiskCache
+from cache.memory_cache import TTLCache
+
+
+def test_ttl_cache_roundtrip_and_stats():
+    cache = TTLCache(max_entries=4, ttl=60)
+
+    assert cache.get("a") is None
+    cache.set("a", {"prompt": "p"})
+
+    assert cache.get("a") == {"prompt": "p"}
+    assert cache.stats() == {"hits": 1, "misses": 1, "entries": 1}
+
+
+def test_ttl_cache_expires_entries():
+    cache = TTLCache(ttl=0.01)
+    cache.set("a", 1)
+
+    time.sleep(0.02)
+
+    assert cache.get("a") is None
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(max_entries=2, ttl=None)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+
+
+def test_ttl_cache_persists_through_backing(tmp_path):
+    TTLCache(ttl=60, backing=DiskCache(str(tmp_path))).set("a", [1, 2])
+
+    reopened = TTLCache(ttl=60, backing=DiskCache(str(tmp_path)))
+
+    assert reopened.get("a") == [1, 2]
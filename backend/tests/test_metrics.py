@@ -0,0 +1,48 @@
+from metrics import Counter, Gauge, Histogram, Registry
+
+
+def test_counter_tracks_values_per_label():
+    counter = Counter("calls_total", "Calls.", ["agent"])
+    counter.inc(agent="judge")
+    counter.inc(2, agent="judge")
+
+    assert counter.value(agent="judge") == 3
+    assert counter.value(agent="analyst") == 0
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("latency_seconds", "Latency.", ["node"], buckets=(0.1, 1))
+    histogram.observe(0.05, node="judge")
+    histogram.observe(0.5, node="judge")
+    histogram.observe(5, node="judge")
+
+    lines = histogram.render()
+
+    assert 'latency_seconds_bucket{node="judge",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{node="judge",le="1.0"} 2' in lines
+    assert 'latency_seconds_bucket{node="judge",le="+Inf"} 3' in lines
+    assert 'latency_seconds_count{node="judge"} 3' in lines
+
+
+def test_histogram_time_records_on_error():
+    histogram = Histogram("latency_seconds", "Latency.", ["node"])
+
+    try:
+        with histogram.time(node="producer"):
+            raise RuntimeError("boom")
+    except RuntimeError:
+        pass
+
+    assert histogram.count(node="producer") == 1
+
+
+def test_registry_reads_gauges_at_scrape_time():
+    registry = Registry()
+    gauge = registry.register(Gauge("queue_depth", "Depth."))
+    assert registry.render() == "\n"
+
+    gauge.collect = lambda: 7
+    text = registry.render()
+
+    assert "# TYPE queue_depth gauge" in text
+    assert "queue_depth 7" in text
@@ -0,0 +1,78 @@
+import io
+
+import pytest
+from PIL import Image
+
+from imaging.preprocess import ImagePreprocessor, detect_mime_type
+
+
+def encode(img: Image.Image, fmt: str) -> bytes:
+    out = io.BytesIO()
+    img.save(out, format=fmt)
+    return out.getvalue()
+
+
+@pytest.fixture
+def large_png():
+    # Noisy content so the PNG does not compress to nothing
+    img = Image.effect_noise((1200, 800), 64).convert("RGB")
+    return encode(img, "PNG")
+
+
+def test_detect_mime_type():
+    small = Image.new("RGB", (4, 4))
+
+    assert detect_mime_type(encode(small, "PNG")) == "image/png"
+    assert detect_mime_type(encode(small, "JPEG")) == "image/jpeg"
+    assert detect_mime_type(encode(small, "WEBP")) == "image/webp"
+
+
+def test_prepare_downscales_and_reencodes(large_png):
+    preprocessor = ImagePreprocessor(max_long_edge=512, image_format="WEBP")
+
+    prepared = preprocessor.prepare(large_png)
+
+    assert prepared.mime_type == "image/webp"
+    assert prepared.bytes_saved > 0
+    with Image.open(io.BytesIO(prepared.data)) as img:
+        assert max(img.size) == 512
+
+
+def test_prepare_flattens_alpha_for_jpeg():
+    rgba = Image.new("RGBA", (800, 800), (255, 0, 0, 0))
+    preprocessor = ImagePreprocessor(max_long_edge=256, image_format="JPEG")
+
+    prepared = preprocessor.prepare(encode(rgba, "PNG"))
+
+    assert prepared.mime_type == "image/jpeg"
+    with Image.open(io.BytesIO(prepared.data)) as img:
+        assert img.mode == "RGB"
+        assert img.getpixel((0, 0))[1] > 200
+
+
+def test_prepare_keeps_small_originals():
+    tiny = encode(Image.effect_noise((64, 64), 64).convert("RGB"), "JPEG")
+    preprocessor = ImagePreprocessor(max_long_edge=512, image_format="PNG")
+
+    prepared = preprocessor.prepare(tiny)
+
+    assert prepared.data == tiny
+    assert prepared.mime_type == "image/jpeg"
+
+
+def test_prepare_caches_by_content(large_png):
+    preprocessor = ImagePreprocessor(max_long_edge=512)
+
+    first = preprocessor.prepare(large_png)
+    second = preprocessor.prepare(large_png)
+
+    assert first is second
+    stats = preprocessor.stats()
+    assert stats["calls"] == 2
+    assert stats["cached"] == 1
+    assert stats["bytes_saved"] == 2 * first.bytes_saved
+
+
+def test_rejects_unknown_format():
+    with pytest.raises(ValueError):
+        ImagePreprocessor(image_format="TIFF")
@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from imaging.prescreen import FidelityPrescreen
+
+
+@pytest.fixture
+def product_path(tmp_path):
+    rng = np.random.default_rng(0)
+    pixels = rng.integers(0, 255, size=(100, 100, 3), dtype=np.uint8)
+    path = tmp_path / "product.png"
+    Image.fromarray(pixels).convert("RGBA").save(path)
+    return path
+
+
+@pytest.fixture
+def scene():
+    rng = np.random.default_rng(1)
+    return Image.fromarray(rng.integers(60, 200, size=(400, 400, 3), dtype=np.uint8))
+
+
+def save(img, tmp_path, name="candidate.png"):
+    path = tmp_path / name
+    img.save(path)
+    return str(path)
+
+
+def test_passes_when_product_sits_at_coordinates(tmp_path, product_path, scene):
+    with Image.open(product_path) as product:
+        scene.paste(product.convert("RGB"), (100, 150))
+
+    result = FidelityPrescreen().check(str(product_path), save(scene, tmp_path), [100, 150, 200, 250])
+
+    assert result.passed
+    assert result.similarity > 0.9
+
+
+def test_passes_for_composited_product(tmp_path, scene):
+    from imaging.composite import Compositor
+
+    # Wide product in a square box: the Compositor fills only a band of it
+    rng = np.random.default_rng(2)
+    product = Image.fromarray(rng.integers(0, 255, size=(50, 150, 3), dtype=np.uint8)).convert("RGBA")
+    product_path = save(product, tmp_path, "wide.png")
+    lighting = {"source_direction": "left", "temperature": "5600K"}
+    candidate = Compositor().composite_image(scene, product, [100, 100, 300, 300], lighting)
+
+    result = FidelityPrescreen().check(product_path, save(candidate, tmp_path), [100, 100, 300, 300])
+
+    assert result.passed
+    assert result.similarity > 0.9
+
+
+def test_fails_when_product_is_elsewhere(tmp_path, product_path, scene):
+    with Image.open(product_path) as product:
+        scene.paste(product.convert("RGB"), (250, 250))
+
+    result = FidelityPrescreen().check(str(product_path), save(scene, tmp_path), [100, 150, 200, 250])
+
+    assert not result.passed
+    assert result.plan
+    assert "does not match" in result.feedback
+
+
+def test_fails_on_blank_candidate(tmp_path, product_path):
+    blank = Image.new("RGB", (400, 400), (255, 255, 255))
+
+    result = FidelityPrescreen().check(str(product_path), save(blank, tmp_path), [0, 0, 10, 10])
+
+    assert not result.passed
+    assert not result.plan
+    assert "blank" in result.feedback
+
+
+def test_fails_on_out_of_bounds_coordinates(tmp_path, product_path, scene):
+    result = FidelityPrescreen().check(str(product_path), save(scene, tmp_path), [450, 450, 600, 600])
+
+    assert not result.passed
+    assert result.plan
+    assert "do not fit" in result.feedback
+
+
+def test_clamps_partly_outside_box_like_the_compositor(tmp_path, product_path, scene):
+    from imaging.composite import Compositor
+
+    with Image.open(product_path) as product:
+        candidate = Compositor().composite_image(scene, product, [300, 300, 500, 500])
+
+    result = FidelityPrescreen().check(str(product_path), save(candidate, tmp_path), [300, 300, 500, 500])
+
+    assert result.passed
+
+
+def test_fails_on_missing_or_tiny_candidate(tmp_path, product_path):
+    prescreen = FidelityPrescreen()
+
+    assert not prescreen.check(str(product_path), str(tmp_path / "missing.png")).passed
+    assert not prescreen.check(str(product_path), save(Image.new("RGB", (10, 10)), tmp_path)).passed
@@ -1,15 +1,40 @@
-from unittest.mock import patch
-from pathlib import Path
+import base64
+import hashlib
+import io
+from unittest.mock import MagicMock
 
 import pytest
+from PIL import Image
 
 from agents.producer import ProducerAgent
+from cache.scene_cache import SceneCache
+from imaging.composite import Compositor
 from schemas import ScenePlan, LightingMap
 
+INSTRUCTION_JSON = (
+    '{"prompt": "marble", "negative_prompt": "extra jewellery", "width": 64, "height": 64, "infer": true}'
+)
+
+
+def png(image: Image.Image) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
 
 @pytest.fixture
-def producer():
-    return ProducerAgent()
+def producer(tmp_path):
+    agent = ProducerAgent(
+        compositor=Compositor(temperature_strength=0, shadow_opacity=0),
+        refine=False,
+        scene_cache=SceneCache(str(tmp_path / "scenes")),
+    )
+    agent.model = MagicMock()
+    agent.model.invoke.return_value = INSTRUCTION_JSON
+    agent.model.invoke_image.return_value = base64.b64encode(
+        png(Image.new("RGB", (64, 64), (200, 200, 200)))
+    ).decode("ascii")
+    return agent
 
 
 @pytest.fixture
@@ -21,80 +46,71 @@ def scene_plan():
             source_direction="top-right",
             temperature="5500K"
         ),
-        inpaint_coordinates=[10, 20, 30, 40]
+        inpaint_coordinates=[16, 16, 48, 48]
     )
 
 
 @pytest.fixture
-def fake_bytes():
-    return b"FAKE_IMAGE_BYTES"
-
+def product_png_path(tmp_path):
+    path = tmp_path / "product.png"
+    Image.new("RGBA", (32, 32), (128, 128, 128, 255)).save(path)
+    return str(path)
 
-def test_generate_scene_base(producer, scene_plan):
-    with patch.object(producer.client, "invoke_text", return_value="SCENE_BASE") as mock_call:
-        result = producer.generate_scene_base(scene_plan)
 
-    assert isinstance(result, bytes)
-    assert b"SCENE_BASE" in result
-    mock_call.assert_called_once()
+def test_generate_image(producer, scene_plan):
+    result = producer.generate_image(scene_plan)
 
+    assert result.metadata["width"] == 64
+    producer.model.invoke.assert_called_once()
+    assert producer.model.invoke_image.call_args.kwargs["prompt"] == "marble"
 
-def test_inpaint_product(producer, scene_plan, fake_bytes):
-    with patch.object(producer.client, "load_image", return_value=b"IMAGE_PART") as mock_load, \
-         patch.object(producer.client, "invoke_with_image", return_value="INPAINTED") as mock_inpaint:
 
-        result = producer.inpaint_product(
-            base_scene_bytes=fake_bytes,
-            product_png_path="tests/test_image.png",
-            scene_plan=scene_plan
-        )
+def test_candidates_get_their_own_cached_scene(producer, scene_plan):
+    producer.generate_base_scene(scene_plan, variant=0)
+    producer.generate_base_scene(scene_plan, variant=1)
+    producer.generate_base_scene(scene_plan, variant=1)
 
-        assert isinstance(result, bytes)
-        assert b"INPAINTED" in result
+    assert producer.model.invoke_image.call_count == 2
+    assert producer.scene_cache.stats()["entries"] == 2
 
-        mock_load.assert_called_once()
-        mock_inpaint.assert_called_once()
 
+def test_forget_scene_evicts_rejected_backdrop(producer, scene_plan):
+    scene = producer.generate_base_scene(scene_plan)
+    producer.forget_scene(hashlib.sha256(scene).hexdigest())
+    producer.generate_base_scene(scene_plan)
 
-def test_generate_final_candidate_no_feedback(producer, scene_plan):
-    with patch.object(producer, "generate_scene_base", return_value=b"BASE"), \
-         patch.object(producer, "inpaint_product", return_value=b"CANDIDATE") as mock_inpaint:
+    assert producer.model.invoke_image.call_count == 2
 
-        result = producer.generate_final_candidate(
-            product_png_path="tests/test_image.png",
-            scene_plan=scene_plan,
-            feedback=None
-        )
-
-    assert isinstance(result, bytes)
-    assert result == b"CANDIDATE"
-
-    assert mock_inpaint.call_count == producer._max_retries
 
+def test_generate_final_candidate_composites_product(producer, scene_plan, product_png_path):
+    result = producer.generate_final_candidate(
+        product_png_path=product_png_path,
+        scene_plan=scene_plan,
+        feedback=None
+    )
 
-def test_generate_final_candidate_with_good_feedback(producer, scene_plan):
-    with patch.object(producer, "generate_scene_base", return_value=b"BASE"), \
-         patch.object(producer, "inpaint_product", return_value=b"CANDIDATE") as mock_inpaint:
+    pixels = Image.open(io.BytesIO(result)).convert("RGB")
+    assert pixels.getpixel((32, 32)) == (128, 128, 128)
+    assert pixels.getpixel((4, 4)) == (200, 200, 200)
+    producer.model.invoke_image.assert_called_once()
+    producer.model.invoke_image_edit.assert_not_called()
 
-        feedback = {"score": 95, "feedback": "Looks good"}
 
-        result = producer.generate_final_candidate(
-            product_png_path="tests/test_image.png",
-            scene_plan=scene_plan,
-            feedback=feedback
-        )
+def test_feedback_reaches_scene_prompt(producer, scene_plan, product_png_path):
+    producer.generate_final_candidate(
+        product_png_path=product_png_path,
+        scene_plan=scene_plan,
+        feedback="Background too busy"
+    )
 
-    assert isinstance(result, bytes)
-    assert result == b"CANDIDATE"
-    assert mock_inpaint.call_count == 1
+    assert "Background too busy" in producer.model.invoke.call_args.args[0]
 
 
-def test_save_candidates(producer, tmp_path, fake_bytes):
-    output_dir = tmp_path / "outputs"
-    output_dir.mkdir(exist_ok=True)
+def test_refine_pass_edits_composite(producer, scene_plan, product_png_path):
+    producer.refine = True
+    producer.model.invoke_image_edit.return_value = base64.b64encode(b"REFINED").decode("ascii")
 
-    result_path = producer.save_candidates(fake_bytes, str(output_dir))
+    result = producer.generate_final_candidate(product_png_path=product_png_path, scene_plan=scene_plan)
 
-    saved = Path(result_path)
-    assert saved.exists()
-    assert saved.read_bytes() == fake_bytes
+    assert result == b"REFINED"
+    producer.model.invoke_image_edit.assert_called_once()
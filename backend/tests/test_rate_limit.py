@@ -0,0 +1,160 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from google.genai import errors
+
+from llm.rate_limit import AdaptiveConcurrency, RateLimiter, TokenBucket, estimate_tokens
+
+
+def api_error(code: int) -> errors.APIError:
+    return errors.APIError(code, {"error": {"message": "quota", "status": "RESOURCE_EXHAUSTED"}})
+
+
+@pytest.fixture
+def limiter():
+    return RateLimiter(
+        requests_per_minute=6000,
+        tokens_per_minute=1_000_000,
+        max_concurrency=4,
+        max_attempts=3,
+        backoff_base=0.001,
+        backoff_max=0.002,
+    )
+
+
+def test_token_bucket_delays_once_budget_is_spent():
+    bucket = TokenBucket(per_minute=60)
+
+    assert bucket.reserve(60) == 0.0
+    assert bucket.reserve(1) == pytest.approx(1.0, abs=0.05)
+
+
+def test_retries_retryable_errors_then_succeeds(limiter):
+    calls = {"n": 0}
+
+    def flaky():
+        calls["n"] += 1
+        if calls["n"] < 3:
+            raise api_error(429)
+        return "OK"
+
+    assert limiter.call(flaky) == "OK"
+    assert limiter.retries == 2
+    assert limiter.throttled == 2
+
+
+def test_does_not_retry_client_errors(limiter):
+    calls = {"n": 0}
+
+    def bad_request():
+        calls["n"] += 1
+        raise api_error(400)
+
+    with pytest.raises(errors.APIError):
+        limiter.call(bad_request)
+    assert calls["n"] == 1
+
+
+def test_gives_up_after_max_attempts(limiter):
+    with pytest.raises(errors.APIError):
+        limiter.call(lambda: (_ for _ in ()).throw(api_error(503)))
+    assert limiter.retries == 2
+
+
+def test_async_call_retries(limiter):
+    calls = {"n": 0}
+
+    async def flaky():
+        calls["n"] += 1
+        if calls["n"] == 1:
+            raise api_error(500)
+        return "OK"
+
+    assert asyncio.run(limiter.acall(flaky)) == "OK"
+    assert limiter.concurrency.in_flight == 0
+
+
+def test_aimd_grows_on_success_and_halves_on_throttle():
+    concurrency = AdaptiveConcurrency(initial=4, maximum=8, cooldown=0)
+
+    for _ in range(20):
+        concurrency.on_success()
+    assert concurrency.limit > 6
+
+    grown = concurrency.limit
+    concurrency.on_throttle()
+    assert concurrency.limit == pytest.approx(grown / 2)
+
+
+def test_concurrency_limit_bounds_threads():
+    concurrency = AdaptiveConcurrency(initial=2, maximum=2)
+    lock = threading.Lock()
+    active = {"now": 0, "peak": 0}
+
+    def worker():
+        concurrency.acquire()
+        with lock:
+            active["now"] += 1
+            active["peak"] = max(active["peak"], active["now"])
+        time.sleep(0.01)
+        with lock:
+            active["now"] -= 1
+        concurrency.release()
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert active["peak"] == 2
+    assert concurrency.in_flight == 0
+
+
+def test_concurrency_limit_bounds_tasks():
+    concurrency = AdaptiveConcurrency(initial=3, maximum=3)
+    active = {"now": 0, "peak": 0}
+
+    async def task():
+        await concurrency.aacquire()
+        active["now"] += 1
+        active["peak"] = max(active["peak"], active["now"])
+        await asyncio.sleep(0.01)
+        active["now"] -= 1
+        concurrency.release()
+
+    async def main():
+        await asyncio.gather(*(task() for _ in range(10)))
+
+    asyncio.run(main())
+
+    assert active["peak"] == 3
+    assert concurrency.in_flight == 0
+
+
+def test_cancelled_waiter_returns_handed_over_slot():
+    concurrency = AdaptiveConcurrency(initial=1, maximum=1)
+
+    async def main():
+        await concurrency.aacquire()
+        waiter = asyncio.create_task(concurrency.aacquire())
+        await asyncio.sleep(0)
+
+        concurrency.release()
+        # Let the slot be handed over, then cancel before the waiter resumes
+        await asyncio.sleep(0)
+        assert not waiter.done()
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+    asyncio.run(main())
+
+    assert concurrency.in_flight == 0
+
+
+def test_estimate_tokens_counts_images():
+    assert estimate_tokens("x" * 400) == 100
+    assert estimate_tokens("x" * 400, images=2) == 100 + 2 * 258
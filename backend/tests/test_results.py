@@ -0,0 +1,80 @@
+import asyncio
+from unittest.mock import patch
+
+from batch.results import ResultBuffer, ResultStore, sku_from_path
+
+
+def record(image: str, score, retries=0, created_at=None):
+    entry = {"image": image, "judgement": {"score": score, "feedback": ""}, "retries": retries}
+    if created_at is not None:
+        entry["created_at"] = created_at
+    return entry
+
+
+def test_sku_is_the_upload_stem():
+    assert sku_from_path("input/RING-042-0123456789ab.png") == "RING-042"
+    assert sku_from_path("catalog/RING-042.png") == "RING-042"
+
+
+def test_add_many_and_filter():
+    store = ResultStore(":memory:")
+    ids = store.add_many([
+        record("in/a.png", 95, created_at=100),
+        record("in/b.png", 70, retries=3, created_at=200),
+        record("in/c.png", 79.5, retries=1, created_at=300),
+    ])
+
+    assert len(ids) == 3
+
+    low = store.query(score_below=80)
+    assert [item["sku"] for item in low["items"]] == ["c", "b"]
+
+    recent_low = store.query(score_below=80, since=250)
+    assert [item["sku"] for item in recent_low["items"]] == ["c"]
+
+    retried = store.query(min_retries=2)
+    assert [item["image"] for item in retried["items"]] == ["in/b.png"]
+    assert retried["items"][0]["judgement"]["score"] == 70
+
+
+def test_query_paginates_with_cursor():
+    store = ResultStore(":memory:")
+    store.add_many([record(f"in/{i}.png", i) for i in range(5)])
+
+    first = store.query(limit=2)
+    second = store.query(limit=2, cursor=first["next_cursor"])
+    last = store.query(limit=2, cursor=second["next_cursor"])
+
+    seen = [item["sku"] for page in (first, second, last) for item in page["items"]]
+    assert seen == ["4", "3", "2", "1", "0"]
+    assert last["next_cursor"] is None
+
+
+def test_buffer_writes_concurrent_results_in_one_transaction():
+    store = ResultStore(":memory:")
+
+    async def main():
+        buffer = ResultBuffer(store, max_records=10, max_delay=0.01)
+        with patch.object(store, "add_many", wraps=store.add_many) as add_many:
+            ids = await asyncio.gather(*(buffer.add(record(f"in/{i}.png", i)) for i in range(3)))
+        return ids, add_many.call_count
+
+    ids, transactions = asyncio.run(main())
+
+    assert transactions == 1
+    assert len(set(ids)) == 3
+    assert [item["image"] for item in store.query(limit=10)["items"]] == ["in/2.png", "in/1.png", "in/0.png"]
+
+
+def test_buffer_flushes_when_full():
+    store = ResultStore(":memory:")
+
+    async def main():
+        # The delay is never reached: every second record fills the buffer
+        buffer = ResultBuffer(store, max_records=2, max_delay=60)
+        return await asyncio.wait_for(
+            asyncio.gather(*(buffer.add(record(f"in/{i}.png", i)) for i in range(4))), timeout=5
+        )
+
+    assert len(asyncio.run(main())) == 4
+    assert len(store.query(limit=10)["items"]) == 4
@@ -0,0 +1,71 @@
+import os
+
+import pytest
+
+from cache.scene_cache import SceneCache, scene_key
+from schemas import LightingMap, ScenePlan
+
+
+def plan(prompt="Ring on black marble", coordinates=(10, 20, 30, 40), temperature="5600K") -> ScenePlan:
+    return ScenePlan(
+        prompt=prompt,
+        negative_prompt="extra jewellery",
+        lighting_map=LightingMap(source_direction="left", temperature=temperature),
+        inpaint_coordinates=list(coordinates),
+    )
+
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    return tmp_path / "scenes"
+
+
+def test_key_ignores_product_placement_and_formatting():
+    base = scene_key(plan(), 1024, 1024)
+
+    assert scene_key(plan(coordinates=(50, 60, 70, 80)), 1024, 1024) == base
+    assert scene_key(plan(prompt="  ring on   BLACK marble "), 1024, 1024) == base
+    assert scene_key(plan(), 1024, 768) != base
+    assert scene_key(plan(temperature="3200K"), 1024, 1024) != base
+    assert scene_key(plan(), 1024, 1024, model="other") != base
+    assert scene_key(plan(), 1024, 1024, variant=1) != base
+
+
+def test_roundtrip_survives_restart(cache_dir):
+    cache = SceneCache(str(cache_dir))
+    assert cache.get("a") is None
+    cache.set("a", b"PNGDATA")
+
+    reopened = SceneCache(str(cache_dir))
+    assert reopened.get("a") == b"PNGDATA"
+    assert reopened.stats() == {"hits": 1, "misses": 0, "entries": 1, "bytes": 7}
+
+
+def test_evicts_least_recently_used_beyond_max_bytes(cache_dir):
+    cache = SceneCache(str(cache_dir), max_bytes=20)
+    cache.set("a", b"x" * 8)
+    cache.set("b", b"x" * 8)
+    cache.get("a")
+    cache.set("c", b"x" * 8)
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert sorted(os.listdir(cache_dir)) == ["a.img", "c.img"]
+
+
+def test_skips_scenes_larger_than_the_cache(cache_dir):
+    cache = SceneCache(str(cache_dir), max_bytes=4)
+    cache.set("a", b"too large")
+
+    assert cache.stats()["entries"] == 0
+
+
+def test_delete_drops_entry(cache_dir):
+    cache = SceneCache(str(cache_dir))
+    cache.set("a", b"PNGDATA")
+    cache.delete("a")
+    cache.delete("missing")
+
+    assert cache.get("a") is None
+    assert cache.stats()["bytes"] == 0
+    assert os.listdir(cache_dir) == []
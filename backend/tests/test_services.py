@@ -0,0 +1,51 @@
+import subprocess
+import sys
+
+import pytest
+
+from config import Configuration, get_config
+from services import Services
+
+
+def test_get_config_is_a_singleton():
+    assert get_config() is get_config()
+    assert isinstance(get_config(), Configuration)
+
+
+def test_instances_are_built_once_on_first_use():
+    services = Services()
+    calls = []
+
+    def build():
+        calls.append(1)
+        return object()
+
+    assert services.built("thing") is None
+    first = services._get("thing", build)
+    assert services._get("thing", build) is first
+    assert services.built("thing") is first
+    assert calls == [1]
+
+
+def test_override_replaces_instance():
+    services = Services()
+    sentinel = object()
+    services.override("results", sentinel)
+
+    assert services.results is sentinel
+
+
+def test_job_workers_need_a_processor():
+    services = Services()
+    services.override("jobs", object())
+
+    with pytest.raises(RuntimeError):
+        services.job_workers
+
+
+def test_importing_services_does_not_load_heavy_modules():
+    # A fresh interpreter, since other tests already imported everything
+    code = "import sys, services; print(any(m in sys.modules for m in ('agents.analyst', 'langgraph', 'google.genai')))"
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+
+    assert output.stdout.strip() == "False"
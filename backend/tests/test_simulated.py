@@ -0,0 +1,110 @@
+import asyncio
+import base64
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from benchmarks.harness import percentile
+from llm.rate_limit import is_retryable
+from llm.simulated import SimulatedLLMClient, SimulationProfile
+from schemas import JudgeEvaluation, ProductSpecs, ScenePlan
+
+
+def fast_profile(**overrides) -> SimulationProfile:
+    settings = dict(text_latency=0.0, image_latency=0.0, image_bytes=30_000, seed=1)
+    settings.update(overrides)
+    return SimulationProfile(**settings)
+
+
+def test_simulated_outputs_match_agent_schemas():
+    client = SimulatedLLMClient(fast_profile())
+
+    specs = client.invoke_with_image("You are a Gemologist AI specializing in jewelry.", b"img")
+    plan = client.invoke("You are the Senior Art Director for 64 Facets, ...")
+
+    ProductSpecs.model_validate_json(specs)
+    ScenePlan.model_validate_json(plan)
+    assert client.calls == 2
+
+
+def test_simulated_batch_answer_has_one_entry_per_image():
+    client = SimulatedLLMClient(fast_profile())
+    prompt = "You are a Gemologist AI. ... produce a STRICT JSON array with exactly 3 objects, ..."
+
+    items = json.loads(client.invoke_with_images(prompt, [b"a", b"b", b"c"]))
+
+    assert len(items) == 3
+
+
+def test_simulated_judge_rejects_at_reject_rate():
+    judge = "You are the Senior Creative Judge for 64 Facets."
+    director = "You are the Senior Art Director for 64 Facets, ..."
+
+    rejecting = SimulatedLLMClient(fast_profile(reject_rate=1.0))
+    verdict = JudgeEvaluation.model_validate_json(rejecting.invoke(judge))
+    assert verdict.score < 90 and verdict.issues
+    # The correction moves the product, so a placement retry can change the image
+    plan = ScenePlan.model_validate_json(rejecting.invoke(director))
+    corrected = ScenePlan.model_validate_json(rejecting.invoke(f"{director}\n\nThe Judge rejected the image"))
+    assert corrected.inpaint_coordinates != plan.inpaint_coordinates
+
+    approving = SimulatedLLMClient(fast_profile())
+    assert JudgeEvaluation.model_validate_json(approving.invoke(judge)).score >= 90
+
+
+def test_simulated_failures_are_retryable():
+    client = SimulatedLLMClient(fast_profile(failure_rate=1.0))
+
+    with pytest.raises(Exception) as exc_info:
+        client.invoke("You are the Senior Creative Judge for 64 Facets.")
+
+    assert is_retryable(exc_info.value)
+
+
+def test_simulated_malformed_output_is_not_json():
+    client = SimulatedLLMClient(fast_profile(malformed_rate=1.0))
+
+    with pytest.raises(ValueError):
+        json.loads(client.invoke("You are the Senior Creative Judge for 64 Facets."))
+
+
+def test_simulated_image_has_requested_payload_size():
+    client = SimulatedLLMClient(fast_profile())
+
+    image = base64.b64decode(asyncio.run(client.ainvoke_image("scene", width=512, height=384)))
+
+    assert image.startswith(b"\x89PNG")
+    assert 20_000 < len(image) < 40_000
+    # Width and height of the PNG header
+    assert image[16:24] == (512).to_bytes(4, "big") + (384).to_bytes(4, "big")
+
+
+def test_benchmark_runs_end_to_end(tmp_path):
+    # A fresh interpreter: the benchmark sandboxes its settings before
+    # the config is first read
+    script = (
+        "import asyncio, json\n"
+        "from benchmarks.run import main\n"
+        "asyncio.run(main(['--n', '2', '--text-latency', '0', '--image-latency', '0',"
+        " '--image-bytes', '20000', '--json', %r]))\n"
+    ) % str(tmp_path / "results.json")
+    subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=Path(__file__).resolve().parents[1],
+        check=True,
+        capture_output=True,
+        timeout=120,
+    )
+
+    results = json.loads((tmp_path / "results.json").read_text())
+    assert [r["scenario"] for r in results] == ["graph", "endpoint"]
+    assert all(r["batch_size"] == 2 and r["errors"] == 0 for r in results)
+
+
+def test_percentile_interpolates():
+    assert percentile([], 95) == 0.0
+    assert percentile([1, 2, 3, 4], 50) == 2.5
+    assert percentile(list(range(101)), 99) == 99
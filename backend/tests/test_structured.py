@@ -0,0 +1,87 @@
+import asyncio
+import json
+from unittest.mock import MagicMock
+
+import pytest
+
+from llm.simulated import SimulatedLLMClient, SimulationProfile
+from llm.structured import StructuredOutputError, StructuredParser, parse_json_lenient, repair_json
+from metrics import JSON_PARSE_FAILURES, JSON_PARSE_OUTCOMES
+from schemas import ProductSpecs
+
+SPECS = {
+    "metal_type": "gold",
+    "main_stone": {"cut": "oval", "color": "D", "clarity": "VS1"},
+    "setting_style": "prong",
+    "unique_imperfections": "none",
+}
+
+
+@pytest.mark.parametrize("raw", [
+    'Sure! Here is the JSON:\n```json\n{"a": 1, "b": [1, 2,],}\n```\nLet me know.',
+    '{"a": 1, // the score\n "b": [1, 2]} trailing words',
+    '{"a": 1, "approved": True}\n\nNote: estimated.',
+    '{"a": 1, "b": [1, 2',
+])
+def test_repair_json_fixes_common_slips(raw):
+    assert json.loads(repair_json(raw))["a"] == 1
+
+
+def test_repair_json_keeps_strings_intact():
+    raw = '{"url": "http://x.y/a,]", "ok": True, "none": None}'
+    assert json.loads(repair_json(raw)) == {"url": "http://x.y/a,]", "ok": True, "none": None}
+
+
+def test_parse_json_lenient():
+    assert parse_json_lenient("```\n[1, 2,]\n```") == [1, 2]
+    assert parse_json_lenient("no json here") is None
+
+
+def test_repaired_output_costs_no_extra_call():
+    parser = StructuredParser("test-repair", ProductSpecs)
+    client = MagicMock()
+
+    parsed = parser.parse("```json\n" + json.dumps(SPECS) + "\n```", client)
+
+    assert parsed.metal_type == "gold"
+    client.invoke.assert_not_called()
+    assert JSON_PARSE_OUTCOMES.value(agent="test-repair", outcome="repaired") == 1
+
+
+def test_reask_only_when_repair_fails():
+    parser = StructuredParser("test-reask", ProductSpecs)
+    client = MagicMock()
+    client.invoke.return_value = json.dumps(SPECS)
+
+    parsed = parser.parse('{"metal_type": "gold"}', client)
+
+    assert parsed.setting_style == "prong"
+    client.invoke.assert_called_once()
+    prompt = client.invoke.call_args.args[0]
+    assert '"title": "ProductSpecs"' in prompt and '{"metal_type": "gold"}' in prompt
+    assert JSON_PARSE_OUTCOMES.value(agent="test-reask", outcome="reasked") == 1
+    # Fixed by the re-ask: not a failure
+    assert JSON_PARSE_FAILURES.value(agent="test-reask") == 0
+
+
+def test_unrecoverable_output_raises_value_error():
+    parser = StructuredParser("test-fail", ProductSpecs, reask=False)
+
+    with pytest.raises(ValueError) as exc:
+        parser.parse("I cannot help with that.", MagicMock())
+
+    assert isinstance(exc.value, StructuredOutputError)
+    assert JSON_PARSE_OUTCOMES.value(agent="test-fail", outcome="failed") == 1
+    assert JSON_PARSE_FAILURES.value(agent="test-fail") == 1
+
+
+def test_async_reask_against_simulated_backend():
+    client = SimulatedLLMClient(SimulationProfile(text_latency=0, latency_sigma=0, malformed_rate=1.0, seed=1))
+    parser = StructuredParser("test-async", ProductSpecs)
+    raw = client.invoke("You are a Gemologist AI")
+
+    # Truncated output is beyond repair; answer the re-ask cleanly
+    client.profile = SimulationProfile(text_latency=0, latency_sigma=0)
+    parsed = asyncio.run(parser.aparse(raw, client))
+
+    assert isinstance(parsed, ProductSpecs)
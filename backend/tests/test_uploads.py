@@ -0,0 +1,61 @@
+import asyncio
+import io
+
+import pytest
+from fastapi import UploadFile
+
+from batch.uploads import ImageUploadError, detect_image_type, stream_upload
+
+PNG_HEADER = b"\x89PNG\r\n\x1a\n"
+
+
+def make_upload(data: bytes, filename: str = "ring.png") -> UploadFile:
+    return UploadFile(file=io.BytesIO(data), filename=filename)
+
+
+def test_detect_image_type():
+    assert detect_image_type(PNG_HEADER + b"rest") == ".png"
+    assert detect_image_type(b"\xff\xd8\xff\xe0rest") == ".jpg"
+    assert detect_image_type(b"GIF89a") is None
+
+
+def test_stream_upload_writes_file_in_chunks(tmp_path):
+    data = PNG_HEADER + b"x" * 1000
+
+    saved = asyncio.run(stream_upload(make_upload(data), tmp_path, max_bytes=10_000, chunk_size=64))
+
+    assert saved.read_bytes() == data
+    assert saved.suffix == ".png"
+    assert saved.name.startswith("ring-")
+    assert list(tmp_path.glob("*.part")) == []
+
+
+def test_stream_upload_avoids_name_collisions(tmp_path):
+    first = asyncio.run(stream_upload(make_upload(PNG_HEADER + b"a"), tmp_path))
+    second = asyncio.run(stream_upload(make_upload(PNG_HEADER + b"b"), tmp_path))
+
+    assert first != second
+    assert first.exists() and second.exists()
+
+
+def test_stream_upload_sanitises_filename(tmp_path):
+    saved = asyncio.run(stream_upload(make_upload(PNG_HEADER, filename="../../etc/pass wd.png"), tmp_path))
+
+    assert saved.parent == tmp_path
+    assert saved.name.startswith("pass_wd-")
+
+
+def test_stream_upload_rejects_non_images(tmp_path):
+    with pytest.raises(ImageUploadError):
+        asyncio.run(stream_upload(make_upload(b"<html>not an image</html>", "x.png"), tmp_path))
+
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_stream_upload_enforces_size_limit(tmp_path):
+    data = PNG_HEADER + b"x" * 500
+
+    with pytest.raises(ImageUploadError):
+        asyncio.run(stream_upload(make_upload(data), tmp_path, max_bytes=100, chunk_size=32))
+
+    assert list(tmp_path.iterdir()) == []